@@ -29,6 +29,7 @@ def with_attributes(
         heartbeat_timeout=settings.ACTIVITY_HEARTBEAT_TIMEOUT,
         idempotent=None,
         meta=None,
+        max_concurrency=None,
 ):
     """
     Decorator: wrap a function/class into an Activity.
@@ -55,6 +56,9 @@ def with_attributes(
     :type idempotent: Optional[bool]
     :param meta:
     :type meta: str
+    :param max_concurrency: maximum number of tasks of this activity run at
+        once by a worker process running tasks concurrently.
+    :type max_concurrency: Optional[int]
     :rtype: () -> Activity[()]
 
     """
@@ -70,6 +74,7 @@ def with_attributes(
             task_priority=task_priority,
             idempotent=idempotent,
             meta=meta,
+            max_concurrency=max_concurrency,
         )
 
     return wrap
@@ -88,7 +93,8 @@ class Activity(object):
                  heartbeat_timeout=None,
                  task_priority=PRIORITY_NOT_SET,
                  idempotent=None,
-                 meta=None):
+                 meta=None,
+                 max_concurrency=None):
         self._callable = callable
 
         self._name = name
@@ -103,6 +109,7 @@ class Activity(object):
         self.task_schedule_to_start_timeout = schedule_to_start_timeout
         self.task_heartbeat_timeout = heartbeat_timeout
         self.meta = meta if meta is not None else {}
+        self.max_concurrency = max_concurrency
 
         self.register()
 
@@ -0,0 +1,157 @@
+from __future__ import absolute_import
+
+import collections
+import os
+import threading
+from sqlite3 import OperationalError
+
+from diskcache import Cache
+
+from simpleflow import logger
+
+
+if False:
+    from typing import Optional  # NOQA
+
+
+class TieredCache(object):
+    """
+    Two-tier cache of strings: a LRU memory tier of up to *memory_size*
+    characters, backed by an optional disk tier of up to *disk_size* bytes
+    shared by the processes of the host.
+
+    The disk tier is opened once per process: a forked process opens its
+    own, as `diskcache.Cache` objects don't survive forks. If it can't be
+    used, only the memory tier is.
+
+    :ivar hits: memory tier hits
+    :type hits: int
+    :ivar disk_hits: disk tier hits
+    :type disk_hits: int
+    :ivar misses: lookups found in neither tier
+    :type misses: int
+    :ivar evictions: values evicted from the memory tier
+    :type evictions: int
+    """
+
+    def __init__(self, memory_size, directory=None, disk_size=1024 ** 3, expire=None):
+        """
+        :param memory_size: in characters
+        :type memory_size: int
+        :param directory: directory of the disk tier; None to disable it
+        :type directory: Optional[str]
+        :param disk_size: in bytes
+        :type disk_size: int
+        :param expire: seconds before a value expires from the disk tier
+        :type expire: Optional[float]
+        """
+        self._memory_size = memory_size
+        self._directory = directory
+        self._disk_size = disk_size
+        self._expire = expire
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._disk = None  # type: Optional[Cache]
+        self._disk_pid = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def memory_size(self):
+        """
+        Size of the memory tier, in characters.
+
+        :rtype: int
+        """
+        return self._memory_size
+
+    def __repr__(self):
+        return '<{} size={}/{} hits={} disk_hits={} misses={} evictions={}>'.format(
+            self.__class__.__name__, self._size, self._memory_size,
+            self.hits, self.disk_hits, self.misses, self.evictions,
+        )
+
+    def _get_disk(self):
+        """
+        Disk tier of this process, opened if needed.
+
+        :rtype: Optional[Cache]
+        """
+        if self._directory is None:
+            return None
+        if self._disk_pid != os.getpid():
+            self._disk_pid = os.getpid()
+            try:
+                self._disk = Cache(self._directory, size_limit=self._disk_size)
+            except (OperationalError, EnvironmentError) as err:
+                logger.warning('diskcache: cannot open {}, skipping cache usage: {}'.format(self._directory, err))
+                self._disk = None
+        return self._disk
+
+    def _put(self, key, value):
+        # Called with the lock held
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        if len(value) > self._memory_size:
+            return
+        self._entries[key] = value
+        self._size += len(value)
+        while self._size > self._memory_size:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self.evictions += 1
+
+    def get(self, key):
+        """
+        :returns: the cached value, or None
+        :rtype: Optional[str]
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries[key] = self._entries.pop(key)  # Most recently used
+                self.hits += 1
+                return value
+
+        disk = self._get_disk()
+        if disk is not None:
+            try:
+                value = disk.get(key)
+            except OperationalError:
+                logger.warning('diskcache: got an OperationalError, skipping cache usage')
+            if value is not None:
+                logger.debug('diskcache: got key={} from cache_dir={}'.format(key, self._directory))
+                with self._lock:
+                    self.disk_hits += 1
+                    self._put(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._put(key, value)
+
+        disk = self._get_disk()
+        if disk is not None:
+            try:
+                logger.debug('diskcache: setting key={} on cache_dir={}'.format(key, self._directory))
+                disk.set(key, value, expire=self._expire)
+            except OperationalError:
+                logger.warning('diskcache: got an OperationalError on write, skipping cache write')
+
+    def clear(self):
+        """
+        Empty the memory tier.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
@@ -10,7 +10,6 @@ import sys
 import time
 from uuid import uuid4
 
-import boto.connection
 import click
 
 from simpleflow import format
@@ -48,24 +47,6 @@ def get_workflow(clspath):
     return cls
 
 
-def disable_boto_connection_pooling():
-    # boto connection pooling doesn't work very well with multiprocessing, it
-    # provokes some errors like this:
-    #
-    #    [Errno 1] _ssl.c:1429: error:1408F119:SSL routines:SSL3_GET_RECORD:decryption failed or bad record mac
-    # when polling on analysis-testjbb-repair-a61ff96e854344748e308fefc9ddff61
-    #
-    # It's because when forking, file handles are copied and sockets are shared.
-    # Even sockets that handle SSL conections to AWS services, but SSL
-    # connections are stateful! So with multiple workers, it collides.
-    #
-    # To disable boto's connection pooling (which in practice makes boto open a
-    # *NEW* connection for each call), we make make boto believe we run on
-    # Google App Engine, where it disables connection pooling. There's no
-    # "direct" setting, so that's a hack but that works.
-    boto.connection.ON_APP_ENGINE = True
-
-
 def comma_separated_list(value):
     """
     Transforms a comma-separated list into a list of strings.
@@ -370,6 +351,39 @@ def task_info(ctx, domain, workflow_id, task_id, details):
     print(with_format(ctx)(helpers.get_task)(domain, workflow_id, task_id, details))
 
 
+@click.option('--max-processes',
+              type=int,
+              required=False,
+              help='Scale the number of processes between --nb-processes (default: 1) and this '
+                   'number, with the backlog of the task list.')
+@click.option('--register-types',
+              is_flag=True,
+              default=False,
+              help='Register the missing activity and workflow types when starting.')
+@click.option('--delta-history',
+              is_flag=True,
+              default=False,
+              help='Only fetch the new history events of the executions in the history cache.')
+@click.option('--max-rss-per-process',
+              type=int,
+              required=False,
+              help='Recycle a decision process when its RSS exceeds this many MB.')
+@click.option('--max-decisions-per-process',
+              type=int,
+              required=False,
+              help='Recycle a decision process after this many decisions.')
+@click.option('--nb-decision-processes',
+              type=int,
+              required=False,
+              default=0,
+              help='Number of long-lived decision processes per decider process '
+                   '(0 to fork a process for each decision).')
+@click.option('--history-cache-size',
+              type=int,
+              required=False,
+              default=0,
+              help='Number of parsed histories kept between decisions, so only new events '
+                   'are parsed (0 to disable).')
 @click.option('--nb-processes', '-N', type=int)
 @click.option('--log-level', '-l')
 @click.option('--task-list')
@@ -379,7 +393,9 @@ def task_info(ctx, domain, workflow_id, task_id, details):
               help='SWF Domain')
 @click.argument('workflows', nargs=-1, required=True)
 @cli.command('decider.start', help='Start a decider process to manage workflow executions.')
-def start_decider(workflows, domain, task_list, log_level, nb_processes):
+def start_decider(workflows, domain, task_list, log_level, nb_processes, history_cache_size,
+                  nb_decision_processes, max_decisions_per_process, max_rss_per_process, delta_history,
+                  register_types, max_processes):
     if log_level:
         logger.warning(
             "Deprecated: --log-level will be removed, use LOG_LEVEL environment variable instead"
@@ -390,9 +406,51 @@ def start_decider(workflows, domain, task_list, log_level, nb_processes):
         task_list,
         None,
         nb_processes,
+        history_cache_size=history_cache_size,
+        nb_decision_processes=nb_decision_processes,
+        max_decisions_per_process=max_decisions_per_process,
+        max_rss_per_process=max_rss_per_process * 1024 * 1024 if max_rss_per_process else None,
+        delta_history=delta_history,
+        register_types=register_types,
+        max_processes=max_processes,
     )
 
 
+@click.option('--max-processes',
+              type=int,
+              required=False,
+              help='Scale the number of processes between --nb-processes (default: 1) and this '
+                   'number, with the backlog of the task list.')
+@click.option('--heartbeat-rate',
+              type=float,
+              required=False,
+              help='Send the heartbeats of all the processes from a shared service, '
+                   'with this budget of heartbeats per second.')
+@click.option('--concurrency',
+              type=int,
+              required=False,
+              help='Run up to this many tasks at once in each process, in threads '
+                   '(or an event loop for async activities).')
+@click.option('--process-setup',
+              multiple=True,
+              help='Function called when a long-lived process starts, e.g. mypackage.setup.load_models '
+                   '(can be repeated).')
+@click.option('--preload',
+              multiple=True,
+              help='Module to import before forking the processes, e.g. mypackage.activities '
+                   '(can be repeated).')
+@click.option('--max-rss-per-process',
+              type=int,
+              required=False,
+              help='Recycle a long-lived process when its RSS exceeds this many MB.')
+@click.option('--max-tasks-per-process',
+              type=int,
+              required=False,
+              help='Recycle a long-lived process after this many tasks.')
+@click.option('--reuse-processes',
+              is_flag=True,
+              default=False,
+              help='Run the tasks in long-lived processes instead of forking a process for each task.')
 @click.option('--poll-data',
               help='Provide a base64 encoded json dump of the SWF poll response, instead of polling SWF',
               )
@@ -417,7 +475,9 @@ def start_decider(workflows, domain, task_list, log_level, nb_processes):
               required=True,
               help='SWF Domain')
 @cli.command('worker.start', help='Start a worker process to handle activity tasks.')
-def start_worker(domain, task_list, log_level, nb_processes, heartbeat, one_task, process_mode, poll_data):
+def start_worker(domain, task_list, log_level, nb_processes, heartbeat, one_task, process_mode, poll_data,
+                 reuse_processes, max_tasks_per_process, max_rss_per_process, preload, process_setup,
+                 concurrency, heartbeat_rate, max_processes):
     if log_level:
         logger.warning(
             "Deprecated: --log-level will be removed, use LOG_LEVEL environment variable instead"
@@ -431,6 +491,9 @@ def start_worker(domain, task_list, log_level, nb_processes, heartbeat, one_task
     if not task_list and not poll_data:
         raise ValueError("Please provide a --task-list or some data via --poll-data")
 
+    if concurrency and reuse_processes:
+        raise ValueError("--concurrency and --reuse-processes options are exclusive")
+
     worker.command.start(
         domain,
         task_list,
@@ -439,6 +502,14 @@ def start_worker(domain, task_list, log_level, nb_processes, heartbeat, one_task
         one_task,
         process_mode,
         poll_data,
+        reuse_processes=reuse_processes,
+        max_tasks_per_process=max_tasks_per_process,
+        max_rss_per_process=max_rss_per_process * 1024 * 1024 if max_rss_per_process else None,
+        preload=preload,
+        process_setup=process_setup,
+        concurrency=concurrency,
+        heartbeat_rate=heartbeat_rate,
+        max_processes=max_processes,
     )
 
 
@@ -525,8 +596,6 @@ def standalone(context,
     with a single main process.
 
     """
-    disable_boto_connection_pooling()
-
     if force_activities and not repair:
         raise ValueError(
             "You should only use --force-activities with --repair."
@@ -25,5 +25,16 @@ MAX_LOG_FIELD = 500 * 1024  # 500kB
 JUMBO_FIELDS_PREFIX = "simpleflow+s3://"
 JUMBO_FIELDS_MAX_SIZE = 5 * 1024 ** 2  # 5MB
 
+# Compressed fields: zlib-compressed, then base64-encoded inline; jumbo
+# fields objects are prefixed too, but not base64-encoded
+COMPRESSED_FIELDS_PREFIX = "simpleflow+zlib:"
+
+# Jumbo fields forwarded by reference in a field: {KEY: signature}
+JUMBO_FIELDS_REFERENCE_KEY = "__simpleflow_jumbo_field__"
+
 # Cache directory
 CACHE_DIR = "/tmp/simpleflow-cache"
+
+# Jumbo fields cache: memory tier in chars, disk tier in bytes
+JUMBO_FIELDS_MEMORY_CACHE_SIZE = 64 * 1024 ** 2
+JUMBO_FIELDS_DISK_CACHE_SIZE = 1024 ** 3
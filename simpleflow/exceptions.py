@@ -167,13 +167,18 @@ class AggregateException(Exception):
 
 
 class ExecutionError(Exception):
-    pass
+    """
+    :ivar rusage: resource usage of the failed process, if known
+    :type rusage: Optional[simpleflow.execute.Rusage]
+    """
+    rusage = None
 
 
 class ExecutionTimeoutError(Exception):
-    def __init__(self, command, timeout_value):
+    def __init__(self, command, timeout_value, rusage=None):
         self.timeout_command = command
         self.timeout_value = timeout_value
+        self.rusage = rusage
 
     def __repr__(self):
         return '{} after {} seconds ({})'.format(
@@ -1,9 +1,14 @@
 from __future__ import absolute_import, print_function
 
+import atexit
+import collections
 import errno
 import os
+import select
+import signal
 import sys
 import json
+import threading
 
 import time
 from typing import TYPE_CHECKING
@@ -15,6 +20,7 @@ try:
 except ImportError:
     import subprocess
 import functools
+import io
 import logging
 import tempfile
 import traceback
@@ -158,6 +164,174 @@ def get_name(func):
     return '.'.join([prefix, name])
 
 
+Rusage = collections.namedtuple('Rusage', [
+    'user_time',  # seconds
+    'system_time',  # seconds
+    'max_rss',  # kilobytes on Linux
+    'block_input',  # blocks read
+    'block_output',  # blocks written
+])
+
+# Seconds between SIGTERM and SIGKILL for timed out processes
+KILL_TIMEOUT = 5
+
+# Seconds for a fork server to start a call, e.g. while it starts
+FORK_SERVER_START_TIMEOUT = 30
+
+# Bytes of the output of a program that are read, see program()
+MAX_OUTPUT = 10 * 1024 * 1024
+
+_local = threading.local()
+
+
+def last_rusage():
+    """
+    Resource usage of the last process executed by this thread.
+
+    :rtype: Optional[Rusage]
+    """
+    return getattr(_local, 'rusage', None)
+
+
+def _wait_exit(process, timeout=None):
+    """
+    Wait for a process to exit, without reaping it: with a pidfd if the
+    platform supports it, else with `os.waitid()` in a thread.
+
+    :returns: whether the process exited
+    :rtype: bool
+    """
+    if process.returncode is not None:
+        return True
+    if hasattr(os, 'pidfd_open'):
+        try:
+            fd = os.pidfd_open(process.pid)
+        except OSError:
+            pass  # Old kernel
+        else:
+            try:
+                ready, _, _ = select.select([fd], [], [], timeout)
+                return bool(ready)
+            finally:
+                os.close(fd)
+
+    if not hasattr(os, 'waitid'):  # Python 2
+        deadline = time.time() + timeout if timeout is not None else None
+        delay = 0.001
+        while process.poll() is None:  # Reaps it: no resource usage
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        return True
+
+    exited = threading.Event()
+
+    def wait():
+        try:
+            os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        except OSError:
+            pass  # Already reaped
+        exited.set()
+
+    thread = threading.Thread(target=wait, name='wait-{}'.format(process.pid))
+    thread.daemon = True
+    thread.start()
+    return exited.wait(timeout)
+
+
+def _reap(process):
+    """
+    Reap an exited process.
+
+    :returns: return code and resource usage
+    :rtype: (int, Optional[Rusage])
+    """
+    if process.returncode is not None:
+        return process.returncode, None
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except OSError as e:
+        if e.errno != errno.ECHILD:
+            raise
+        return process.wait(), None  # Reaped by subprocess
+    process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    rusage = Rusage(
+        usage.ru_utime,
+        usage.ru_stime,
+        usage.ru_maxrss,
+        usage.ru_inblock,
+        usage.ru_oublock,
+    )
+    return process.returncode, rusage
+
+
+def _killpg(pgid, signum):
+    try:
+        os.killpg(pgid, signum)
+    except OSError as e:
+        # Ignore that exception the case the group already terminated.
+        if e.errno != errno.ESRCH:
+            raise
+
+
+def signal_process_group(pid, signum):
+    """
+    Send a signal to the process group led by *pid*, or to the process only
+    if it doesn't lead a group.
+    """
+    try:
+        if os.getpgid(pid) == pid:
+            os.killpg(pid, signum)
+        else:
+            os.kill(pid, signum)
+    except OSError as e:
+        # Ignore that exception the case the sub-process already terminated.
+        if e.errno != errno.ESRCH:
+            raise
+
+
+def terminate_subprocess(process, kill_timeout=KILL_TIMEOUT):
+    """
+    Send SIGTERM to the process group of a process, then SIGKILL to the
+    processes left after *kill_timeout* seconds.
+
+    :returns: return code and resource usage
+    :rtype: (int, Optional[Rusage])
+    """
+    signal_process_group(process.pid, signal.SIGTERM)
+    _wait_exit(process, kill_timeout)
+    # The group is still ours until the process is reaped
+    signal_process_group(process.pid, signal.SIGKILL)
+    return _reap(process)
+
+
+def supervise_subprocess(process, timeout=None, command_info=None, kill_timeout=KILL_TIMEOUT):
+    """
+    Wait for a process; on timeout, terminate its process group and raise.
+
+    The exit of the process is waited for without polling, and its resource
+    usage is returned, or attached to the raised `ExecutionTimeoutError`.
+
+    :param process: the process to wait
+    :type process: subprocess.Popen
+    :param timeout: timeout after 'timeout' seconds
+    :type timeout: Optional[float]
+    :param command_info:
+    :param kill_timeout: seconds between SIGTERM and SIGKILL
+    :type kill_timeout: float
+    :returns: return code and resource usage
+    :rtype: (int, Optional[Rusage])
+    """
+    if not _wait_exit(process, timeout or None):
+        _, rusage = terminate_subprocess(process, kill_timeout)
+        _local.rusage = rusage
+        raise ExecutionTimeoutError(command=command_info, timeout_value=timeout, rusage=rusage)
+    rc, rusage = _reap(process)
+    _local.rusage = rusage
+    return rc, rusage
+
+
 def wait_subprocess(process, timeout=None, command_info=None):
     """
     Wait for a process, raise if timeout.
@@ -168,28 +342,73 @@ def wait_subprocess(process, timeout=None, command_info=None):
         :returns: return code
         :rtype: int.
     """
-    if timeout:
-        t_start = time.time()
-        rc = process.poll()
-        while time.time() - t_start < timeout and rc is None:
-            time.sleep(1)
-            rc = process.poll()
+    rc, _ = supervise_subprocess(process, timeout=timeout, command_info=command_info)
+    return rc
 
-        if rc is None:
-            try:
-                process.terminate()  # send SIGTERM
-            except OSError as e:
-                # Ignore that exception the case the sub-process already terminated after last poll() call.
-                if e.errno == errno.ESRCH:
-                    return process.poll()
-                else:
-                    raise
-            raise ExecutionTimeoutError(command=command_info, timeout_value=timeout)
-        return rc
-    return process.wait()
 
+def run_in_new_interpreter(interpreter, funcname, arguments_json, context, logger_name,
+                           timeout=None, kill_children=False):
+    """
+    Execute a callable in a new interpreter.
 
-def python(interpreter='python', logger_name=__name__, timeout=None, kill_children=False):
+    :returns: exit code, result and error output
+    :rtype: (int, bytes, bytes)
+    """
+    command = 'simpleflow.execute'  # name of a module.
+    with tempfile.TemporaryFile() as result_fd, tempfile.TemporaryFile() as error_fd:
+        dup_result_fd = os.dup(result_fd.fileno())  # remove FD_CLOEXEC
+        dup_error_fd = os.dup(error_fd.fileno())  # remove FD_CLOEXEC
+        full_command = [
+            interpreter, '-m', command,  # execute module a script.
+            funcname,
+            '--logger-name={}'.format(logger_name),
+            '--result-fd={}'.format(dup_result_fd),
+            '--error-fd={}'.format(dup_error_fd),
+            '--context={}'.format(json_dumps(context)),
+        ]
+        if len(arguments_json) < MAX_ARGUMENTS_JSON_LENGTH:  # command-line limit on Linux: 128K
+            full_command.append(arguments_json)
+            arg_file = None
+            arg_fd = None
+        else:
+            arg_file = tempfile.TemporaryFile()
+            arg_file.write(arguments_json.encode('utf-8'))
+            arg_file.flush()
+            arg_file.seek(0)
+            arg_fd = os.dup(arg_file.fileno())
+            full_command.append('--arguments-json-fd={}'.format(arg_fd))
+            full_command.append('foo')  # dummy funcarg
+        if kill_children:
+            full_command.append('--kill-children')
+        if is_buggy_subprocess32():  # close_fds doesn't work with subprocess32 < 3.5.0
+            close_fds = False
+            pass_fds = []
+        else:
+            close_fds = True
+            pass_fds = [dup_result_fd, dup_error_fd]
+            if arg_file:
+                pass_fds.append(arg_fd)
+        process = subprocess.Popen(
+            full_command,
+            bufsize=-1,
+            close_fds=close_fds,
+            pass_fds=pass_fds,
+            start_new_session=True,  # Own process group, killed on timeout
+        )
+        rc, _ = supervise_subprocess(process, timeout=timeout, command_info=full_command)
+        os.close(dup_result_fd)
+        os.close(dup_error_fd)
+        if arg_file:
+            arg_file.close()
+        error_fd.seek(0)
+        err_output = error_fd.read()
+        result_fd.seek(0)
+        result_str = result_fd.read()
+    return rc, result_str, err_output
+
+
+def python(interpreter='python', logger_name=__name__, timeout=None, kill_children=False,
+           forkserver=False, preload=None):
     """
     Execute a callable as an external Python program.
 
@@ -198,72 +417,50 @@ def python(interpreter='python', logger_name=__name__, timeout=None, kill_childr
 
     Arguments of the decorated callable must be serializable in JSON.
 
+    With *forkserver*, calls are run by a warm interpreter that forks a child
+    for each call, instead of starting a new interpreter: the modules listed
+    in *preload* and the modules of the callables are imported once. The warm
+    interpreter is started on the first call, one per process and
+    interpreter; concurrent calls that find it busy start a new interpreter.
+    Processes forked for a single task don't start one: they run a new
+    interpreter, see :attr:`ForkServer.enabled`.
+
+    On timeout, the process group of the call gets a SIGTERM, then a SIGKILL
+    after ``KILL_TIMEOUT`` seconds. The resource usage of the call is
+    attached to the raised errors, and returned by :func:`last_rusage`.
+
     """
 
     def wrap_callable(func):
         @functools.wraps(func)
         def execute(*args, **kwargs):
             logger = logging.getLogger(logger_name)
-            command = 'simpleflow.execute'  # name of a module.
             sys.stdout.flush()
             sys.stderr.flush()
             result_str = None  # useless
             context = kwargs.pop('context', {})
-            with tempfile.TemporaryFile() as result_fd, tempfile.TemporaryFile() as error_fd:
-                dup_result_fd = os.dup(result_fd.fileno())  # remove FD_CLOEXEC
-                dup_error_fd = os.dup(error_fd.fileno())  # remove FD_CLOEXEC
-                arguments_json = format_arguments_json(*args, **kwargs)
-                full_command = [
-                    interpreter, '-m', command,  # execute module a script.
-                    get_name(func),
-                    '--logger-name={}'.format(logger_name),
-                    '--result-fd={}'.format(dup_result_fd),
-                    '--error-fd={}'.format(dup_error_fd),
-                    '--context={}'.format(json_dumps(context)),
-                ]
-                if len(arguments_json) < MAX_ARGUMENTS_JSON_LENGTH:  # command-line limit on Linux: 128K
-                    full_command.append(arguments_json)
-                    arg_file = None
-                    arg_fd = None
-                else:
-                    arg_file = tempfile.TemporaryFile()
-                    arg_file.write(arguments_json.encode('utf-8'))
-                    arg_file.flush()
-                    arg_file.seek(0)
-                    arg_fd = os.dup(arg_file.fileno())
-                    full_command.append('--arguments-json-fd={}'.format(arg_fd))
-                    full_command.append('foo')  # dummy funcarg
-                if kill_children:
-                    full_command.append('--kill-children')
-                if is_buggy_subprocess32():  # close_fds doesn't work with subprocess32 < 3.5.0
-                    close_fds = False
-                    pass_fds = []
-                else:
-                    close_fds = True
-                    pass_fds = [dup_result_fd, dup_error_fd]
-                    if arg_file:
-                        pass_fds.append(arg_fd)
-                process = subprocess.Popen(
-                    full_command,
-                    bufsize=-1,
-                    close_fds=close_fds,
-                    pass_fds=pass_fds,
+            arguments_json = format_arguments_json(*args, **kwargs)
+            server = ForkServer.get(interpreter, preload) if forkserver else None
+            if server is not None and server.lock.acquire(False):
+                try:
+                    rc, result_str, err_output = server.call(
+                        get_name(func), arguments_json, context, logger_name,
+                        timeout=timeout, kill_children=kill_children,
+                    )
+                finally:
+                    server.lock.release()
+            else:
+                rc, result_str, err_output = run_in_new_interpreter(
+                    interpreter, get_name(func), arguments_json, context, logger_name,
+                    timeout=timeout, kill_children=kill_children,
                 )
-                rc = wait_subprocess(process, timeout=timeout, command_info=full_command)
-                os.close(dup_result_fd)
-                os.close(dup_error_fd)
-                if arg_file:
-                    arg_file.close()
-                if rc:
-                    error_fd.seek(0)
-                    err_output = error_fd.read()
-                    if err_output:
-                        if not compat.PY2:
-                            err_output = err_output.decode('utf-8', errors='replace')
-                    raise ExecutionError(err_output)
-
-                result_fd.seek(0)
-                result_str = result_fd.read()
+            if rc:
+                if err_output:
+                    if not compat.PY2:
+                        err_output = err_output.decode('utf-8', errors='replace')
+                error = ExecutionError(err_output)
+                error.rusage = last_rusage()
+                raise error
 
             if not result_str:
                 return None
@@ -300,7 +497,52 @@ def is_buggy_subprocess32():
     )
 
 
-def program(path=None, argument_format=format_arguments):
+def _decode_output(data):
+    """
+    Decode the output of a program like ``universal_newlines=True`` does.
+    """
+    return io.TextIOWrapper(io.BytesIO(data), errors='replace').read()
+
+
+def read_output(output, max_output=None, upload=False):
+    """
+    Read the output of a program from its spill file. When it's larger than
+    *max_output* bytes, only its head and tail are read, and the full output
+    is uploaded as a jumbo field if *upload*.
+
+    :param output: spill file
+    :type output: tempfile.NamedTemporaryFile
+    :param max_output: in bytes
+    :type max_output: Optional[int]
+    :param upload:
+    :type upload: bool
+    :rtype: str
+    """
+    output.flush()
+    size = os.fstat(output.fileno()).st_size
+    output.seek(0)
+    if max_output is None or size <= max_output:
+        return _decode_output(output.read())
+
+    head = output.read(max_output // 2)
+    output.seek(size - (max_output - len(head)))
+    tail = output.read()
+    location = None
+    if upload:
+        try:
+            location = format.push_jumbo_file(output.name)
+        except Exception as err:
+            simpleflow_logger.warning('cannot upload program output: {}'.format(err))
+    return '{}\n[... {} bytes skipped{} ...]\n{}'.format(
+        _decode_output(head),
+        size - len(head) - len(tail),
+        ', full output: {}'.format(location) if location else '',
+        _decode_output(tail),
+    )
+
+
+def program(path=None, argument_format=format_arguments, timeout=None, max_output=MAX_OUTPUT,
+            upload_output=False):
     r"""
     Decorate a callable to execute it as an external program.
 
@@ -310,6 +552,17 @@ def program(path=None, argument_format=format_arguments):
     :param argument_format: takes the arguments of the callable and converts
                             them to command line arguments.
     :type  argument_format: callable(*args, **kwargs).
+    :param timeout: terminate the program and raise `ExecutionTimeoutError`
+                    after this many seconds.
+    :type  timeout: Optional[float].
+    :param max_output: the output is written to a spill file; when it's
+                       larger than this many bytes, only its head and tail
+                       are returned, or set on the raised error. ``None``
+                       reads the whole output in memory.
+    :type  max_output: Optional[int].
+    :param upload_output: upload the full output of a truncated output as a
+                          jumbo field, referenced in the returned output.
+    :type  upload_output: bool.
 
     :returns:
         :rtype: callable(*args, **kwargs).
@@ -335,10 +588,20 @@ def program(path=None, argument_format=format_arguments):
             check_arguments(argspec, args)
             check_keyword_arguments(argspec, kwargs)
 
-            command = path or func.__name__
-            return subprocess.check_output(
-                [command] + argument_format(*args, **kwargs),
-                universal_newlines=True)
+            command = [path or func.__name__] + argument_format(*args, **kwargs)
+            with tempfile.NamedTemporaryFile(prefix='simpleflow-output-') as output:
+                process = subprocess.Popen(
+                    command,
+                    stdout=output,
+                    start_new_session=True,  # Own process group, killed on timeout
+                )
+                rc, rusage = supervise_subprocess(process, timeout=timeout, command_info=command)
+                output_str = read_output(output, max_output, upload_output)
+            if rc:
+                error = subprocess.CalledProcessError(rc, command, output=output_str)
+                error.rusage = rusage
+                raise error
+            return output_str
 
         try:
             args, varargs, varkw, defaults, kwonlyargs, kwonlydefaults, ann = inspect.getfullargspec(func)
@@ -401,6 +664,385 @@ def make_callable(funcname):
     return callable_
 
 
+def kill_child_processes():
+    process = psutil.Process(os.getpid())
+    children = process.children(recursive=True)
+
+    for child in children:
+        try:
+            child.terminate()
+        except psutil.NoSuchProcess:
+            pass
+    _, still_alive = psutil.wait_procs(children, timeout=0.3)
+    for child in still_alive:
+        try:
+            child.kill()
+        except psutil.NoSuchProcess:
+            pass
+
+
+def run_callable(funcname, content, context=None, logger_name=None):
+    """
+    Execute a callable from its name and its JSON-encoded arguments.
+
+    :returns: the JSON-encoded result, or the JSON-encoded error details
+    :rtype: (bytes | None, bytes | None)
+    """
+    try:
+        arguments = format.decode(content)
+    except Exception:
+        raise ValueError('cannot load arguments from {}'.format(
+            content))
+    if logger_name:
+        logger = logging.getLogger(logger_name)
+    else:
+        logger = simpleflow_logger
+    callable_ = make_callable(funcname)
+    if hasattr(callable_, '__wrapped__'):
+        callable_ = callable_.__wrapped__
+    args = arguments.get('args', ())
+    kwargs = arguments.get('kwargs', {})
+    try:
+        if hasattr(callable_, 'execute'):
+            inst = callable_(*args, **kwargs)
+            if context is not None:
+                inst.context = context
+            result = inst.execute()
+            if hasattr(inst, 'post_execute'):
+                inst.post_execute()
+        else:
+            if context is not None:
+                callable_.context = context
+            result = callable_(*args, **kwargs)
+    except Exception as err:
+        logger.error('Exception: {}'.format(err))
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        tb = traceback.format_tb(exc_traceback)
+        details = json_dumps(
+            {
+                'error': exc_type.__name__,
+                'message': str(exc_value),
+                'traceback': tb,
+            },
+            default=repr,
+        )
+        if not compat.PY2:
+            details = details.encode('utf-8')
+        return None, details
+
+    result = json_dumps(result)
+    if not compat.PY2:
+        result = result.encode('utf-8')
+    return result, None
+
+
+def write_message(fd, message):
+    """
+    Write a JSON message on a line.
+    """
+    data = (json_dumps(message) + '\n').encode('utf-8')
+    while data:
+        data = data[os.write(fd, data):]
+
+
+class ForkServer(object):
+    """
+    Client of a warm interpreter that forks a child for each call: see
+    :func:`serve`. The server is started with the arguments of the first
+    call, and stopped when the process exits.
+
+    :ivar lock: held during a call: there's one call at a time
+    :type lock: threading.Lock
+    """
+    servers = {}  # (interpreter, preload) -> ForkServer
+
+    # Unset in the processes that run a single call, e.g. the processes a
+    # worker forks for each task: a server would be started for nothing
+    enabled = True
+
+    def __init__(self, interpreter, preload=None):
+        self.owner_pid = os.getpid()
+        self.lock = threading.Lock()
+        self._buffer = b''
+        request_read, self._request_fd = os.pipe()
+        self._response_fd, response_write = os.pipe()
+        command = [
+            interpreter, '-m', 'simpleflow.execute', '--forkserver',
+            '--request-fd={}'.format(request_read),
+            '--response-fd={}'.format(response_write),
+        ]
+        for module_name in preload or ():
+            command.append('--preload={}'.format(module_name))
+        if is_buggy_subprocess32():  # close_fds doesn't work with subprocess32 < 3.5.0
+            close_fds = False
+            pass_fds = []
+        else:
+            close_fds = True
+            pass_fds = [request_read, response_write]
+        self.process = subprocess.Popen(command, close_fds=close_fds, pass_fds=pass_fds)
+        os.close(request_read)
+        os.close(response_write)
+
+    @classmethod
+    def get(cls, interpreter, preload=None):
+        """
+        Server of this process for the interpreter, started if needed.
+
+        :returns: the server, or None if disabled
+        :rtype: Optional[ForkServer]
+        """
+        if not cls.enabled:
+            return None
+        key = (interpreter, tuple(preload or ()))
+        server = cls.servers.get(key)
+        if server is not None and server.owner_pid == os.getpid() and server.process.poll() is None:
+            return server
+        if server is not None and server.owner_pid == os.getpid():
+            server.close()
+        cls.servers[key] = server = cls(interpreter, preload)
+        return server
+
+    def close(self):
+        """
+        Stop the server: it exits when its requests pipe is closed.
+        """
+        for fd in (self._request_fd, self._response_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def kill(self):
+        """
+        Stop a server that doesn't answer.
+        """
+        self.close()
+        try:
+            self.process.kill()
+        except OSError:
+            pass  # Already gone
+        self.process.wait()
+
+    def _receive(self, timeout=None):
+        """
+        Read a message.
+
+        :returns: the message, or None on timeout
+        :rtype: dict | None
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while b'\n' not in self._buffer:
+            remaining = deadline - time.time() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                return None
+            ready, _, _ = select.select([self._response_fd], [], [], remaining)
+            if not ready:
+                return None
+            data = os.read(self._response_fd, 65536)
+            if not data:
+                raise EOFError('fork server exited')
+            self._buffer += data
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        return json.loads(line.decode('utf-8'))
+
+    def call(self, funcname, arguments_json, context, logger_name, timeout=None, kill_children=False):
+        """
+        Execute a callable in a child of the server.
+
+        :returns: exit code, result and error output
+        :rtype: (int, bytes, bytes)
+        """
+        write_message(self._request_fd, {
+            'funcname': funcname,
+            'arguments': arguments_json,
+            'context': context,
+            'logger_name': logger_name,
+            'kill_children': kill_children,
+            'environ': dict(os.environ),
+            'cwd': os.getcwd(),
+        })
+        # The timeout starts with the child
+        start_deadline = time.time() + FORK_SERVER_START_TIMEOUT
+        deadline = None
+        pid = None
+        result = error = b''
+        while True:
+            if pid is None:
+                remaining = max(start_deadline - time.time(), 0)
+            else:
+                remaining = max(deadline - time.time(), 0) if deadline is not None else None
+            try:
+                message = self._receive(remaining)
+            except EOFError:
+                self.close()
+                return -1, result, error
+            if message is None:
+                if pid is None:
+                    self.kill()
+                    return -1, result, 'fork server did not start the call within {} seconds'.format(
+                        FORK_SERVER_START_TIMEOUT,
+                    ).encode('utf-8')
+                rusage = self._terminate(pid)
+                raise ExecutionTimeoutError(command=[funcname], timeout_value=timeout, rusage=rusage)
+            if 'pid' in message:
+                pid = message['pid']
+                if timeout:
+                    deadline = time.time() + timeout
+            elif 'result' in message:
+                result = message['result'].encode('utf-8')
+            elif 'error' in message:
+                error = message['error'].encode('utf-8')
+            elif 'exit' in message:
+                _local.rusage = Rusage(*message['rusage'])
+                return message['exit'], result, error
+
+    def _terminate(self, pid):
+        """
+        Terminate the process group of a timed out call, and wait for its
+        exit.
+
+        :rtype: Optional[Rusage]
+        """
+        _killpg(pid, signal.SIGTERM)
+        deadline = time.time() + KILL_TIMEOUT
+        killed = False
+        while True:
+            remaining = None if killed else max(deadline - time.time(), 0)
+            try:
+                message = self._receive(remaining)
+            except EOFError:
+                self.close()
+                _local.rusage = None
+                return None
+            if message is None:
+                _killpg(pid, signal.SIGKILL)
+                killed = True
+            elif 'exit' in message:
+                _killpg(pid, signal.SIGKILL)  # What's left of the group
+                _local.rusage = Rusage(*message['rusage'])
+                return _local.rusage
+
+
+def _stop_fork_servers():
+    for server in ForkServer.servers.values():
+        if server.owner_pid == os.getpid():
+            server.close()
+
+
+atexit.register(_stop_fork_servers)
+
+
+def serve(request_fd, response_fd, preload=None):
+    """
+    Run as a warm interpreter: import the *preload* modules, then, for each
+    call read on *request_fd*, fork a child that executes it. The child writes
+    its pid, then its result or error on *response_fd*; the server writes the
+    exit code of the child once reaped.
+    """
+    for module_name in preload or ():
+        __import__(module_name)
+
+    buffer = b''
+    while True:
+        data = os.read(request_fd, 65536)
+        if not data:  # The client is gone
+            break
+        buffer += data
+        while b'\n' in buffer:
+            line, buffer = buffer.split(b'\n', 1)
+            request = json.loads(line.decode('utf-8'))
+            try:
+                make_callable(request['funcname'])  # Stays imported for the next calls
+            except Exception:
+                pass  # The child reports it
+            pid = os.fork()
+            if pid == 0:
+                os.close(request_fd)
+                os._exit(_serve_call(request, response_fd))
+            _, status, usage = os.wait4(pid, 0)
+            code = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+            rusage = Rusage(usage.ru_utime, usage.ru_stime, usage.ru_maxrss, usage.ru_inblock, usage.ru_oublock)
+            write_message(response_fd, {'exit': code, 'rusage': rusage})
+
+
+def _serve_call(request, response_fd):
+    """
+    Execute a call in a child of the fork server.
+
+    :returns: exit code
+    :rtype: int
+    """
+    code = 1
+    try:
+        os.setpgid(0, 0)  # Own process group, killed on timeout
+        write_message(response_fd, {'pid': os.getpid()})
+        os.environ.clear()
+        os.environ.update(request['environ'])
+        os.chdir(request['cwd'])
+        result, details = run_callable(
+            request['funcname'],
+            request['arguments'],
+            request['context'],
+            request['logger_name'],
+        )
+        if details is not None:
+            write_message(response_fd, {'error': details.decode('utf-8')})
+        else:
+            write_message(response_fd, {'result': result.decode('utf-8')})
+            code = 0
+        if request['kill_children']:
+            kill_child_processes()
+    except SystemExit as err:
+        code = err.code if isinstance(err.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    return code
+
+
+def forkserver_main():
+    """
+    Run as a warm interpreter, see :func:`serve`.
+
+    Synopsis
+    --------
+
+    ::
+        usage: execute.py --forkserver --request-fd N --response-fd N [--preload MODULE]...
+    """
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--forkserver',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--request-fd',
+        type=int,
+        required=True,
+        metavar='N',
+        help='calls file descriptor',
+    )
+    parser.add_argument(
+        '--response-fd',
+        type=int,
+        required=True,
+        metavar='N',
+        help='results file descriptor',
+    )
+    parser.add_argument(
+        '--preload',
+        action='append',
+        default=[],
+        metavar='MODULE',
+        help='module to import before serving',
+    )
+    cmd_arguments = parser.parse_args()
+    serve(cmd_arguments.request_fd, cmd_arguments.response_fd, cmd_arguments.preload)
+
+
 def main():
     """
     When executed as a script, this module expects the name of a callable as
@@ -440,6 +1082,9 @@ def main():
 
     """
     import argparse
+    if sys.argv[1:2] == ['--forkserver']:
+        return forkserver_main()
+
     parser = argparse.ArgumentParser()
     parser.add_argument(
         'funcname',
@@ -485,22 +1130,6 @@ def main():
     )
     cmd_arguments = parser.parse_args()
 
-    def kill_child_processes():
-        process = psutil.Process(os.getpid())
-        children = process.children(recursive=True)
-
-        for child in children:
-            try:
-                child.terminate()
-            except psutil.NoSuchProcess:
-                pass
-        _, still_alive = psutil.wait_procs(children, timeout=0.3)
-        for child in still_alive:
-            try:
-                child.kill()
-            except psutil.NoSuchProcess:
-                pass
-
     funcname = cmd_arguments.funcname
     if cmd_arguments.arguments_json_fd is None:
         content = cmd_arguments.funcargs
@@ -509,49 +1138,12 @@ def main():
     else:
         with os.fdopen(cmd_arguments.arguments_json_fd) as arguments_json_file:
             content = arguments_json_file.read()
-    try:
-        arguments = format.decode(content)
-    except Exception:
-        raise ValueError('cannot load arguments from {}'.format(
-            content))
-    if cmd_arguments.logger_name:
-        logger = logging.getLogger(cmd_arguments.logger_name)
-    else:
-        logger = simpleflow_logger
-    callable_ = make_callable(funcname)
-    if hasattr(callable_, '__wrapped__'):
-        callable_ = callable_.__wrapped__
-    args = arguments.get('args', ())
-    kwargs = arguments.get('kwargs', {})
     context = json.loads(cmd_arguments.context) if cmd_arguments.context is not None else None
-    try:
-        if hasattr(callable_, 'execute'):
-            inst = callable_(*args, **kwargs)
-            if context is not None:
-                inst.context = context
-            result = inst.execute()
-            if hasattr(inst, 'post_execute'):
-                inst.post_execute()
-        else:
-            if context is not None:
-                callable_.context = context
-            result = callable_(*args, **kwargs)
-    except Exception as err:
-        logger.error('Exception: {}'.format(err))
-        exc_type, exc_value, exc_traceback = sys.exc_info()
-        tb = traceback.format_tb(exc_traceback)
-        details = json_dumps(
-            {
-                'error': exc_type.__name__,
-                'message': str(exc_value),
-                'traceback': tb,
-            },
-            default=repr,
-        )
+    result, details = run_callable(funcname, content, context, cmd_arguments.logger_name)
+
+    if details is not None:
         if cmd_arguments.error_fd == 2:
             sys.stderr.flush()
-        if not compat.PY2:
-            details = details.encode('utf-8')
         os.write(cmd_arguments.error_fd, details)
         if cmd_arguments.kill_children:
             kill_child_processes()
@@ -560,9 +1152,6 @@ def main():
     if cmd_arguments.result_fd == 1:  # stdout (legacy)
         sys.stdout.flush()  # may have print's in flight
         os.write(cmd_arguments.result_fd, b'\n')
-    result = json_dumps(result)
-    if not compat.PY2:
-        result = result.encode('utf-8')
     os.write(cmd_arguments.result_fd, result)
     if cmd_arguments.kill_children:
         kill_child_processes()
@@ -1,16 +1,38 @@
+import base64
+import functools
+import hashlib
 import os
+import threading
+import zlib
+from multiprocessing.pool import ThreadPool
 from uuid import uuid4
 
-from diskcache import Cache
 import lazy_object_proxy
-from sqlite3 import OperationalError
 
-from simpleflow import constants, logger, storage
+from simpleflow import compat, constants, logger, settings, storage
+from simpleflow.cache import TieredCache
 from simpleflow.settings import SIMPLEFLOW_ENABLE_DISK_CACHE
 from simpleflow.utils import json_dumps, json_loads_or_raw
 
 
-JUMBO_FIELDS_MEMORY_CACHE = {}
+# NB: the disk tier may also be used on activity workers, where it's not that
+# useful. The performance hit should be minimal.
+JUMBO_FIELDS_CACHE = TieredCache(
+    constants.JUMBO_FIELDS_MEMORY_CACHE_SIZE,
+    directory=constants.CACHE_DIR if SIMPLEFLOW_ENABLE_DISK_CACHE else None,
+    disk_size=constants.JUMBO_FIELDS_DISK_CACHE_SIZE,
+    expire=3 * constants.HOUR,
+)
+
+# Number of jumbo fields pulled from the storage (not from a cache)
+JUMBO_FIELDS_PULLS = 0
+_JUMBO_FIELDS_PULLS_LOCK = threading.Lock()
+
+# Content-addressed jumbo fields known to be stored: (bucket, path)
+JUMBO_FIELDS_STORED = set()
+
+# Number of concurrent pulls when prefetching jumbo fields
+JUMBO_FIELDS_PREFETCH_THREADS = 8
 
 
 class JumboTooLargeError(ValueError):
@@ -28,35 +50,142 @@ def _jumbo_fields_bucket():
     return bucket
 
 
+def _to_bytes(message):
+    if isinstance(message, bytes):
+        return message
+    return message.encode('utf-8')
+
+
+def _compress(message):
+    return zlib.compress(_to_bytes(message))
+
+
+def _decompress(data):
+    return zlib.decompress(data).decode('utf-8')
+
+
+def _decode_jumbo_content(data):
+    """
+    Content of a jumbo field object, either compressed or plain text.
+    """
+    prefix = constants.COMPRESSED_FIELDS_PREFIX.encode('ascii')
+    if data.startswith(prefix):
+        return _decompress(data[len(prefix):])
+    return data.decode('utf-8')
+
+
+class FieldLoader(object):
+    """
+    Decode a field when called. If the field is a JSON document, it's also
+    available as is in ``raw_json``, so that it can be passed on to other
+    tasks without being decoded (see `simpleflow.utils.json_tools.json_dumps`).
+    """
+
+    def __init__(self, content):
+        self.content = content
+
+    @property
+    def raw_json(self):
+        """
+        :rtype: Optional[str]
+        """
+        # Results are JSON-encoded: only look for a document, not for the
+        # scalars which are cheap to decode anyway
+        if self.content and self.content[0] in '{["':
+            return self.content
+        return None
+
+    def __call__(self):
+        return decode(self.content)
+
+
+class JumboFieldLoader(object):
+    """
+    Factory of the proxy of a jumbo field. It keeps the field signature, so
+    that the value can be passed to other tasks by reference, without being
+    pulled (see `simpleflow.utils.json_tools.serialize_complex_object`).
+    """
+
+    def __init__(self, signature, parse_json=True):
+        self.signature = signature
+        self.parse_json = parse_json
+
+    @property
+    def reference(self):
+        """
+        The reference to serialize instead of the value, if enabled.
+
+        :rtype: Optional[dict]
+        """
+        if not self.parse_json or not settings.SIMPLEFLOW_JUMBO_FIELDS_BY_REFERENCE:
+            return None
+        return {constants.JUMBO_FIELDS_REFERENCE_KEY: self.signature}
+
+    def __call__(self):
+        location, _size = self.signature.split()
+        value = _pull_jumbo_field(location)
+        if self.parse_json:
+            return json_loads_or_raw(value, object_hook=_decode_references)
+        return value
+
+
+class JumboFieldProxy(lazy_object_proxy.Proxy):
+    """
+    Proxy of a jumbo field, pulled on first use.
+    """
+
+    def __deepcopy__(self, memo):
+        # Copying the arguments of a task shouldn't pull them: the copy
+        # is another proxy of the field.
+        return type(self)(self.__factory__)
+
+
+def _decode_references(obj):
+    """
+    Replace the jumbo fields references of a decoded JSON object by the
+    proxies of the fields.
+    """
+    if len(obj) == 1 and constants.JUMBO_FIELDS_REFERENCE_KEY in obj:
+        return decode(obj[constants.JUMBO_FIELDS_REFERENCE_KEY])
+    return obj
+
+
 def decode(content, parse_json=True, use_proxy=True):
     if content is None:
         return content
+    if content.startswith(constants.COMPRESSED_FIELDS_PREFIX):
+        content = _decompress(base64.b64decode(content[len(constants.COMPRESSED_FIELDS_PREFIX):]))
     if content.startswith(constants.JUMBO_FIELDS_PREFIX):
-
-        def unwrap():
-            location, _size = content.split()
-            value = _pull_jumbo_field(location)
-            if parse_json:
-                return json_loads_or_raw(value)
-            return value
-
+        loader = JumboFieldLoader(content, parse_json)
         if use_proxy:
-            return lazy_object_proxy.Proxy(unwrap)
-        return unwrap()
+            return JumboFieldProxy(loader)
+        return loader()
 
     if parse_json:
-        return json_loads_or_raw(content)
+        return json_loads_or_raw(content, object_hook=_decode_references)
 
     return content
 
 
-def encode(message, max_length, allow_jumbo_fields=True):
+def encode(message, max_length, allow_jumbo_fields=True, allow_compression=True):
+    """
+    Encode a message for a SWF field of *max_length* characters. A message too
+    long is compressed (if enabled by ``SIMPLEFLOW_COMPRESS_FIELDS``), then
+    stored as a jumbo field if it's still too long.
+    """
     if not message:
         return message
 
     can_use_jumbo_fields = allow_jumbo_fields and _jumbo_fields_bucket()
 
     if len(message) > max_length:
+        compressed = None
+        if allow_compression and settings.SIMPLEFLOW_COMPRESS_FIELDS:
+            compressed = _compress(message)
+            # base64 makes it 4/3 larger
+            if len(constants.COMPRESSED_FIELDS_PREFIX) + (len(compressed) + 2) // 3 * 4 <= max_length:
+                return constants.COMPRESSED_FIELDS_PREFIX + base64.b64encode(compressed).decode('ascii')
+
         if not can_use_jumbo_fields:
             _log_message_too_long(message)
             raise JumboTooLargeError("Message too long ({} chars)".format(len(message)))
@@ -65,7 +194,7 @@ def encode(message, max_length, allow_jumbo_fields=True):
             _log_message_too_long(message)
             raise JumboTooLargeError("Message too long even for a jumbo field ({} chars)".format(len(message)))
 
-        jumbo_signature = _push_jumbo_field(message)
+        jumbo_signature = _push_jumbo_field(message, compressed)
         if len(jumbo_signature) > max_length:
             raise JumboTooLargeError(
                 "Jumbo field signature is longer than the max allowed length "
@@ -76,77 +205,176 @@ def encode(message, max_length, allow_jumbo_fields=True):
     return message
 
 
+def _cache_key(path):
+    # a dedicated cache key because the disk cache may be shared with other
+    # features of simpleflow
+    return "jumbo_fields/" + path.split("/")[-1]
+
+
 def _get_cached(path):
-    # 1/ memory cache
-    if path in JUMBO_FIELDS_MEMORY_CACHE:
-        return JUMBO_FIELDS_MEMORY_CACHE[path]
-
-    # 2/ disk cache
-    if SIMPLEFLOW_ENABLE_DISK_CACHE:
-        try:
-            # NB: this cache may also be triggered on activity workers, where it's not that
-            # useful. The performance hit should be minimal. To be improved later.
-            # NB2: cache has to be lazily instantiated here, cache objects do not survive forks,
-            # see DiskCache docs.
-            cache = Cache(constants.CACHE_DIR)
-            # generate a dedicated cache key because this cache may be shared with other
-            # features of simpleflow at some point
-            cache_key = "jumbo_fields/" + path.split("/")[-1]
-            if cache_key in cache:
-                logger.debug("diskcache: getting key={} from cache_dir={}".format(cache_key, constants.CACHE_DIR))
-                return cache[cache_key]
-        except OperationalError:
-            logger.warning("diskcache: got an OperationalError, skipping cache usage")
-
-    # nothing to return, but better be explicit here
-    return
+    return JUMBO_FIELDS_CACHE.get(_cache_key(path))
 
 
 def _set_cached(path, content):
-    # 1/ memory cache
-    JUMBO_FIELDS_MEMORY_CACHE[path] = content
+    JUMBO_FIELDS_CACHE.set(_cache_key(path), content)
 
-    # 2/ disk cache
-    if SIMPLEFLOW_ENABLE_DISK_CACHE:
-        try:
-            cache = Cache(constants.CACHE_DIR)
-            cache_key = "jumbo_fields/" + path.split("/")[-1]
-            logger.debug("diskcache: setting key={} on cache_dir={}".format(cache_key, constants.CACHE_DIR))
-            cache.set(cache_key, content, expire=3 * constants.HOUR)
-        except OperationalError:
-            logger.warning("diskcache: got an OperationalError on write, skipping cache write")
 
-
-def _push_jumbo_field(message):
-    size = len(message)
-    uuid = str(uuid4())
+def _new_jumbo_field_location(name=None):
+    name = name or str(uuid4())
     bucket_with_dir = _jumbo_fields_bucket()
     if "/" in bucket_with_dir:
         bucket, directory = _jumbo_fields_bucket().split("/", 1)
-        path = "{}/{}".format(directory, uuid)
+        path = "{}/{}".format(directory, name)
     else:
         bucket = bucket_with_dir
-        path = uuid
+        path = name
+    return bucket, path
+
 
-    storage.push_content(bucket, path, message)
+def _is_stored(bucket, path):
+    """
+    Whether a content-addressed jumbo field is already stored.
+    """
+    if (bucket, path) in JUMBO_FIELDS_STORED:
+        return True
+    if storage.exists(bucket, path):
+        JUMBO_FIELDS_STORED.add((bucket, path))
+        return True
+    return False
+
+
+def _push_jumbo_field(message, compressed=None):
+    size = len(message)
+    digest = None
+    if settings.SIMPLEFLOW_JUMBO_FIELDS_CONTENT_ADDRESSED:
+        digest = hashlib.sha256(_to_bytes(message)).hexdigest()
+    bucket, path = _new_jumbo_field_location(digest)
+
+    if digest is not None and _is_stored(bucket, path):
+        logger.debug("jumbo fields: {}/{} already stored".format(bucket, path))
+    else:
+        if compressed is not None:
+            storage.push_content(bucket, path, constants.COMPRESSED_FIELDS_PREFIX.encode('ascii') + compressed)
+        else:
+            storage.push_content(bucket, path, message)
+        if digest is not None:
+            JUMBO_FIELDS_STORED.add((bucket, path))
     _set_cached(path, message)
 
     return "{}{}/{} {}".format(constants.JUMBO_FIELDS_PREFIX, bucket, path, size)
 
 
+def push_jumbo_file(filename):
+    """
+    Upload a file as a jumbo field, without reading it in memory.
+
+    :param filename: path of the file
+    :type filename: str
+    :returns: the jumbo field signature, or None if jumbo fields are disabled
+    :rtype: Optional[str]
+    """
+    if not _jumbo_fields_bucket():
+        return None
+    size = os.path.getsize(filename)
+    digest = None
+    if settings.SIMPLEFLOW_JUMBO_FIELDS_CONTENT_ADDRESSED:
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 ** 2), b''):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+    bucket, path = _new_jumbo_field_location(digest)
+    if digest is None or not _is_stored(bucket, path):
+        storage.push(bucket, path, filename)
+        if digest is not None:
+            JUMBO_FIELDS_STORED.add((bucket, path))
+    return "{}{}/{} {}".format(constants.JUMBO_FIELDS_PREFIX, bucket, path, size)
+
+
 def _pull_jumbo_field(location):
+    global JUMBO_FIELDS_PULLS
     bucket, path = location.replace(constants.JUMBO_FIELDS_PREFIX, "").split("/", 1)
 
     cached_value = _get_cached(path)
     if cached_value:
         return cached_value
 
-    content = storage.pull_content(bucket, path)
+    content = _decode_jumbo_content(storage.pull_content(bucket, path, encoding=None))
+    with _JUMBO_FIELDS_PULLS_LOCK:
+        JUMBO_FIELDS_PULLS += 1
     _set_cached(path, content)
 
     return content
 
 
+def is_jumbo_field(content):
+    return isinstance(content, compat.string_types) and content.startswith(constants.JUMBO_FIELDS_PREFIX)
+
+
+def _prefetch_jumbo_field(location):
+    try:
+        _pull_jumbo_field(location)
+    except Exception as err:
+        # Decoding the field will raise if it's really needed
+        logger.warning("jumbo fields: cannot prefetch {}: {}".format(location, err))
+
+
+def prefetch_jumbo_fields(signatures, nb_threads=JUMBO_FIELDS_PREFETCH_THREADS, max_size=None):
+    """
+    Pull jumbo fields to the cache concurrently, so that decoding them later
+    doesn't pull them one at a time.
+
+    :param signatures: jumbo fields signatures
+    :type signatures: Iterable[str]
+    :param nb_threads: number of concurrent pulls
+    :type nb_threads: int
+    :param max_size: only the first fields up to this total size are pulled,
+        e.g. the size of the cache, as the next ones would evict them
+    :type max_size: Optional[int]
+    :returns: number of fields pulled
+    :rtype: int
+    """
+    locations = []
+    seen = set()
+    total_size = 0
+    for signature in signatures:
+        location, size = signature.split()[:2]
+        if location in seen:
+            continue
+        seen.add(location)
+        _bucket, path = location.replace(constants.JUMBO_FIELDS_PREFIX, "").split("/", 1)
+        if _get_cached(path) is not None:
+            continue
+        total_size += int(size)
+        if max_size is not None and total_size > max_size:
+            logger.debug("jumbo fields: prefetch limited to {} fields".format(len(locations)))
+            break
+        locations.append(location)
+    if not locations:
+        return 0
+
+    # Resolve the buckets before sharing them between threads
+    for location in locations:
+        storage.get_bucket(location.replace(constants.JUMBO_FIELDS_PREFIX, "").split("/", 1)[0])
+    pool = ThreadPool(min(nb_threads, len(locations)))
+    try:
+        pool.map(_prefetch_jumbo_field, locations)
+    finally:
+        pool.close()
+        pool.join()
+    return len(locations)
+
+
+def decode_lazily(content, default=None):
+    """
+    Like `decode`, but the content is only decoded when the value is first
+    used; *default* if there's no content.
+    """
+    if content is None:
+        return default
+    return lazy_object_proxy.Proxy(functools.partial(decode, content))
+
+
 def _log_message_too_long(message):
     if len(message) > constants.MAX_LOG_FIELD:
         message = "{} <...truncated to {} chars>".format(
@@ -171,7 +399,7 @@ def identity(message):
     # we don't allow the use of jumbo fields for identity because it's guaranteed
     # to change on every task, and we fear it makes the decider too slow
     # NB: this should be revisited / questionned later, maybe not such a problem?
-    return encode(message, constants.MAX_IDENTITY_LENGTH, allow_jumbo_fields=False)
+    return encode(message, constants.MAX_IDENTITY_LENGTH, allow_jumbo_fields=False, allow_compression=False)
 
 
 def input(message):
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import lazy_object_proxy
+
 from simpleflow._decorators import deprecated
 from simpleflow import exceptions
 
@@ -47,14 +49,19 @@ def wait(*fs):
 
     Raises a ``exceptions.ExecutionBlocked`` otherwise.
 
+    The results that weren't computed yet are computed on first use (see
+    :meth:`Future.lazy_result`).
+
     """
     if any(future.state == PENDING for future in fs):
         raise exceptions.ExecutionBlocked()
 
-    return [future.result for future in fs]
+    return [future.lazy_result() for future in fs]
 
 
 class Future(object):
+    _get_result = None  # Called to get the result on first access
+
     def __init__(self):
         """Represents the state of a computation.
 
@@ -81,9 +88,20 @@ class Future(object):
         """Raise a cls::`exceptions.ExecutionBlocked` when the result is not
         available and the future was not cancelled."""
         if self.done:
+            if self._get_result is not None:
+                self._result = self._get_result()
+                self._get_result = None
             return self._result
         return self.wait()
 
+    def lazy_result(self):
+        """Like ``result``, but a result that wasn't computed yet is returned
+        as a proxy computing it on first use: it can be passed on to another
+        task without being computed."""
+        if self.done and self._get_result is not None:
+            return lazy_object_proxy.Proxy(self._get_result)
+        return self.result
+
     def cancel(self):
         """Cancel a future.
 
@@ -156,6 +174,19 @@ class Future(object):
     def set_finished(self, result):
         self._state = FINISHED
         self._result = result
+        self._get_result = None
+
+    def set_finished_lazily(self, get_result):
+        """
+        Set state to finished; the result is computed by *get_result* when
+        first accessed, e.g. to only decode it if needed.
+
+        :param get_result: callable returning the result
+        :type get_result: Callable[[], Any]
+        """
+        self._state = FINISHED
+        self._result = None
+        self._get_result = get_result
 
     def set_cancelled(self):
         self._state = CANCELLED
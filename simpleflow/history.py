@@ -1,6 +1,22 @@
 import collections
+import copy
 
-from simpleflow import logger
+from simpleflow import format, logger
+
+
+def lazy_input(event):
+    """
+    Input of an event, decoded when first used: the history keeps the inputs
+    of all the tasks, but a decision seldom reads them.
+    """
+    return format.decode_lazily(event.get_raw('input'), {})
+
+
+def lazy_control(event):
+    """
+    Control of an event, decoded when first used.
+    """
+    return format.decode_lazily(event.get_raw('control'))
 
 
 # noinspection PyUnresolvedReferences
@@ -26,6 +42,18 @@ class History(object):
     :type _timers: dict[str, dict[str, Any]]]
     :ivar _tasks: ordered list of tasks/etc
     :type _tasks: list[dict[str, Any]]
+    :ivar _last_event_id: ID of the last parsed event
+    :type _last_event_id: int
+    :ivar _recorded_markers: last recorded marker, by name and JSON details
+    :type _recorded_markers: dict[tuple[str, Optional[str]], dict[str, Any]]
+    :ivar _marker_details: decoded details of the markers, by event ID
+    :type _marker_details: dict[int, Any]
+    :ivar _open_child_workflows: started child workflows, by workflow ID
+    :type _open_child_workflows: collections.OrderedDict[str, dict[str, Any]]
+    :ivar _signaled_workflows_ids: (workflow ID, run ID) of the signaled workflows, by signal name
+    :type _signaled_workflows_ids: collections.defaultdict[str, set[tuple[str, str]]]
+    :ivar _signaled_workflows_index: first signaled workflow by signal name, workflow ID and maybe run ID
+    :type _signaled_workflows_index: dict[tuple, dict[str, Any]]
     """
 
     def __init__(self, history):
@@ -43,6 +71,12 @@ class History(object):
         self._cancel_failed = None
         self.started_decision_id = None
         self.completed_decision_id = None
+        self._last_event_id = 0
+        self._recorded_markers = {}
+        self._marker_details = {}
+        self._open_child_workflows = collections.OrderedDict()
+        self._signaled_workflows_ids = collections.defaultdict(set)
+        self._signaled_workflows_index = {}
 
     @property
     def swf_history(self):
@@ -125,6 +159,31 @@ class History(object):
         """
         return self._signaled_workflows
 
+    @property
+    def open_child_workflows(self):
+        """
+        :return: started (and not yet closed) child WFs, by workflow ID
+        :rtype: collections.OrderedDict[str, dict[str, Any]]
+        """
+        return self._open_child_workflows
+
+    @property
+    def signaled_workflows_ids(self):
+        """
+        :return: (workflow ID, run ID) of the signaled workflows, by signal name
+        :rtype: collections.defaultdict[str, set[tuple[str, str]]]
+        """
+        return self._signaled_workflows_ids
+
+    def find_signaled_workflow(self, signal_name, workflow_id, run_id=None):
+        """
+        First workflow signaled with *signal_name*, matching *workflow_id* and
+        *run_id* if set.
+
+        :rtype: Optional[dict[str, Any]]
+        """
+        return self._signaled_workflows_index.get((signal_name, workflow_id, run_id))
+
     @property
     def markers(self):
         """
@@ -134,6 +193,33 @@ class History(object):
         """
         return self._markers
 
+    def find_recorded_marker(self, name, details):
+        """
+        Last marker recorded with *name* and *details*.
+
+        :param name: marker name
+        :type name: str
+        :param details: JSON-encoded details, as recorded
+        :type details: Optional[str]
+        :rtype: Optional[dict[str, Any]]
+        """
+        return self._recorded_markers.get((name, details))
+
+    def get_marker_details(self, marker):
+        """
+        Decoded details of a marker; they're decoded once. Each caller gets
+        its own copy, as workflow code may change them.
+
+        :type marker: dict[str, Any]
+        :rtype: Any
+        """
+        event_id = marker['event_id']
+        try:
+            details = self._marker_details[event_id]
+        except KeyError:
+            details = self._marker_details[event_id] = format.decode(marker['details'])
+        return copy.deepcopy(details)
+
     @property
     def timers(self):
         # type: () -> Dict[str, Dict[str, Any]]
@@ -156,6 +242,14 @@ class History(object):
         """
         return self._history.events
 
+    @property
+    def last_event_id(self):
+        """
+        :return: ID of the last parsed event, 0 if nothing was parsed yet.
+        :rtype: int
+        """
+        return self._last_event_id
+
     def parse_activity_event(self, events, event):
         """
         Aggregate all the attributes of an activity in a single entry.
@@ -184,9 +278,9 @@ class History(object):
                 'state': event.state,
                 'scheduled_id': event.id,
                 'scheduled_timestamp': event.timestamp,
-                'input': event.input,
+                'input': lazy_input(event),
                 'task_list': event.task_list['name'],
-                'control': event.control,
+                'control': lazy_control(event),
                 'decision_task_completed_event_id': event.decision_task_completed_event_id,
             }
             if event.activity_id not in self._activities:
@@ -319,6 +413,7 @@ class History(object):
             initiated_event = events[event.initiated_event_id - 1]
             return self._child_workflows[initiated_event.workflow_id]
 
+        workflow = None
         if event.state == 'start_initiated':
             workflow = {
                 'type': 'child_workflow',
@@ -328,9 +423,9 @@ class History(object):
                 'state': event.state,
                 'initiated_event_id': event.id,
                 'raw_input': event.raw.get('input'),  # FIXME obsolete; any user out there?
-                'input': event.input,
+                'input': lazy_input(event),
                 'child_policy': event.child_policy,
-                'control': event.control,
+                'control': lazy_control(event),
                 'tag_list': getattr(event, 'tag_list', None),
                 'task_list': event.task_list['name'],
                 'initiated_event_timestamp': event.timestamp,
@@ -357,7 +452,7 @@ class History(object):
                 'cause': event.cause,
                 'name': event.workflow_type['name'],
                 'version': event.workflow_type['version'],
-                'control': event.control,
+                'control': lazy_control(event),
                 'start_failed_id': event.id,
                 'start_failed_timestamp': event.timestamp,
                 'decision_task_completed_event_id': event.decision_task_completed_event_id,
@@ -430,6 +525,12 @@ class History(object):
                 'terminated_timestamp': event.timestamp,
             })
 
+        if workflow is not None:
+            if workflow['state'] == 'started':
+                self._open_child_workflows[workflow['id']] = workflow
+            else:
+                self._open_child_workflows.pop(workflow['id'], None)
+
     def parse_workflow_event(self, events, event):
         """
         Parse a workflow event.
@@ -444,7 +545,7 @@ class History(object):
                 'external_initiated_event_id': getattr(event, 'external_initiated_event_id', None),
                 'external_run_id': getattr(event, 'external_workflow_execution', {}).get('runId'),
                 'external_workflow_id': getattr(event, 'external_workflow_execution', {}).get('workflowId'),
-                'input': event.input,
+                'input': lazy_input(event),
                 'event_id': event.id,
                 'timestamp': event.timestamp,
             }
@@ -490,8 +591,8 @@ class History(object):
                 'signal_name': event.signal_name,
                 'state': event.state,
                 'initiated_event_id': event.id,
-                'input': event.input,
-                'control': event.control,
+                'input': lazy_input(event),
+                'control': lazy_control(event),
                 'initiated_event_timestamp': event.timestamp,
             }
             self._external_workflows_signaling[event.id] = workflow
@@ -502,8 +603,8 @@ class History(object):
                 'cause': event.cause,
                 'signal_failed_timestamp': event.timestamp,
             })
-            if event.control:
-                workflow['control'] = event.control
+            if event.get_raw('control'):
+                workflow['control'] = lazy_control(event)
         elif event.state == 'execution_signaled':
             workflow = self._external_workflows_signaling[event.initiated_event_id]
             workflow.update({
@@ -514,13 +615,19 @@ class History(object):
                 'signaled_timestamp': event.timestamp,
             })
             self._signaled_workflows[workflow['signal_name']].append(workflow)
+            self._signaled_workflows_ids[workflow['signal_name']].add((workflow['workflow_id'], workflow['run_id']))
+            for key in (
+                (workflow['signal_name'], workflow['workflow_id'], None),
+                (workflow['signal_name'], workflow['workflow_id'], workflow['run_id']),
+            ):
+                self._signaled_workflows_index.setdefault(key, workflow)
         elif event.state == 'request_cancel_execution_initiated':
             workflow = {
                 'type': 'external_workflow',
                 'id': event.workflow_id,
                 'run_id': getattr(event, 'run_id', None),
                 'state': event.state,
-                'control': event.control,
+                'control': lazy_control(event),
                 'initiated_event_id': event.id,
                 'initiated_event_timestamp': event.timestamp,
             }
@@ -539,8 +646,8 @@ class History(object):
                 'state': event.state,
                 'cause': event.cause,
             })
-            if event.control:
-                workflow['control'] = event.control
+            if event.get_raw('control'):
+                workflow['control'] = lazy_control(event)
             workflow['request_cancel_failed_timestamp'] = event.timestamp
         elif event.state == 'execution_cancel_requested':
             workflow = get_workflow(self._external_workflows_canceling)
@@ -562,6 +669,7 @@ class History(object):
                 'timestamp': event.timestamp,
             }
             self._markers.setdefault(event.marker_name, []).append(marker)
+            self._recorded_markers[(marker['name'], marker['details'])] = marker
         elif event.state == 'record_failed':
             marker = {
                 'type': 'marker',
@@ -580,7 +688,7 @@ class History(object):
                 'id': event.timer_id,
                 'state': event.state,
                 'start_to_fire_timeout': int(event.start_to_fire_timeout),
-                'control': event.control,
+                'control': lazy_control(event),
                 'started_event_id': event.id,
                 'started_event_timestamp': event.timestamp,
                 'decision_task_completed_event_id': event.decision_task_completed_event_id,
@@ -651,13 +759,34 @@ class History(object):
         """
         Parse the events.
         Update the corresponding statuses.
+
+        Only the events following the last parsed one are handled, so calling
+        this method again after :meth:`extend` is incremental.
         """
 
         events = self.events
-        for event in events:
+        for event in events[self._last_event_id:]:
             parser = self.TYPE_TO_PARSER.get(event.type)
             if parser:
                 parser(self, events, event)
+        self._last_event_id = len(events)
+
+    def extend(self, history):
+        """
+        Replace the underlying SWF history with a more recent version of the
+        same execution history, and parse the new events.
+
+        SWF histories are append-only: the first events of *history* must be
+        the ones already parsed.
+
+        :param history: more recent history of the same workflow execution
+        :type history: swf.models.history.History
+        """
+        if len(history) < self._last_event_id:
+            raise ValueError('history has {} events, already parsed {}'.format(
+                len(history), self._last_event_id))
+        self._history = history
+        self.parse()
 
     @staticmethod
     def get_event_id(event):
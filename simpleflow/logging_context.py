@@ -1,4 +1,6 @@
+import contextlib
 import os
+import threading
 
 
 ENV_KEYS = {
@@ -11,16 +13,47 @@ ENV_KEYS = {
 }
 
 
+# Context of the current thread, in a thread_local() block
+_local = threading.local()
+
+
 def set(key, value):
     env_var = ENV_KEYS[key]
-    os.environ[env_var] = str(value)
+    values = getattr(_local, "values", None)
+    if values is not None:
+        values[env_var] = str(value)
+    else:
+        os.environ[env_var] = str(value)
 
 
 def get(key):
     env_var = ENV_KEYS[key]
+    values = getattr(_local, "values", None)
+    if values is not None and env_var in values:
+        return values[env_var]
     return os.getenv(env_var, "")
 
 
 def reset():
+    values = getattr(_local, "values", None)
+    if values is not None:
+        values.clear()
+        return
     for env_var in ENV_KEYS.values():
         os.environ[env_var] = ""
+
+
+@contextlib.contextmanager
+def thread_local():
+    """
+    Keep the context set in this block to the current thread, e.g. for tasks
+    running concurrently in threads; the keys it doesn't set are read from
+    the process context. Unlike the process context, it isn't passed to the
+    child processes.
+    """
+    previous = getattr(_local, "values", None)
+    _local.values = {}
+    try:
+        yield
+    finally:
+        _local.values = previous
@@ -0,0 +1,109 @@
+import time
+
+import psutil
+
+from simpleflow import logger
+
+
+class Autoscaler(object):
+    """
+    Decide how many children a `Supervisor` should run, from the backlog of
+    the task list its children poll.
+
+    Every *interval* seconds, the backlog is read:
+
+    - if tasks are pending, all the children are busy: grow by the number of
+      pending tasks, unless the host is short on CPU or memory;
+    - if no task was pending for *scale_down_after* checks in a row, shrink
+      by one child.
+
+    The number of children stays between *min_children* and *max_children*.
+    """
+
+    def __init__(self, backlog, min_children=1, max_children=None, interval=30,
+                 scale_down_after=3, max_cpu_percent=90, max_memory_percent=90,
+                 clock=time.time):
+        """
+        :param backlog: returns the number of pending tasks
+        :type backlog: () -> int
+        :param min_children:
+        :type min_children: int
+        :param max_children: default: number of CPUs
+        :type max_children: Optional[int]
+        :param interval: seconds between two backlog reads
+        :type interval: float
+        :param scale_down_after: number of checks without backlog before shrinking
+        :type scale_down_after: int
+        :param max_cpu_percent: don't grow when the host CPU usage is higher
+        :type max_cpu_percent: float
+        :param max_memory_percent: don't grow when the host memory usage is higher
+        :type max_memory_percent: float
+        """
+        if max_children is None:
+            max_children = max(psutil.cpu_count(), min_children)
+        if not 0 <= min_children <= max_children:
+            raise ValueError('invalid children range: {}-{}'.format(min_children, max_children))
+        self._backlog = backlog
+        self.min_children = min_children
+        self.max_children = max_children
+        self.interval = interval
+        self.scale_down_after = scale_down_after
+        self.max_cpu_percent = max_cpu_percent
+        self.max_memory_percent = max_memory_percent
+        self._clock = clock
+        self._checked_at = None
+        self._idle_checks = 0
+        self._target = None
+        # The first call returns 0.0: the next ones measure the usage since
+        # the previous call
+        psutil.cpu_percent()
+
+    def _clamp(self, nb_children):
+        return min(max(nb_children, self.min_children), self.max_children)
+
+    def has_headroom(self):
+        """
+        Whether the host has the CPU and memory for more children.
+        """
+        cpu_percent = psutil.cpu_percent()
+        memory_percent = psutil.virtual_memory().percent
+        if cpu_percent > self.max_cpu_percent or memory_percent > self.max_memory_percent:
+            logger.info('autoscaler: not growing, cpu={}% memory={}%'.format(cpu_percent, memory_percent))
+            return False
+        return True
+
+    def nb_children(self, current):
+        """
+        Number of children to run.
+
+        :param current: number of children running
+        :type current: int
+        :rtype: int
+        """
+        now = self._clock()
+        if self._checked_at is not None and now - self._checked_at < self.interval:
+            return self._target if self._target is not None else self._clamp(current)
+        self._checked_at = now
+
+        try:
+            backlog = self._backlog()
+        except Exception as err:
+            logger.warning('autoscaler: cannot read the backlog: {}'.format(err))
+            self._target = self._clamp(current)
+            return self._target
+
+        target = current
+        if backlog > 0:
+            self._idle_checks = 0
+            if current < self.max_children and self.has_headroom():
+                target = current + backlog
+        else:
+            self._idle_checks += 1
+            if self._idle_checks >= self.scale_down_after:
+                self._idle_checks = 0
+                target = current - 1
+        target = self._clamp(target)
+        if target != current:
+            logger.info('autoscaler: backlog={}, {} -> {} children'.format(backlog, current, target))
+        self._target = target
+        return target
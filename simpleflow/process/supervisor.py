@@ -1,6 +1,10 @@
+import collections
+import errno
+import fcntl
 import functools
 import multiprocessing
 import os
+import select
 import signal
 import time
 import types
@@ -23,6 +27,10 @@ def reset_signal_handlers(func):
         signal.signal(signal.SIGTERM, signal.SIG_DFL)
         signal.signal(signal.SIGINT, signal.SIG_DFL)
         signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        try:
+            signal.set_wakeup_fd(-1)
+        except ValueError:  # Not in the main thread
+            pass
         return func(*args, **kwargs)
 
     wrapped.__wrapped__ = func
@@ -33,16 +41,21 @@ def _void_handle_sigchld(signum, frame):
     """
     Default action for a SIGCHLD signal handling is to ignore it
     which in practice has no effect on the running program. Having
-    a handler that does nothing is a bit different, in the sense
-    it will interrupt the execution of any "time.sleep()" routing.
-    From "time" module docs:
+    a handler, even one that does nothing, is a bit different: the
+    signal is then written to the wakeup fd (see `signal.set_wakeup_fd()`),
+    which wakes up the supervisor loop.
+    """
+    pass
 
-        The actual suspension time may be less than that requested
-        because any caught signal will terminate the sleep()
-        following execution of that signal's catching routine.
 
+def exit_code(status):
     """
-    pass
+    Exit code from a `os.waitpid()` status: negative if the process was
+    killed by a signal, like `multiprocessing.Process.exitcode`.
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
 
 
 class Supervisor(NamedMixin):
@@ -58,7 +71,7 @@ class Supervisor(NamedMixin):
     style.
     """
 
-    def __init__(self, payload, arguments=None, nb_children=None, background=False):
+    def __init__(self, payload, arguments=None, nb_children=None, background=False, autoscaler=None):
         """
         Initializes a Manager() instance, with a payload (a callable that will be
         executed on worker processes), some arguments (a list or tuple of arguments
@@ -73,9 +86,14 @@ class Supervisor(NamedMixin):
         :type nb_children: int
         :param background: wether the supervisor process should launch in background
         :type background: bool
+        :param autoscaler: if set, decides the number of children instead of
+            nb_children
+        :type autoscaler: Optional[simpleflow.process.Autoscaler]
         """
         # NB: below, compare explicitly to "None" there because nb_children could be 0
-        if nb_children is None:
+        if autoscaler is not None:
+            self._nb_children = autoscaler.min_children
+        elif nb_children is None:
             self._nb_children = multiprocessing.cpu_count()
         else:
             self._nb_children = nb_children
@@ -84,9 +102,16 @@ class Supervisor(NamedMixin):
         self._named_mixin_properties = ["_payload_friendly_name", "_nb_children"]
         self._args = arguments if arguments is not None else ()
         self._background = background
+        self._autoscaler = autoscaler
 
         self._processes = {}
+        self._scaled_down = set()  # pids asked to stop by the autoscaler
         self._terminating = False
+        self._wakeup_fd = None
+
+        # counters
+        self.nb_restarts = 0
+        self.exit_codes = collections.Counter()
 
         super(Supervisor, self).__init__()
 
@@ -104,24 +129,50 @@ class Supervisor(NamedMixin):
             self.target()
 
     def _cleanup_worker_processes(self):
-        # cleanup children
-        to_remove = []
-        for pid, child in self._processes.items():
+        """
+        Reap the worker processes that exited, without blocking. Only our
+        worker processes are waited for, not the other children of the
+        process.
+        """
+        for pid in list(self._processes):
             try:
-                name, status = child.name(), child.status()
-            except psutil.NoSuchProcess:  # May be untimely deceased
-                name, status = "unknown", "unknown"
-            logger.debug("  child: name=%s pid=%d status=%s" % (name, child.pid, status))
-            if status in (psutil.STATUS_ZOMBIE, "unknown"):
-                logger.debug("  process {} is zombie, will cleanup".format(child.pid))
-                # join process to clean it up
-                child.wait()
-                # set the process to be removed from self._processes
-                to_remove.append(pid)
-
-        # cleanup our internal state (self._processes)
-        for pid in to_remove:
+                waited_pid, status = os.waitpid(pid, os.WNOHANG)
+            except OSError as err:
+                if err.errno != errno.ECHILD:
+                    raise
+                waited_pid, status = pid, None  # Already reaped
+            if not waited_pid:
+                continue
+            code = exit_code(status) if status is not None else None
+            logger.info("process: pid={} exited with code={}".format(pid, code))
+            self.exit_codes[code] += 1
+            if pid not in self._scaled_down and not self._terminating:
+                self.nb_restarts += 1  # Replaced right away
             del self._processes[pid]
+            self._scaled_down.discard(pid)
+
+    def _check_services(self):
+        """
+        Check the services the worker processes depend on, e.g. to restart
+        them. Nothing to do by default.
+        """
+
+    def _autoscale(self):
+        """
+        Update self._nb_children from the autoscaler, and ask the extra worker
+        processes to stop; they finish their current task first.
+        """
+        if self._autoscaler is None or self._terminating:
+            return
+        running = sorted(pid for pid in self._processes if pid not in self._scaled_down)
+        self._nb_children = self._autoscaler.nb_children(len(running))
+        for pid in running[self._nb_children:]:
+            logger.info("process: scaling down, sending SIGTERM to pid={}".format(pid))
+            try:
+                self._processes[pid].terminate()
+            except psutil.NoSuchProcess:
+                pass
+            self._scaled_down.add(pid)
 
     def _start_worker_processes(self):
         """
@@ -130,7 +181,7 @@ class Supervisor(NamedMixin):
         """
         if self._terminating:
             return
-        for _ in range(len(self._processes), self._nb_children):
+        for _ in range(len(self._processes) - len(self._scaled_down), self._nb_children):
             child = multiprocessing.Process(
                 target=reset_signal_handlers(self._payload),
                 args=self._args
@@ -170,16 +221,56 @@ class Supervisor(NamedMixin):
 
             # start worker processes
             self._cleanup_worker_processes()
+            self._check_services()
+            self._autoscale()
             self._start_worker_processes()
 
-            # re-evaluate state at least every 5 seconds ; if a SIGCHLD happens during
-            # the "time.sleep()" below, it will be interrupted, making the code above
-            # run nearly immediately ; but if a SIGCHLD happens during the two calls
-            # above, the "time.sleep()" here won't be stopped, so better have it
-            # relatively short, but not too short since the above methods involve
-            # scanning a bunch of entries in /proc so that could become slow if we do
-            # it every 0.1s.
-            time.sleep(5)
+            # wait for a signal: SIGCHLD when a worker process exits, SIGTERM or
+            # SIGINT. Signals received since the calls above are already in the
+            # wakeup fd, so they aren't missed.
+            self._wait_for_signal(self._autoscaler.interval if self._autoscaler else None)
+
+    def _wait_for_signal(self, timeout=None):
+        """
+        Wait up to *timeout* seconds for a signal to be written to the wakeup fd.
+        """
+        if self._wakeup_fd is None:
+            # No wakeup fd: re-evaluate state every 5 seconds
+            time.sleep(5 if timeout is None else min(timeout, 5))
+            return
+        try:
+            ready, _, _ = select.select([self._wakeup_fd], [], [], timeout)
+        except select.error as err:  # Python 2: interrupted by the signal
+            if err.args[0] != errno.EINTR:
+                raise
+            return
+        if not ready:
+            return
+        try:
+            while os.read(self._wakeup_fd, 4096):
+                pass
+        except OSError as err:
+            if err.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def _set_wakeup_fd(self):
+        """
+        Have the signals written to a pipe, so that the main loop can wait
+        for them.
+        """
+        if self._wakeup_fd is not None:
+            return
+        read_fd, write_fd = os.pipe()
+        for fd in (read_fd, write_fd):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        try:
+            signal.set_wakeup_fd(write_fd)
+        except ValueError:  # Not in the main thread
+            os.close(read_fd)
+            os.close(write_fd)
+            return
+        self._wakeup_fd = read_fd
 
     def bind_signal_handlers(self):
         """
@@ -203,6 +294,7 @@ class Supervisor(NamedMixin):
 
         # bind SIGCHLD
         signal.signal(signal.SIGCHLD, _void_handle_sigchld)
+        self._set_wakeup_fd()
 
     @with_state("stopping")
     def terminate(self):
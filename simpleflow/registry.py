@@ -23,5 +23,13 @@ class Registry(object):
         """
         self._tasks[label][task.name] = task
 
+    def get_tasks(self):
+        """
+        All the registered activities, whatever their label.
+
+        :rtype: list[simpleflow.activity.Activity]
+        """
+        return [task for tasks in self._tasks.values() for task in tasks.values()]
+
 
 registry = Registry()
@@ -83,7 +83,12 @@ STEP_BUCKET = str
 METROLOGY_BUCKET = str
 METROLOGY_PATH_PREFIX = str_or_none
 
+SIMPLEFLOW_DECISION_METRICS = str_or_none
+
 SIMPLEFLOW_ENABLE_DISK_CACHE = bool
+SIMPLEFLOW_COMPRESS_FIELDS = bool
+SIMPLEFLOW_JUMBO_FIELDS_CONTENT_ADDRESSED = bool
+SIMPLEFLOW_JUMBO_FIELDS_BY_REFERENCE = bool
 SIMPLEFLOW_BINARIES_DIRECTORY = str
 
 ACTIVITY_SIGTERM_WAIT_SEC = float
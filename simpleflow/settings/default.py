@@ -52,7 +52,19 @@ LOGGING = {
 }
 SIMPLEFLOW_SYSLOG_TARGET = None
 
+# Decision metrics sinks, comma-separated: "log", "file:/path/to/metrics.jsonl"
+SIMPLEFLOW_DECISION_METRICS = None
+
 SIMPLEFLOW_ENABLE_DISK_CACHE = False
+# Compress the fields too long for SWF before making them jumbo fields;
+# enable it once all the deciders and workers can decode them
+SIMPLEFLOW_COMPRESS_FIELDS = False
+# Name jumbo fields objects after the hash of their content, and upload them
+# only once
+SIMPLEFLOW_JUMBO_FIELDS_CONTENT_ADDRESSED = False
+# Pass jumbo fields values to other tasks by reference, without pulling them;
+# enable it once all the deciders and workers can decode references
+SIMPLEFLOW_JUMBO_FIELDS_BY_REFERENCE = False
 SIMPLEFLOW_BINARIES_DIRECTORY = '/tmp/simpleflow-binaries'
 
 # Activity management
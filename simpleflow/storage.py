@@ -7,7 +7,7 @@ from boto.exception import S3ResponseError
 from . import logger, settings
 
 if TYPE_CHECKING:
-    from typing import Optional, Tuple  # NOQA
+    from typing import Optional, Tuple, Union  # NOQA
     from boto.s3.bucket import Bucket  # NOQA
     from boto.s3.bucketlistresultset import BucketListResultSet  # NOQA
 
@@ -90,11 +90,20 @@ def pull(bucket, path, dest_file):
     key.get_contents_to_filename(dest_file)
 
 
-def pull_content(bucket, path):
-    # type: (str, str) -> str
+def pull_content(bucket, path, encoding='utf-8'):
+    # type: (str, str, Optional[str]) -> Union[str, bytes]
+    """
+    Content of an object: bytes if *encoding* is None.
+    """
     bucket = get_bucket(bucket)
     key = bucket.get_key(path)
-    return key.get_contents_as_string(encoding='utf-8')
+    return key.get_contents_as_string(encoding=encoding)
+
+
+def exists(bucket, path):
+    # type: (str, str) -> bool
+    bucket = get_bucket(bucket)
+    return bucket.get_key(path) is not None
 
 
 def push(bucket, path, src_file, content_type=None):
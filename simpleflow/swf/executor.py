@@ -3,7 +3,6 @@ from __future__ import absolute_import
 import copy
 import inspect
 import hashlib
-import json
 import multiprocessing
 import re
 import traceback
@@ -27,6 +26,7 @@ from simpleflow.history import History
 from simpleflow.marker import Marker
 from simpleflow.signal import WaitForSignal
 from simpleflow.swf import constants
+from simpleflow.swf.metrics import DecisionMetrics
 from simpleflow.swf.helpers import swf_identity
 from simpleflow.swf.utils import DecisionsAndContext
 from simpleflow.swf.task import (
@@ -145,6 +145,21 @@ class TaskRegistry(dict):
         return self[name]
 
 
+# Fields of the history events read by the replay, prefetched if they're
+# jumbo fields. The inputs and controls of the scheduled tasks are only read
+# when they're rescheduled.
+PREFETCHED_FIELDS = {
+    'WorkflowExecutionStarted': ('input',),
+    'WorkflowExecutionSignaled': ('input',),
+    'MarkerRecorded': ('details',),
+    'ActivityTaskCompleted': ('result',),
+    'ActivityTaskFailed': ('reason', 'details'),
+    'ActivityTaskTimedOut': ('details',),
+    'ChildWorkflowExecutionCompleted': ('result',),
+    'ChildWorkflowExecutionFailed': ('reason', 'details'),
+}
+
+
 class Executor(executor.Executor):
     """
     Manage a workflow's execution with Amazon SWF. It replays the workflow's
@@ -168,6 +183,8 @@ class Executor(executor.Executor):
     :type _repair_workflow_id: Optional[str]
     :ivar repair_run_id: run ID to repair, if any
     :type _repair_run_id: Optional[str]
+    :ivar _metrics: metrics of the current decision
+    :type _metrics: DecisionMetrics
 
     """
 
@@ -193,6 +210,7 @@ class Executor(executor.Executor):
         self._tasks = TaskRegistry()
         self._idempotent_tasks_to_submit = set()
         self._execution = None
+        self._metrics = DecisionMetrics()
         self.current_priority = None
         self.handled_failures = {}
         self.created_activity_types = set()
@@ -293,8 +311,7 @@ class Executor(executor.Executor):
         elif state == 'started':
             future.set_running()
         elif state == 'completed':
-            result = event['result']
-            future.set_finished(format.decode(result))
+            future.set_finished_lazily(format.FieldLoader(event['result']))
         elif state == 'canceled':
             future.set_cancelled()
         elif state == 'failed':
@@ -354,7 +371,7 @@ class Executor(executor.Executor):
         elif state == 'started':
             future.set_running()
         elif state == 'completed':
-            future.set_finished(format.decode(event['result']))
+            future.set_finished_lazily(format.FieldLoader(event['result']))
         elif state == 'failed':
             future.set_exception(exceptions.TaskFailed(
                 name=event['id'],
@@ -529,16 +546,11 @@ class Executor(executor.Executor):
         :return:
         :rtype: Optional[dict]
         """
-        # FIXME could look directly in signaled_workflows?
         event = history.signals.get(a_task.name)
         if not event:
             if a_task.workflow_id is None:  # Broadcast, should be in signals
                 return None
-            signaled_workflows = history.signaled_workflows.get(a_task.name, [])
-            for w in signaled_workflows:
-                if w['workflow_id'] == a_task.workflow_id and (a_task.run_id is None or w['run_id'] == a_task.run_id):
-                    event = w
-                    break
+            event = history.find_signaled_workflow(a_task.name, a_task.workflow_id, a_task.run_id)
         return event
 
     def find_marker_event(self, a_task, history):
@@ -553,16 +565,7 @@ class Executor(executor.Executor):
         :rtype: Optional[dict[str, Any]]
         """
         json_details = json_dumps(a_task.details) if a_task.details is not None else None
-        marker_list = history.markers.get(a_task.name)
-        if not marker_list:
-            return None
-        marker_list = list(
-            filter(
-                lambda m: m['state'] == 'recorded' and m['details'] == json_details,
-                marker_list
-            )
-        )
-        return marker_list[-1] if marker_list else None
+        return history.find_recorded_marker(a_task.name, json_details)
 
     def find_timer_event(self, a_task, history):
         """
@@ -811,7 +814,8 @@ class Executor(executor.Executor):
             self._idempotent_tasks_to_submit.add(task_identifier)
 
         # NB: ``decisions`` contains a single decision.
-        decisions = a_task.schedule(self.domain, task_list, priority=self.current_priority, executor=self)
+        with self._metrics.timer('build_decisions'):
+            decisions = a_task.schedule(self.domain, task_list, priority=self.current_priority, executor=self)
 
         # Ready to schedule
         if isinstance(a_task, ActivityTask):
@@ -823,9 +827,9 @@ class Executor(executor.Executor):
         # schedule the requested task and block execution instead, with a timer
         # to wake up the workflow immediately after completing these decisions.
         # See: http://docs.aws.amazon.com/amazonswf/latest/developerguide/swf-dg-limits.html
-        # NB: here we use json.dumps, not json_dumps, since the serialization will
-        # happen inside boto.swf and is out of our control.
-        request_size = len(json.dumps(self._decisions_and_context.decisions + decisions))
+        # NB: sizes are computed with json.dumps, not json_dumps, since the
+        # serialization will happen inside boto.swf and is out of our control.
+        request_size = self._decisions_and_context.decisions_size(decisions)
         # We keep a 5kB of error margin for headers, json structure, and the
         # timer decision, and 32kB for the context, even if we don't use it now.
         if request_size > constants.MAX_REQUEST_SIZE - 5000 - 32000:
@@ -1040,6 +1044,28 @@ class Executor(executor.Executor):
         iterable = task.get_actual_value(iterable)
         return super(Executor, self).starmap(callable, iterable)
 
+    def prefetch_jumbo_fields(self, history):
+        # type: (swf.models.History) -> None
+        """
+        Pull the jumbo fields the replay reads concurrently, instead of one
+        at a time when it reads them: see ``PREFETCHED_FIELDS``. Only the
+        fields the memory cache can hold are pulled.
+        """
+        signatures = []
+        for raw_event in history.events.raw:
+            event_type = raw_event['eventType']
+            fields = PREFETCHED_FIELDS.get(event_type)
+            if not fields:
+                continue
+            attributes = raw_event.get('{}{}EventAttributes'.format(event_type[0].lower(), event_type[1:]), {})
+            for field in fields:
+                value = attributes.get(field)
+                if format.is_jumbo_field(value):
+                    signatures.append(value)
+        if signatures:
+            with self._metrics.timer('prefetch'):
+                format.prefetch_jumbo_fields(signatures, max_size=format.JUMBO_FIELDS_CACHE.memory_size)
+
     def replay(self, decision_response, decref_workflow=True):
         # type: (swf.responses.Response, bool) -> DecisionsAndContext
         """Replay the workflow from the start until it blocks.
@@ -1051,14 +1077,20 @@ class Executor(executor.Executor):
         :returns: a list of decision with an optional context
         """
         self.reset()
+        self._metrics = getattr(decision_response, 'metrics', None) or DecisionMetrics()
 
         # noinspection PyUnresolvedReferences
         history = decision_response.history
-        self._history = History(history)
-        self._history.parse()
+        # The decider may have parsed the history already (see HistoryCache).
+        self._history = getattr(decision_response, 'parsed_history', None)
+        if self._history is None:
+            with self._metrics.timer('parse'):
+                self._history = History(history)
+                self._history.parse()
         self.build_run_context(decision_response)
         # noinspection PyUnresolvedReferences
         self._execution = decision_response.execution
+        self.prefetch_jumbo_fields(history)
 
         workflow_started_event = history[0]
         input = workflow_started_event.input
@@ -1079,7 +1111,8 @@ class Executor(executor.Executor):
                         self.decref_workflow()
                     return DecisionsAndContext(decisions)
             self.propagate_signals()
-            result = self.run_workflow(*args, **kwargs)
+            with self._metrics.timer('replay'):
+                result = self.run_workflow(*args, **kwargs)
         except exceptions.ExecutionBlocked:
             logger.info('{} open activities ({} decisions)'.format(
                 self._open_activity_count,
@@ -1160,11 +1193,8 @@ class Executor(executor.Executor):
         :return:
         """
         events = self._history.events
-        last_completed_decision = next(
-            # next((generator), default) to prevent StopIteration. Python is fun :-)
-            (e for e in reversed(events) if e.type == 'DecisionTask' and e.state == 'completed'),
-            None
-        )
+        positions = events.positions(type='DecisionTask', state='completed')
+        last_completed_decision = events[positions[-1]] if positions else None
         last_decision_had_context = (
                 last_completed_decision and
                 hasattr(last_completed_decision, 'execution_context') and
@@ -1304,7 +1334,7 @@ class Executor(executor.Executor):
                 (self._run_context['parent_workflow_id'], self._run_context['parent_run_id'])
             )
         known_workflows_ids.extend(
-            (w['workflow_id'], w['run_id']) for w in history.child_workflows.values() if w['state'] == 'started'
+            (w['workflow_id'], w['run_id']) for w in history.open_child_workflows.values()
         )
 
         known_workflows_ids = frozenset(known_workflows_ids)
@@ -1326,9 +1356,7 @@ class Executor(executor.Executor):
                 signal['external_workflow_id'],
                 signal['external_run_id']
             )
-            signaled_workflows_ids = set(
-                (w['workflow_id'], w['run_id']) for w in history.signaled_workflows[name]
-            )
+            signaled_workflows_ids = history.signaled_workflows_ids.get(name, frozenset())
             not_signaled_workflows_ids = list(known_workflows_ids - signaled_workflows_ids - {sender})
             extra_input = {'__propagate': propagate}
             for workflow_id, run_id in not_signaled_workflows_ids:
@@ -1349,16 +1377,17 @@ class Executor(executor.Executor):
         return MarkerTask(name, details)
 
     def list_markers(self, all=False):
+        history = self._history
         if all:
             return [
-                Marker(m['name'], format.decode(m['details']))
-                for ml in self._history.markers.values() for m in ml
+                Marker(m['name'], history.get_marker_details(m))
+                for ml in history.markers.values() for m in ml
             ]
         rc = []
-        for ml in self._history.markers.values():
+        for ml in history.markers.values():
             m = ml[-1]
             if m['state'] == 'recorded':
-                rc.append(Marker(m['name'], format.decode(m['details'])))
+                rc.append(Marker(m['name'], history.get_marker_details(m)))
         return rc
 
     def get_event_details(self, event_type, event_name):
@@ -1378,7 +1407,7 @@ class Executor(executor.Executor):
                 return None
             # Make pleasing details
             marker = copy.copy(marker_list[-1])
-            marker['details'] = format.decode(marker['details'])
+            marker['details'] = self._history.get_marker_details(marker)
             return marker
         elif event_type == 'timer':
             return self._history.timers.get(event_name)
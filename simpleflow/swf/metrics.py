@@ -0,0 +1,181 @@
+from __future__ import absolute_import
+
+import collections
+import contextlib
+import time
+
+from simpleflow import logger, settings
+from simpleflow.utils import json_dumps
+
+
+if False:
+    from typing import Any, Callable, Dict, List, Optional  # NOQA
+    from swf.responses import Response  # NOQA
+
+
+class DecisionMetrics(object):
+    """
+    Timing breakdown and counters of a decision task.
+
+    The phases are, in order: ``poll``, ``paginate`` and ``build_events``
+    (see :meth:`swf.actors.Decider.poll`; pages are fetched one after the
+    other, and ``paginate`` includes adding the events of the next pages to
+    the event store, also counted in ``build_events``), ``parse``,
+    ``prefetch`` (of the jumbo fields), ``replay`` (including
+    ``build_decisions``) and ``complete``.
+
+    :ivar tags: workflow name, workflow and run IDs
+    :type tags: collections.OrderedDict[str, str]
+    :ivar timings: seconds spent in each phase
+    :type timings: collections.OrderedDict[str, float]
+    :ivar counters: events, decisions, request_bytes, jumbo_fetches,
+        jumbo_cache_hits...
+    :type counters: collections.OrderedDict[str, int]
+    """
+
+    def __init__(self, workflow_name=None, workflow_id=None, run_id=None, timings=None):
+        self.tags = collections.OrderedDict([
+            ('workflow_name', workflow_name),
+            ('workflow_id', workflow_id),
+            ('run_id', run_id),
+        ])
+        self.timings = collections.OrderedDict(timings or ())
+        self.counters = collections.OrderedDict()
+
+    @classmethod
+    def from_response(cls, decision_response):
+        # type: (Response) -> DecisionMetrics
+        """
+        Start the metrics of a decision task, with the timings recorded
+        when polling it.
+        """
+        execution = decision_response.execution
+        workflow_type = execution.workflow_type
+        metrics = cls(
+            workflow_name=workflow_type.name if workflow_type else None,
+            workflow_id=execution.workflow_id,
+            run_id=execution.run_id,
+            timings=getattr(decision_response, 'timings', None),
+        )
+        metrics.incr('events', len(decision_response.history))
+        return metrics
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__, self.as_dict())
+
+    @contextlib.contextmanager
+    def timer(self, phase):
+        """
+        Add the time spent in the block to *phase*.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.time() - start)
+
+    def add_time(self, phase, seconds):
+        self.timings[phase] = self.timings.get(phase, 0.) + seconds
+
+    def incr(self, counter, value=1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def as_dict(self):
+        # type: () -> Dict[str, Any]
+        return collections.OrderedDict([
+            ('tags', self.tags),
+            ('timings', collections.OrderedDict(
+                (phase, round(seconds, 6)) for phase, seconds in self.timings.items()
+            )),
+            ('counters', self.counters),
+        ])
+
+
+def log_sink(metrics):
+    """
+    Log the metrics as a JSON object.
+
+    :type metrics: Dict[str, Any]
+    """
+    logger.info('decision metrics: {}'.format(json_dumps(metrics)))
+
+
+class FileSink(object):
+    """
+    Append the metrics to a file, as JSON lines.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.path)
+
+    def __call__(self, metrics):
+        # Opened each time: we're called from forked processes.
+        with open(self.path, 'a') as f:
+            f.write(json_dumps(metrics) + '\n')
+
+
+def parse_sinks(spec):
+    # type: (Optional[str]) -> List[Callable]
+    """
+    Build the built-in sinks from a comma-separated list, like
+    ``log,file:/var/log/simpleflow/decisions.jsonl``.
+    """
+    sinks = []
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if item == 'log':
+            sinks.append(log_sink)
+        elif item.startswith('file:'):
+            sinks.append(FileSink(item[len('file:'):]))
+        else:
+            raise ValueError('invalid decision metrics sink: {!r}'.format(item))
+    return sinks
+
+
+_hooks = None  # type: Optional[List[Callable]]
+
+
+def get_hooks():
+    # type: () -> List[Callable]
+    """
+    Metrics hooks: the sinks of the SIMPLEFLOW_DECISION_METRICS setting,
+    then the ones added by :func:`add_hook`.
+    """
+    global _hooks
+    if _hooks is None:
+        _hooks = parse_sinks(settings.SIMPLEFLOW_DECISION_METRICS)
+    return _hooks
+
+
+def add_hook(hook):
+    """
+    Register a callable taking the metrics dict of each decision.
+
+    :type hook: Callable[[Dict[str, Any]], None]
+    """
+    get_hooks().append(hook)
+
+
+def remove_hook(hook):
+    get_hooks().remove(hook)
+
+
+def emit(metrics):
+    # type: (DecisionMetrics) -> None
+    """
+    Send the metrics to the hooks. Errors are logged, not raised.
+    """
+    hooks = get_hooks()
+    if not hooks:
+        return
+    data = metrics.as_dict()
+    for hook in hooks:
+        try:
+            hook(data)
+        except Exception as err:
+            logger.warning('decision metrics hook {!r} failed: {}'.format(hook, err))
@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 
+import collections
 import multiprocessing
 import os
 
@@ -11,11 +12,15 @@ import swf.models.decision
 from simpleflow import logger
 from simpleflow.process import Supervisor, with_state
 from simpleflow.swf.process import Poller
+from simpleflow.swf import metrics
+from simpleflow.swf.process.decider.history_cache import HistoryCache
+from simpleflow.swf.process.decider.pool import DecisionProcessPool
+from simpleflow.swf.process.decider import registration
 from simpleflow.swf.utils import DecisionsAndContext
 
 
 if False:
-    from typing import Any, List, Optional, Union  # NOQA
+    from typing import Any, List, Optional, Tuple, Union  # NOQA
     from swf.responses import Response  # NOQA
     from simpleflow.swf.executor import Executor  # NOQA
 
@@ -27,13 +32,21 @@ class Decider(Supervisor):
     :ivar _poller: decider poller.
     :type _poller: DeciderPoller
     """
-    def __init__(self, poller, nb_children=None):
+    def __init__(self, poller, nb_children=None, autoscaler=None):
         self._poller = poller
         super(Decider, self).__init__(
             payload=self._poller.start,
             nb_children=nb_children,
+            autoscaler=autoscaler,
         )
 
+    def register_types(self):
+        """
+        Register the missing activity and workflow types of the workflows,
+        before the pollers start.
+        """
+        self._poller.register_types()
+
 
 class DeciderPoller(Poller, swf.actors.Decider):
     """
@@ -45,6 +58,13 @@ class DeciderPoller(Poller, swf.actors.Decider):
     :type _workflow_executors: Dict[str, Executor]
     :ivar nb_retries: # of retries allowed
     :type nb_retries: int
+    :ivar _history_cache: parsed histories of the recently handled executions
+    :type _history_cache: Optional[HistoryCache]
+    :ivar _decision_pool: long-lived decision processes, if not forking for each decision
+    :type _decision_pool: Optional[DecisionProcessPool]
+    :ivar _known_events: raw history events of the recently handled executions, if only
+        fetching the new events
+    :type _known_events: Optional[collections.OrderedDict[Tuple[str, str], List[dict]]]
     """
     def __init__(self,
                  workflow_executors,  # type: List[Executor]
@@ -52,6 +72,11 @@ class DeciderPoller(Poller, swf.actors.Decider):
                  task_list,  # type: str
                  is_standalone,  # type: bool
                  nb_retries=3,  # type: int
+                 history_cache_size=None,  # type: Optional[int]
+                 nb_decision_processes=None,  # type: Optional[int]
+                 max_decisions_per_process=None,  # type: Optional[int]
+                 max_rss_per_process=None,  # type: Optional[int]
+                 delta_history=False,  # type: bool
                  *args,
                  **kwargs
                  ):
@@ -74,6 +99,21 @@ class DeciderPoller(Poller, swf.actors.Decider):
 
         :param workflow_executors: executors handling workflow executions.
         :type  workflow_executors: list[simpleflow.swf.executor.Executor]
+        :param history_cache_size: if set, keep the parsed history of this many
+            executions so that the next decision tasks only parse new events.
+        :type  history_cache_size: Optional[int]
+        :param nb_decision_processes: if set, send decision tasks to this many
+            long-lived processes instead of forking for each decision.
+        :type  nb_decision_processes: Optional[int]
+        :param max_decisions_per_process: recycle a long-lived decision process
+            after this many decisions.
+        :type  max_decisions_per_process: Optional[int]
+        :param max_rss_per_process: recycle a long-lived decision process when
+            its RSS exceeds this many bytes.
+        :type  max_rss_per_process: Optional[int]
+        :param delta_history: for the executions in the history cache, only
+            fetch the new history events.
+        :type  delta_history: bool
 
         """
         self.workflow_name = '{}'.format(','.join(
@@ -98,6 +138,17 @@ class DeciderPoller(Poller, swf.actors.Decider):
         self.nb_retries = nb_retries
         self.domain = domain
         self.is_standalone = is_standalone
+        self._history_cache = HistoryCache(history_cache_size) if history_cache_size else None
+        self._decision_pool = DecisionProcessPool(
+            self,
+            size=nb_decision_processes,
+            max_decisions=max_decisions_per_process,
+            max_rss=max_rss_per_process,
+        ) if nb_decision_processes else None
+        if delta_history and not history_cache_size:
+            raise ValueError('delta history retrieval needs a history cache')
+        self._known_events = collections.OrderedDict() if delta_history else None
+        self._known_events_size = history_cache_size
 
         # All executors must have the same domain.
         self._check_all_domains_identical()
@@ -141,8 +192,63 @@ class DeciderPoller(Poller, swf.actors.Decider):
             suffix = ''
         return '{}{}'.format(self.__class__.__name__, suffix)
 
+    @property
+    def history_cache(self):
+        """
+        :rtype: Optional[HistoryCache]
+        """
+        return self._history_cache
+
+    def start(self):
+        try:
+            super(DeciderPoller, self).start()
+        finally:
+            if self._decision_pool is not None:
+                self._decision_pool.close()
+
+    def register_types(self):
+        """
+        Register the activity types of the registry and the workflow types that
+        may be started as child workflows, unless known to exist.
+        """
+        registration.register_types(
+            self.domain,
+            [executor.workflow_class for executor in self._workflow_executors.values()],
+        )
+
+    def count_pending(self):
+        """
+        Number of decision tasks pending in our task list.
+
+        :rtype: int
+        """
+        return self.connection.count_pending_decision_tasks(self.domain.name, self.task_list)['count']
+
+    def get_known_events(self, workflow_id, run_id):
+        """
+        Raw history events of an execution, as of our last decision task.
+
+        :type workflow_id: str
+        :type run_id: str
+        :rtype: Optional[List[dict]]
+        """
+        if self._known_events is None:
+            return None
+        return self._known_events.get((workflow_id, run_id))
+
+    def _remember_events(self, decision_response):
+        key = (decision_response.execution.workflow_id, decision_response.execution.run_id)
+        self._known_events.pop(key, None)
+        if not decision_response.history.raw:
+            return
+        self._known_events[key] = decision_response.history.raw
+        while len(self._known_events) > self._known_events_size:
+            self._known_events.popitem(last=False)
+
     @with_state('polling')
     def poll(self, task_list=None, identity=None, **kwargs):
+        if self._known_events is not None:
+            kwargs['get_known_events'] = self.get_known_events
         return swf.actors.Decider.poll(self, task_list, identity, **kwargs)
 
     @with_state('completing')
@@ -165,11 +271,24 @@ class DeciderPoller(Poller, swf.actors.Decider):
         Take a PollForDecisionTask response object and try to complete the
         decision task, by calling self._complete() with the response token and
         a set of decisions. We fork so it protects us reliably against memory
-        leaks on long-running deciders.
+        leaks on long-running deciders, or use long-lived processes recycled
+        after a while if configured so.
 
         :param decision_response: an object wrapping the PollForDecisionTask response.
         :type  decision_response: swf.responses.Response
         """
+        if self._known_events is not None:
+            self._remember_events(decision_response)
+        if self._decision_pool is not None:
+            # The decision process handles the history cache itself.
+            self._decision_pool.submit(decision_response)
+            return
+        decision_response.metrics = metrics.DecisionMetrics.from_response(decision_response)
+        if self._history_cache is not None:
+            # Parse in the poller process so the state survives the fork;
+            # the worker gets a copy it can freely mutate.
+            with decision_response.metrics.timer('parse'):
+                decision_response.parsed_history = self._history_cache.get_parsed_history(decision_response)
         spawn(self, decision_response)
 
     @with_state('deciding')
@@ -246,13 +365,29 @@ def process_decision(poller, decision_response):
     workflow_str = "workflow {} ({})".format(workflow_id, poller.workflow_name)
     logger.debug("process_decision() pid={}".format(os.getpid()))
     logger.info("taking decision for {}".format(workflow_str))
-    format.JUMBO_FIELDS_MEMORY_CACHE.clear()
+    jumbo_fields_pulls = format.JUMBO_FIELDS_PULLS
+    jumbo_cache_hits = format.JUMBO_FIELDS_CACHE.hits + format.JUMBO_FIELDS_CACHE.disk_hits
+    decision_metrics = getattr(decision_response, 'metrics', None)
+    if decision_metrics is None:
+        decision_metrics = decision_response.metrics = metrics.DecisionMetrics.from_response(decision_response)
     decisions = poller.decide(decision_response)
+    decisions_and_context = decisions
+    if not isinstance(decisions_and_context, DecisionsAndContext):
+        decisions_and_context = DecisionsAndContext(decisions)
+    decision_metrics.incr('decisions', len(decisions_and_context.decisions))
+    decision_metrics.incr('request_bytes', decisions_and_context.decisions_size())
     try:
         logger.info("completing decision for {}".format(workflow_str))
-        poller.complete_with_retry(decision_response.token, decisions)
+        with decision_metrics.timer('complete'):
+            poller.complete_with_retry(decision_response.token, decisions)
     except Exception as err:
         logger.error("cannot complete decision for {}: {}".format(workflow_str, err))
+    decision_metrics.incr('jumbo_fetches', format.JUMBO_FIELDS_PULLS - jumbo_fields_pulls)
+    decision_metrics.incr(
+        'jumbo_cache_hits',
+        format.JUMBO_FIELDS_CACHE.hits + format.JUMBO_FIELDS_CACHE.disk_hits - jumbo_cache_hits,
+    )
+    metrics.emit(decision_metrics)
 
 
 def spawn(poller, decision_response):
@@ -7,6 +7,12 @@ from . import helpers
 def start(workflows, domain, task_list, log_level=None, nb_processes=None,
           repair_with=None, force_activities=None, is_standalone=False,
           repair_workflow_id=None, repair_run_id=None,
+          history_cache_size=None,
+          nb_decision_processes=None, max_decisions_per_process=None,
+          max_rss_per_process=None,
+          delta_history=False,
+          register_types=False,
+          max_processes=None,
           ):
     """
     Start a decider.
@@ -30,6 +36,21 @@ def start(workflows, domain, task_list, log_level=None, nb_processes=None,
     :type repair_workflow_id: Optional[str]
     :param repair_run_id: run ID to repair
     :type repair_run_id: Optional[str]
+    :param history_cache_size: number of parsed histories to keep between decisions
+    :type history_cache_size: Optional[int]
+    :param nb_decision_processes: number of long-lived decision processes (default: fork for each decision)
+    :type nb_decision_processes: Optional[int]
+    :param max_decisions_per_process: recycle a decision process after this many decisions
+    :type max_decisions_per_process: Optional[int]
+    :param max_rss_per_process: recycle a decision process when its RSS exceeds this many bytes
+    :type max_rss_per_process: Optional[int]
+    :param delta_history: only fetch the new history events of the cached executions
+    :type delta_history: bool
+    :param register_types: register the missing activity and workflow types before starting
+    :type register_types: bool
+    :param max_processes: if set, scale the number of processes between
+        nb_processes (default: 1) and max_processes with the task list backlog
+    :type max_processes: Optional[int]
     """
     if log_level:
         logger.warning(
@@ -42,6 +63,14 @@ def start(workflows, domain, task_list, log_level=None, nb_processes=None,
         is_standalone=is_standalone,
         repair_workflow_id=repair_workflow_id,
         repair_run_id=repair_run_id,
+        history_cache_size=history_cache_size,
+        nb_decision_processes=nb_decision_processes,
+        max_decisions_per_process=max_decisions_per_process,
+        max_rss_per_process=max_rss_per_process,
+        delta_history=delta_history,
+        max_children=max_processes,
     )
+    if register_types:
+        decider.register_types()
     decider.is_alive = True
     decider.start()
@@ -1,6 +1,7 @@
 import swf.models
 
 from simpleflow import logger
+from simpleflow.process import Autoscaler
 from simpleflow.swf.executor import Executor
 from . import (
     Decider,
@@ -55,6 +56,10 @@ def make_decider_poller(workflows, domain, task_list, repair_with=None,
                         force_activities=None,
                         is_standalone=False,
                         repair_workflow_id=None, repair_run_id=None,
+                        history_cache_size=None,
+                        nb_decision_processes=None, max_decisions_per_process=None,
+                        max_rss_per_process=None,
+                        delta_history=False,
                         ):
     """
     Factory building a decider poller.
@@ -74,6 +79,16 @@ def make_decider_poller(workflows, domain, task_list, repair_with=None,
     :type repair_workflow_id: Optional[str]
     :param repair_run_id: run ID to repair
     :type repair_run_id: Optional[str]
+    :param history_cache_size: number of parsed histories to keep between decisions
+    :type history_cache_size: Optional[int]
+    :param nb_decision_processes: number of long-lived decision processes (default: fork for each decision)
+    :type nb_decision_processes: Optional[int]
+    :param max_decisions_per_process: recycle a decision process after this many decisions
+    :type max_decisions_per_process: Optional[int]
+    :param max_rss_per_process: recycle a decision process when its RSS exceeds this many bytes
+    :type max_rss_per_process: Optional[int]
+    :param delta_history: only fetch the new history events of the cached executions
+    :type delta_history: bool
     :return:
     :rtype: DeciderPoller
     """
@@ -94,13 +109,23 @@ def make_decider_poller(workflows, domain, task_list, repair_with=None,
         for workflow in workflows
         ]
     domain = swf.models.Domain(domain)
-    return DeciderPoller(executors, domain, task_list, is_standalone)
+    return DeciderPoller(executors, domain, task_list, is_standalone,
+                         history_cache_size=history_cache_size,
+                         nb_decision_processes=nb_decision_processes,
+                         max_decisions_per_process=max_decisions_per_process,
+                         max_rss_per_process=max_rss_per_process,
+                         delta_history=delta_history)
 
 
 def make_decider(workflows, domain, task_list, nb_children=None,
                  repair_with=None, force_activities=None,
                  is_standalone=False,
                  repair_workflow_id=None, repair_run_id=None,
+                 history_cache_size=None,
+                 nb_decision_processes=None, max_decisions_per_process=None,
+                 max_rss_per_process=None,
+                 delta_history=False,
+                 max_children=None,
                  ):
     """
     Instantiate a Decider.
@@ -122,6 +147,19 @@ def make_decider(workflows, domain, task_list, nb_children=None,
     :type repair_workflow_id: Optional[str]
     :param repair_run_id: run ID to repair
     :type repair_run_id: Optional[str]
+    :param history_cache_size: number of parsed histories to keep between decisions
+    :type history_cache_size: Optional[int]
+    :param nb_decision_processes: number of long-lived decision processes (default: fork for each decision)
+    :type nb_decision_processes: Optional[int]
+    :param max_decisions_per_process: recycle a decision process after this many decisions
+    :type max_decisions_per_process: Optional[int]
+    :param max_rss_per_process: recycle a decision process when its RSS exceeds this many bytes
+    :type max_rss_per_process: Optional[int]
+    :param delta_history: only fetch the new history events of the cached executions
+    :type delta_history: bool
+    :param max_children: if set, scale the number of children between
+        nb_children (default: 1) and max_children with the task list backlog
+    :type max_children: Optional[int]
     :return:
     :rtype: Decider
     """
@@ -131,5 +169,17 @@ def make_decider(workflows, domain, task_list, nb_children=None,
                                  is_standalone=is_standalone,
                                  repair_workflow_id=repair_workflow_id,
                                  repair_run_id=repair_run_id,
+                                 history_cache_size=history_cache_size,
+                                 nb_decision_processes=nb_decision_processes,
+                                 max_decisions_per_process=max_decisions_per_process,
+                                 max_rss_per_process=max_rss_per_process,
+                                 delta_history=delta_history,
                                  )
-    return Decider(poller, nb_children=nb_children)
+    autoscaler = None
+    if max_children:
+        autoscaler = Autoscaler(
+            poller.count_pending,
+            min_children=nb_children if nb_children is not None else 1,
+            max_children=max_children,
+        )
+    return Decider(poller, nb_children=nb_children, autoscaler=autoscaler)
@@ -0,0 +1,107 @@
+from __future__ import absolute_import
+
+import collections
+
+from simpleflow import logger
+from simpleflow.history import History
+
+
+class HistoryCache(object):
+    """
+    Bounded LRU cache of parsed histories, for long-lived deciders.
+
+    Entries are keyed by (workflow_id, run_id, last_event_id). When a decision
+    task comes in, SWF tells us the ID of the DecisionTaskStarted event of the
+    previous decision task (``previousStartedEventId``): if we took that
+    decision, the history we parsed at that time ended with this event, so only
+    the new events have to be parsed.
+
+    :ivar _max_size: maximum number of cached executions
+    :type _max_size: int
+    :ivar _entries: parsed histories, least recently used first
+    :type _entries: collections.OrderedDict[tuple[str, str, int], History]
+    """
+
+    def __init__(self, max_size):
+        if max_size <= 0:
+            raise ValueError('history cache size must be > 0')
+        self._max_size = max_size
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return '<{} size={}/{} hits={} misses={}>'.format(
+            self.__class__.__name__, len(self), self._max_size, self.hits, self.misses,
+        )
+
+    def pop(self, workflow_id, run_id, last_event_id):
+        """
+        Remove and return the parsed history ending at *last_event_id*, if any.
+
+        :rtype: Optional[History]
+        """
+        if not last_event_id:
+            return None
+        return self._entries.pop((workflow_id, run_id, last_event_id), None)
+
+    def peek(self, workflow_id, run_id, last_event_id):
+        """
+        Return the parsed history ending at *last_event_id*, if any, leaving
+        it in the cache.
+
+        :rtype: Optional[History]
+        """
+        return self._entries.get((workflow_id, run_id, last_event_id))
+
+    def discard(self, workflow_id, run_id):
+        """
+        Remove the parsed history of an execution, if any.
+        """
+        for key in [k for k in self._entries if k[:2] == (workflow_id, run_id)]:
+            del self._entries[key]
+
+    def put(self, workflow_id, run_id, history):
+        """
+        Store a parsed history, evicting the least recently used ones.
+
+        :type workflow_id: str
+        :type run_id: str
+        :type history: History
+        """
+        # A single entry per execution: older states are useless.
+        self.discard(workflow_id, run_id)
+        self._entries[(workflow_id, run_id, history.last_event_id)] = history
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def get_parsed_history(self, decision_response):
+        """
+        Return the parsed history of a decision response, reusing the cached
+        state of the execution if possible.
+
+        :param decision_response: an object wrapping the PollForDecisionTask response.
+        :type  decision_response: swf.responses.Response
+        :rtype: History
+        """
+        execution = decision_response.execution
+        workflow_id, run_id = execution.workflow_id, execution.run_id
+        history = self.pop(
+            workflow_id,
+            run_id,
+            getattr(decision_response, 'previous_started_event_id', None),
+        )
+        if history is not None and len(decision_response.history) >= history.last_event_id:
+            self.hits += 1
+            logger.debug('history cache: hit for {} ({}), parsing events {}-{}'.format(
+                workflow_id, run_id, history.last_event_id + 1, len(decision_response.history)))
+            history.extend(decision_response.history)
+        else:
+            self.misses += 1
+            history = History(decision_response.history)
+            history.parse()
+        self.put(workflow_id, run_id, history)
+        return history
@@ -0,0 +1,348 @@
+from __future__ import absolute_import
+
+import multiprocessing
+import os
+import select
+
+import psutil
+
+from simpleflow import logger, logging_context
+from simpleflow.swf.metrics import DecisionMetrics
+from swf.models.history import History
+from swf.models.workflow import WorkflowExecution, WorkflowType
+from swf.responses import Response
+
+
+if False:
+    from typing import Dict, List, Optional, Tuple  # NOQA
+    from simpleflow.swf.process.decider.base import DeciderPoller  # NOQA
+    from swf.models.history.store import EventStore  # NOQA
+
+
+try:
+    from multiprocessing.connection import wait as wait_connections
+except ImportError:  # Python 2
+    def wait_connections(connections, timeout=None):
+        return select.select(connections, [], [], timeout)[0]
+
+
+# Sent by a decision process that doesn't know the events of a delta message
+RESEND = 'resend'
+
+
+def response_to_message(decision_response, known_event_id=0):
+    # type: (Response, int) -> dict
+    """
+    Extract the raw data of a PollForDecisionTask response, so it can be sent
+    to a decision process. The response itself isn't sent: it holds boto
+    connections (and maybe lazily fetched jumbo fields) that don't pickle well.
+
+    If *known_event_id* is set, the decision process already has the events
+    up to this one: only the following ones are sent.
+    """
+    execution = decision_response.execution
+    return {
+        'token': decision_response.token,
+        'events': decision_response.history.raw[known_event_id:],
+        'known_event_id': known_event_id,
+        'workflow_id': execution.workflow_id,
+        'run_id': execution.run_id,
+        'workflow_type': {
+            'name': execution.workflow_type.name,
+            'version': execution.workflow_type.version,
+        },
+        'previous_started_event_id': getattr(decision_response, 'previous_started_event_id', None),
+        'timings': getattr(decision_response, 'timings', None),
+    }
+
+
+def message_to_response(domain, message, known_events=None):
+    # type: (swf.models.Domain, dict, Optional[EventStore]) -> Response
+    """
+    Rebuild a response from :func:`response_to_message` data.
+
+    :param known_events: events up to the message's ``known_event_id``; the
+        new events are appended to them.
+    :type known_events: Optional[EventStore]
+    """
+    if message.get('known_event_id'):
+        if known_events is None or len(known_events) != message['known_event_id']:
+            raise ValueError('unknown events up to {}'.format(message['known_event_id']))
+        for raw_event in message['events']:
+            known_events.append_raw(raw_event)
+        history = History(events=known_events, raw=known_events.raw)
+    else:
+        history = History.from_event_list(message['events'])
+    workflow_type = WorkflowType(
+        domain=domain,
+        name=message['workflow_type']['name'],
+        version=message['workflow_type']['version'],
+    )
+    execution = WorkflowExecution(
+        domain=domain,
+        workflow_id=message['workflow_id'],
+        run_id=message['run_id'],
+        workflow_type=workflow_type,
+    )
+    return Response(
+        token=message['token'],
+        history=history,
+        execution=execution,
+        previous_started_event_id=message['previous_started_event_id'],
+        timings=message.get('timings'),
+    )
+
+
+def decision_process_main(poller, conn, max_decisions=None, max_rss=None):
+    """
+    Main loop of a long-lived decision process: take decision tasks from *conn*
+    until told to stop, or until it's time to recycle the process.
+
+    :param poller:
+    :type poller: DeciderPoller
+    :param conn: our end of the pipe to the poller process
+    :type conn: multiprocessing.connection.Connection
+    :param max_decisions: recycle the process after this many decisions
+    :type max_decisions: Optional[int]
+    :param max_rss: recycle the process when its RSS exceeds this many bytes
+    :type max_rss: Optional[int]
+    """
+    # Imported here to avoid a circular import
+    from simpleflow.swf.process.decider.base import process_decision
+
+    nb_decisions = 0
+    process = psutil.Process()
+    ppid = os.getppid()
+    while True:
+        try:
+            if not conn.poll(1):
+                if os.getppid() != ppid:  # Poller is gone
+                    break
+                continue
+            message = conn.recv()
+        except EOFError:  # Poller is gone
+            break
+        if message is None:
+            break
+
+        known_events = None
+        if message.get('known_event_id'):
+            parsed_history = None
+            if poller.history_cache is not None:
+                parsed_history = poller.history_cache.peek(
+                    message['workflow_id'], message['run_id'], message['known_event_id'],
+                )
+            if parsed_history is None:
+                # Evicted from our cache: ask for the whole history.
+                conn.send(RESEND)
+                continue
+            known_events = parsed_history.swf_history.events
+
+        logging_context.set('workflow_id', message['workflow_id'])
+        logging_context.set('task_type', 'decision')
+        try:
+            decision_response = message_to_response(poller.domain, message, known_events)
+            decision_response.metrics = DecisionMetrics.from_response(decision_response)
+            if poller.history_cache is not None:
+                with decision_response.metrics.timer('parse'):
+                    decision_response.parsed_history = poller.history_cache.get_parsed_history(decision_response)
+            process_decision(poller, decision_response)
+        except Exception:
+            # The new events were appended to the cached history in place:
+            # it may now hold more events than its key says.
+            logger.exception('decision process pid={}: decision failed for {}'.format(
+                os.getpid(), message['workflow_id']))
+            if poller.history_cache is not None:
+                poller.history_cache.discard(message['workflow_id'], message['run_id'])
+
+        nb_decisions += 1
+        recycle = False
+        if max_decisions and nb_decisions >= max_decisions:
+            logger.info('decision process pid={}: {} decisions taken, recycling'.format(os.getpid(), nb_decisions))
+            recycle = True
+        elif max_rss:
+            rss = process.memory_info().rss
+            if rss > max_rss:
+                logger.info('decision process pid={}: rss={} > {}, recycling'.format(os.getpid(), rss, max_rss))
+                recycle = True
+        conn.send(recycle)
+        if recycle:
+            break
+
+
+class DecisionProcess(object):
+    """
+    Handle on a long-lived decision process, as seen from the poller process.
+
+    :ivar process: the decision process
+    :type process: multiprocessing.Process
+    :ivar conn: our end of the pipe to the decision process
+    :type conn: multiprocessing.connection.Connection
+    :ivar busy: whether a decision task was sent and not yet acknowledged
+    :type busy: bool
+    :ivar response: decision task being handled, to resend it in full if needed
+    :type response: Optional[Response]
+    :ivar retired: whether the process is recycled or dead
+    :type retired: bool
+    """
+
+    def __init__(self, poller, max_decisions=None, max_rss=None):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=decision_process_main,
+            args=(poller, child_conn, max_decisions, max_rss),
+        )
+        self.process.start()
+        child_conn.close()
+        self.busy = False
+        self.retired = False
+        self.response = None
+        logger.debug('started decision process pid={}'.format(self.process.pid))
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def send(self, message, decision_response):
+        self.conn.send(message)
+        self.busy = True
+        self.response = decision_response
+
+    def poll(self, timeout=0):
+        """
+        Update the busy and retired flags, waiting up to *timeout* seconds for
+        the current decision to be acknowledged.
+        """
+        if self.busy:
+            try:
+                if self.conn.poll(timeout):
+                    reply = self.conn.recv()
+                    if reply == RESEND:
+                        self.conn.send(response_to_message(self.response))
+                        return
+                    self.retired = reply
+                    self.busy = False
+                    self.response = None
+                    return
+            except (EOFError, IOError):
+                pass
+        if not self.process.is_alive():
+            if self.busy:
+                logger.error('decision process pid={} died: exit code {}'.format(self.pid, self.process.exitcode))
+            self.busy = False
+            self.retired = True
+            self.response = None
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (IOError, OSError):
+            pass
+        self.process.join()
+        self.conn.close()
+
+
+class DecisionProcessPool(object):
+    """
+    Pool of long-lived decision processes.
+
+    Instead of forking a process for each decision task, decision tasks are
+    sent to processes that outlive them: we pay neither the fork nor the
+    executors setup on each decision, and warm state (loaded executors, history
+    cache) is kept. Processes are recycled after *max_decisions* decisions or
+    when their RSS exceeds *max_rss* bytes, which protects us against memory
+    leaks like forking does.
+
+    When the poller has a history cache, a decision task going to the process
+    that handled the previous one of the execution only carries the new
+    history events; the process adds them to the events of its cached history,
+    or asks for the whole history if it evicted it.
+
+    :ivar _processes: decision processes
+    :type _processes: List[DecisionProcess]
+    :ivar _last_process: last process handling each execution, to reuse its
+        history cache, and the number of history events it was sent
+    :type _last_process: Dict[Tuple[str, str], Tuple[int, int]]
+    """
+
+    POLL_INTERVAL = 0.1  # seconds
+
+    def __init__(self, poller, size=1, max_decisions=None, max_rss=None):
+        # type: (DeciderPoller, int, Optional[int], Optional[int]) -> None
+        if size <= 0:
+            raise ValueError('decision process pool size must be > 0')
+        self._poller = poller
+        self._size = size
+        self._max_decisions = max_decisions
+        self._max_rss = max_rss
+        self._processes = []
+        self._last_process = {}
+
+    def __repr__(self):
+        return '<{} size={} processes={}>'.format(
+            self.__class__.__name__, self._size, [p.pid for p in self._processes],
+        )
+
+    def _new_process(self):
+        return DecisionProcess(self._poller, self._max_decisions, self._max_rss)
+
+    def _refresh(self, timeout=0):
+        """
+        Replace the recycled or dead processes and start missing ones.
+        """
+        for index, proc in enumerate(self._processes):
+            proc.poll(timeout)
+            if proc.retired:
+                proc.process.join()
+                proc.conn.close()
+                self._processes[index] = self._new_process()
+        while len(self._processes) < self._size:
+            self._processes.append(self._new_process())
+
+    def _get_idle_process(self, key):
+        """
+        Wait for an idle process, preferring the one that handled *key* last.
+
+        :rtype: DecisionProcess
+        """
+        while True:
+            self._refresh()
+            idle = [p for p in self._processes if not p.busy]
+            if idle:
+                pid = self._last_process.get(key, (None, 0))[0]
+                for proc in idle:
+                    if proc.pid == pid:
+                        return proc
+                return idle[0]
+            # Don't spin: wait for any process to answer
+            wait_connections([p.conn for p in self._processes], self.POLL_INTERVAL)
+
+    def submit(self, decision_response):
+        # type: (Response) -> None
+        """
+        Send a decision task to an idle decision process; wait for one if
+        they are all busy.
+        """
+        execution = decision_response.execution
+        key = (execution.workflow_id, execution.run_id)
+        proc = self._get_idle_process(key)
+        nb_events = len(decision_response.history.raw)
+        pid, known_event_id = self._last_process.pop(key, (None, 0))
+        if pid != proc.pid or self._poller.history_cache is None or known_event_id > nb_events:
+            known_event_id = 0
+        proc.send(response_to_message(decision_response, known_event_id), decision_response)
+        if len(self._last_process) >= 10000:  # Don't grow forever
+            self._last_process.clear()
+        self._last_process[key] = (proc.pid, nb_events)
+
+    def close(self):
+        """
+        Wait for the pending decisions, then stop the decision processes.
+        """
+        for proc in self._processes:
+            while proc.busy:
+                proc.poll(self.POLL_INTERVAL)
+            if not proc.retired:
+                proc.stop()
+            proc.process.join()
+        self._processes = []
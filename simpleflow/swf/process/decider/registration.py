@@ -0,0 +1,175 @@
+from __future__ import absolute_import
+
+import hashlib
+import inspect
+import sys
+from multiprocessing.pool import ThreadPool
+from sqlite3 import OperationalError
+
+from diskcache import Cache
+
+import swf.exceptions
+import swf.models
+from simpleflow import constants, logger
+from simpleflow.registry import registry
+from simpleflow.workflow import Workflow
+
+
+if False:
+    from typing import Iterable, List, Optional, Tuple, Type  # NOQA
+
+
+ACTIVITY = 'activity'
+WORKFLOW = 'workflow'
+
+
+# Seconds before a known type is checked again
+KNOWN_TYPES_EXPIRE = constants.DAY
+
+
+def get_scope(domain):
+    # type: (swf.models.Domain) -> str
+    """
+    Scope of the types of *domain*: its region and the identity of the
+    credentials, as the disk cache may be shared by deciders of several
+    accounts or regions.
+    """
+    access_key = getattr(domain.connection, 'aws_access_key_id', None) or ''
+    identity = hashlib.sha256(access_key.encode('utf-8')).hexdigest()[:16]
+    return '{}/{}'.format(domain.region, identity)
+
+
+class KnownTypes(object):
+    """
+    Activity and workflow types known to exist in SWF, persisted in the disk
+    cache so that the next deciders don't register them again. Types are
+    identified by (domain, kind, name, version) tuples, within a *scope*
+    (see :func:`get_scope`), and are checked again after *expire* seconds.
+
+    If the disk cache can't be used, nothing is known.
+    """
+
+    def __init__(self, directory=constants.CACHE_DIR, scope='', expire=KNOWN_TYPES_EXPIRE):
+        self._scope = scope
+        self._expire = expire
+        try:
+            self._cache = Cache(directory)
+        except (OperationalError, EnvironmentError) as err:
+            logger.warning('diskcache: cannot open {}, known types won\'t be saved: {}'.format(directory, err))
+            self._cache = None
+
+    def _key(self, type_):
+        return 'known_types/' + '/'.join((self._scope,) + tuple(type_))
+
+    def __contains__(self, type_):
+        if self._cache is None:
+            return False
+        try:
+            return self._key(type_) in self._cache
+        except OperationalError:
+            logger.warning('diskcache: got an OperationalError, skipping cache usage')
+            return False
+
+    def add(self, type_):
+        if self._cache is None:
+            return
+        try:
+            self._cache.set(self._key(type_), True, expire=self._expire)
+        except OperationalError:
+            logger.warning('diskcache: got an OperationalError on write, skipping cache write')
+
+
+def get_workflow_types(workflow_classes):
+    # type: (Iterable[Type[Workflow]]) -> List[Tuple[str, str]]
+    """
+    (name, version) of the workflows defined or imported in the modules of
+    *workflow_classes*: those that may be started as child workflows. Names
+    are built like :class:`simpleflow.swf.task.WorkflowTask` does.
+    """
+    types = set()
+    for workflow_class in workflow_classes:
+        module = sys.modules.get(workflow_class.__module__)
+        candidates = [workflow_class]
+        if module is not None:
+            candidates.extend(vars(module).values())
+        for candidate in candidates:
+            if inspect.isclass(candidate) and issubclass(candidate, Workflow) and candidate.version:
+                types.add((candidate.__module__ + '.' + candidate.__name__, candidate.version))
+    return sorted(types)
+
+
+def get_activity_types():
+    # type: () -> List[Tuple[str, str]]
+    """
+    (name, version) of the activities in the registry.
+    """
+    return sorted({
+        (activity.name, activity.version)
+        for activity in registry.get_tasks()
+        if activity.version
+    })
+
+
+def _register(domain, kind, name, version):
+    """
+    Register a type, unless it exists.
+
+    :returns: whether the type exists now
+    :rtype: bool
+    """
+    if kind == ACTIVITY:
+        model = swf.models.ActivityType(domain, name, version=version)
+    else:
+        model = swf.models.WorkflowType(domain, name, version=version)
+    try:
+        model.save()
+        logger.info('registered {} type {} ({}) in domain {}'.format(kind, name, version, domain.name))
+    except swf.exceptions.AlreadyExistsError:
+        pass
+    except Exception as err:
+        logger.warning('cannot register {} type {} ({}): {}'.format(kind, name, version, err))
+        return False
+    return True
+
+
+def register_types(domain, workflow_classes, known_types=None, nb_threads=8):
+    # type: (swf.models.Domain, Iterable[Type[Workflow]], Optional[KnownTypes], int) -> int
+    """
+    Register the activity types of the registry and the workflow types of the
+    modules of *workflow_classes*, unless known to exist, so that scheduling
+    them doesn't fail with a TYPE_DOES_NOT_EXIST cause.
+
+    Types are registered concurrently; a failure is only logged, the executor
+    will register the type when SWF reports it missing.
+
+    :param domain:
+    :type domain: swf.models.Domain
+    :param workflow_classes: workflows handled by the decider
+    :type workflow_classes: Iterable[Type[Workflow]]
+    :param known_types: types known to exist; the disk cache, scoped to the
+        region and credentials of *domain*, by default
+    :type known_types: Optional[KnownTypes]
+    :param nb_threads: number of concurrent registrations
+    :type nb_threads: int
+    :return: number of types that were checked
+    :rtype: int
+    """
+    if known_types is None:
+        known_types = KnownTypes(scope=get_scope(domain))
+    types = [(domain.name, ACTIVITY, name, version) for name, version in get_activity_types()]
+    types += [(domain.name, WORKFLOW, name, version) for name, version in get_workflow_types(workflow_classes)]
+    types = [type_ for type_ in types if type_ not in known_types]
+    if not types:
+        return 0
+
+    logger.info('checking {} activity and workflow types in domain {}'.format(len(types), domain.name))
+    pool = ThreadPool(min(nb_threads, len(types)))
+    try:
+        results = pool.map(lambda type_: _register(domain, *type_[1:]), types)
+    finally:
+        pool.close()
+        pool.join()
+    for type_, exists in zip(types, results):
+        if exists:
+            known_types.add(type_)
+    return len(types)
@@ -1,4 +1,5 @@
 from base64 import b64decode
+import contextlib
 import json
 import multiprocessing
 import os
@@ -8,7 +9,7 @@ import uuid
 
 import psutil
 
-from simpleflow import format, logger
+from simpleflow import execute, format, logger
 from simpleflow.exceptions import ExecutionError
 import swf.actors
 import swf.exceptions
@@ -21,6 +22,9 @@ from simpleflow.job import KubernetesJob
 from simpleflow.process import Supervisor, with_state
 from simpleflow.swf.constants import VALID_PROCESS_MODES
 from simpleflow.swf.process import Poller
+from simpleflow.swf.process.worker.heartbeat import start_heartbeat_service, stop_heartbeat_service
+from simpleflow.swf.process.worker.concurrency import ConcurrentActivityRunner, is_coroutine, run_in_new_loop
+from simpleflow.swf.process.worker.pool import ActivityProcess
 
 from simpleflow.swf.task import ActivityTask
 from simpleflow.swf.utils import sanitize_activity_context
@@ -28,20 +32,70 @@ from simpleflow.utils import format_exc, json_dumps, to_k8s_identifier
 
 
 class Worker(Supervisor):
-    def __init__(self, poller, nb_children=None):
+    def __init__(self, poller, nb_children=None, heartbeat_rate=None, autoscaler=None):
+        """
+        :param poller:
+        :type poller: ActivityPoller
+        :param nb_children:
+        :type nb_children: Optional[int]
+        :param heartbeat_rate: if set, the heartbeats of the tasks of all the
+            children are sent by a heartbeat service, with this budget of
+            heartbeats per second.
+        :type heartbeat_rate: Optional[float]
+        :param autoscaler: if set, decides the number of children
+        :type autoscaler: Optional[simpleflow.process.Autoscaler]
+        """
         self._poller = poller
+        self._heartbeat_rate = heartbeat_rate
+        self._heartbeat_service = None
         super(Worker, self).__init__(
             payload=self._poller.start,
             nb_children=nb_children,
+            autoscaler=autoscaler,
         )
 
+    def start(self):
+        if not self._heartbeat_rate or not self._poller._heartbeat:
+            return super(Worker, self).start()
+
+        process, client = start_heartbeat_service(self._poller.heartbeat, self._heartbeat_rate)
+        logger.info('started heartbeat service pid={} rate={}/s'.format(process.pid, self._heartbeat_rate))
+        self._heartbeat_service = process
+        self._poller.heartbeat_client = client
+        try:
+            super(Worker, self).start()
+        finally:
+            stop_heartbeat_service(self._heartbeat_service, client)
+
+    def _check_services(self):
+        """
+        Restart the heartbeat service if it died, where the worker processes
+        connect to. Meanwhile, they send the heartbeats of their tasks.
+        """
+        process = self._heartbeat_service
+        if process is None or process.is_alive() or self._terminating:
+            return
+        logger.error('heartbeat service pid={} exited with code={}, restarting it'.format(
+            process.pid, process.exitcode,
+        ))
+        try:
+            self._heartbeat_service, _ = start_heartbeat_service(
+                self._poller.heartbeat,
+                self._heartbeat_rate,
+                address=self._poller.heartbeat_client.address,
+            )
+        except RuntimeError as error:
+            logger.error('cannot restart heartbeat service: {}'.format(error))
+
 
 class ActivityPoller(Poller, swf.actors.ActivityWorker):
     """
     Polls an activity and handles it in the worker.
 
     """
-    def __init__(self, domain, task_list, heartbeat=60, process_mode=None, poll_data=None):
+    def __init__(self, domain, task_list, heartbeat=60, process_mode=None, poll_data=None,
+                 reuse_processes=False, max_tasks_per_process=None, max_rss_per_process=None,
+                 process_setup=None, concurrency=None):
         """
 
         :param domain:
@@ -52,6 +106,20 @@ class ActivityPoller(Poller, swf.actors.ActivityWorker):
         :type heartbeat:
         :param process_mode: Whether to process locally (default) or spawn a Kubernetes job.
         :type process_mode: Optional[str]
+        :param reuse_processes: run the tasks in a long-lived process instead
+            of forking a process for each task.
+        :type reuse_processes: bool
+        :param max_tasks_per_process: recycle the long-lived process after this many tasks.
+        :type max_tasks_per_process: Optional[int]
+        :param max_rss_per_process: recycle the long-lived process when its RSS
+            exceeds this many bytes.
+        :type max_rss_per_process: Optional[int]
+        :param process_setup: called when a long-lived process starts, to build
+            the resources shared by its tasks.
+        :type process_setup: Optional[list[Callable[[], None]]]
+        :param concurrency: run up to this many tasks at once in this process,
+            in threads or in an event loop for async activities.
+        :type concurrency: Optional[int]
         """
         self.nb_retries = 3
         # heartbeat=0 is a special value to disable heartbeating. We want to
@@ -62,7 +130,18 @@ class ActivityPoller(Poller, swf.actors.ActivityWorker):
         self.process_mode = process_mode or 'local'
         assert self.process_mode in VALID_PROCESS_MODES, 'invalid process_mode "{}"'.format(self.process_mode)
 
+        if concurrency and reuse_processes:
+            raise ValueError('concurrency and reuse_processes are exclusive')
+
         self.poll_data = poll_data
+        self.reuse_processes = reuse_processes
+        self.max_tasks_per_process = max_tasks_per_process
+        self.max_rss_per_process = max_rss_per_process
+        self.process_setup = process_setup
+        self._activity_process = None
+        self.concurrency = concurrency
+        self._runner = None
+        self.heartbeat_client = None
         super(ActivityPoller, self).__init__(domain, task_list)
 
     @property
@@ -114,9 +193,90 @@ class ActivityPoller(Poller, swf.actors.ActivityWorker):
                     err,
                 )
                 self.fail_with_retry(token, task, reason)
+        elif self.concurrency:
+            if self._runner is None:
+                self._runner = ConcurrentActivityRunner(self, self.concurrency, self._heartbeat)
+            self._runner.submit(response)
+        elif self.reuse_processes:
+            self.run_in_activity_process(response)
         else:
             spawn(self, token, task, self._heartbeat)
 
+    def start(self):
+        try:
+            super(ActivityPoller, self).start()
+        finally:
+            self.stop_executors()
+
+    def run_once(self):
+        try:
+            super(ActivityPoller, self).run_once()
+        finally:
+            self.stop_executors()
+
+    def stop_executors(self):
+        """
+        Stop the long-lived activity process, or wait for the tasks run
+        concurrently.
+        """
+        if self._activity_process is not None:
+            self._activity_process.stop()
+            self._activity_process = None
+        if self._runner is not None:
+            self._runner.stop()
+            self._runner = None
+
+    def count_pending(self):
+        """
+        Number of activity tasks pending in our task list.
+
+        :rtype: int
+        """
+        return self.connection.count_pending_activity_tasks(self.domain.name, self.task_list)['count']
+
+    def run_in_activity_process(self, response):
+        """
+        Run a task in our long-lived activity process, starting it if needed,
+        and wait for it to end, sending heartbeats to SWF.
+
+        :param response:
+        :type response: swf.responses.Response
+        """
+        token = response.task_token
+        task = response.activity_task
+        proc = self._activity_process
+        if proc is None or proc.retired:
+            if proc is not None:
+                proc.stop()
+            proc = self._activity_process = ActivityProcess(
+                self,
+                max_tasks=self.max_tasks_per_process,
+                max_rss=self.max_rss_per_process,
+                setup=self.process_setup,
+            )
+        proc.send(response)
+        with registered_heartbeats(self, token):
+            while not proc.wait(self.wait_timeout):
+                if not heartbeat_or_reap(self, token, task, proc.pid):
+                    proc.retired = True  # Reaped
+                    return
+        if proc.died:
+            self.fail_with_retry(
+                token,
+                task,
+                reason='process {} died: exit code {}'.format(proc.pid, proc.exitcode),
+            )
+
+    @property
+    def wait_timeout(self):
+        """
+        How long to wait for a task process before heartbeating, or checking
+        if the heartbeat service reported the task as cancelled.
+        """
+        if self.heartbeat_client is not None and self._heartbeat:
+            return min(self._heartbeat, 1)
+        return self._heartbeat
+
     @with_state('completing')
     def complete(self, token, result=None):
         swf.actors.ActivityWorker.complete(self, token, result)
@@ -164,8 +324,10 @@ class ActivityPoller(Poller, swf.actors.ActivityWorker):
 
 
 class ActivityWorker(object):
-    def __init__(self, dispatcher=None):
+    def __init__(self, dispatcher=None, run_coroutine=None, thread_local_context=False):
         self._dispatcher = dispatcher or dynamic_dispatcher.Dispatcher()
+        self._run_coroutine = run_coroutine or run_in_new_loop
+        self._thread_local_context = thread_local_context
 
     def dispatch(self, task):
         """
@@ -198,7 +360,11 @@ class ActivityWorker(object):
             context['domain_name'] = poller.domain.name
             if input.get('meta', {}).get('binaries'):
                 download_binaries(input['meta']['binaries'])
-            result = ActivityTask(activity, *args, context=context, **kwargs).execute()
+            result = ActivityTask(activity, *args, context=context, **kwargs).execute(
+                thread_local_context=self._thread_local_context,
+            )
+            if is_coroutine(result):
+                result = self._run_coroutine(result)
         except Exception:
             exc_type, exc_value, exc_traceback = sys.exc_info()
             logger.exception("process error: {}".format(str(exc_value)))
@@ -247,7 +413,8 @@ def process_task(poller, token, task):
     :type task: swf.models.ActivityTask
     """
     logger.debug('process_task() pid={}'.format(os.getpid()))
-    format.JUMBO_FIELDS_MEMORY_CACHE.clear()
+    # This process runs a single task
+    execute.ForkServer.enabled = False
     worker = ActivityWorker()
     worker.process(poller, token, task)
 
@@ -320,60 +487,118 @@ def spawn(poller, token, task, heartbeat=60):
         args=(poller, token, task),
     )
     worker.start()
+    if poller.heartbeat_client is not None:
+        heartbeat = poller.wait_timeout
 
     def worker_alive():
         return psutil.pid_exists(worker.pid)
 
-    while worker_alive():
-        worker.join(timeout=heartbeat)
-        if not worker_alive():
-            # Most certainly unneeded: we'll see
-            if worker.exitcode is None:
-                # race condition, try and re-join
-                worker.join(timeout=0)
+    with registered_heartbeats(poller, token):
+        while worker_alive():
+            worker.join(timeout=heartbeat)
+            if not worker_alive():
+                # Most certainly unneeded: we'll see
                 if worker.exitcode is None:
-                    logger.warning("process {} is dead but multiprocessing doesn't know it (simpleflow bug)".format(
-                        worker.pid
-                    ))
-            if worker.exitcode != 0:
-                poller.fail_with_retry(
-                    token,
-                    task,
-                    reason='process {} died: exit code {}'.format(
-                        worker.pid,
-                        worker.exitcode)
-                )
-            return
-        try:
-            logger.debug(
-                'heartbeating for pid={} (token={})'.format(worker.pid, token)
-            )
-            response = poller.heartbeat(token)
-        except swf.exceptions.DoesNotExistError as error:
-            # Either the task or the workflow execution no longer exists,
-            # let's kill the worker process.
-            logger.warning('heartbeat failed: {}'.format(error))
-            logger.warning('killing (KILL) worker with pid={}'.format(worker.pid))
-            reap_process_tree(worker.pid)
-            return
-        except swf.exceptions.RateLimitExceededError as error:
-            # ignore rate limit errors: high chances the next heartbeat will be
-            # ok anyway, so it would be stupid to break the task for that
-            logger.warning(
-                'got a "ThrottlingException / Rate exceeded" when heartbeating for task {}: {}'.format(
-                    task.activity_type.name,
-                    error))
-            continue
-        except Exception as error:
-            # Let's crash if it cannot notify the heartbeat failed.  The
-            # subprocess will become orphan and the heartbeat timeout may
-            # eventually trigger on Amazon SWF side.
-            logger.error('cannot send heartbeat for task {}: {}'.format(
+                    # race condition, try and re-join
+                    worker.join(timeout=0)
+                    if worker.exitcode is None:
+                        logger.warning("process {} is dead but multiprocessing doesn't know it (simpleflow bug)".format(
+                            worker.pid
+                        ))
+                if worker.exitcode != 0:
+                    poller.fail_with_retry(
+                        token,
+                        task,
+                        reason='process {} died: exit code {}'.format(
+                            worker.pid,
+                            worker.exitcode)
+                    )
+                return
+            if not heartbeat_or_reap(poller, token, task, worker.pid):
+                return
+
+
+@contextlib.contextmanager
+def registered_heartbeats(poller, token):
+    """
+    Have the heartbeat service of the host send the heartbeats of the task,
+    if there's one.
+
+    :param poller:
+    :type poller: ActivityPoller
+    :param token:
+    :type token: str
+    """
+    client = poller.heartbeat_client
+    if client is None or not poller._heartbeat:
+        yield
+        return
+    client.register(token, poller._heartbeat)
+    try:
+        yield
+    finally:
+        client.unregister(token)
+
+
+def heartbeat_or_reap(poller, token, task, pid):
+    """
+    Send a heartbeat for the task run by process *pid*. If the task was
+    cancelled or doesn't exist anymore, reap the process and its children.
+
+    :param poller:
+    :type poller: ActivityPoller
+    :param token:
+    :type token: str
+    :param task:
+    :type task: swf.models.ActivityTask
+    :param pid: process running the task
+    :type pid: int
+    :return: whether the task goes on
+    :rtype: bool
+    """
+    client = poller.heartbeat_client
+    if client is not None and poller._heartbeat:
+        # The heartbeat service sends the heartbeats, unless it can't be
+        # reached
+        reason = client.cancelled(token)
+        if reason:
+            logger.warning('{}: killing worker with pid={}'.format(reason, pid))
+            reap_process_tree(pid)
+            return False
+        if not client.heartbeat_due(token):
+            return True
+
+    try:
+        logger.debug(
+            'heartbeating for pid={} (token={})'.format(pid, token)
+        )
+        response = poller.heartbeat(token)
+    except swf.exceptions.DoesNotExistError as error:
+        # Either the task or the workflow execution no longer exists,
+        # let's kill the worker process.
+        logger.warning('heartbeat failed: {}'.format(error))
+        logger.warning('killing (KILL) worker with pid={}'.format(pid))
+        reap_process_tree(pid)
+        return False
+    except swf.exceptions.RateLimitExceededError as error:
+        # ignore rate limit errors: high chances the next heartbeat will be
+        # ok anyway, so it would be stupid to break the task for that
+        logger.warning(
+            'got a "ThrottlingException / Rate exceeded" when heartbeating for task {}: {}'.format(
                 task.activity_type.name,
                 error))
-            raise
-
-        # Task cancelled.
-        if response and response.get('cancelRequested'):
-            reap_process_tree(worker.pid)
-            return
+        return True
+    except Exception as error:
+        # Let's crash if it cannot notify the heartbeat failed.  The
+        # subprocess will become orphan and the heartbeat timeout may
+        # eventually trigger on Amazon SWF side.
+        logger.error('cannot send heartbeat for task {}: {}'.format(
+            task.activity_type.name,
+            error))
+        raise
+
+    # Task cancelled.
+    if response and response.get('cancelRequested'):
+        reap_process_tree(pid)
+        return False
+    return True
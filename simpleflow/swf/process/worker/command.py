@@ -2,13 +2,16 @@ from __future__ import absolute_import
 
 import swf.models
 
+from simpleflow import logger
+from simpleflow.process import Autoscaler
 from .base import (
     Worker,
     ActivityPoller,
 )
+from .pool import import_object
 
 
-def make_worker_poller(domain, task_list, heartbeat, process_mode, poll_data):
+def make_worker_poller(domain, task_list, heartbeat, process_mode, poll_data, **kwargs):
     """
     Make a worker poller for the domain and task list.
     :param domain:
@@ -21,15 +24,19 @@ def make_worker_poller(domain, task_list, heartbeat, process_mode, poll_data):
     :type process_mode: str
     :param poll_data: Base64 encoded poll data from SWF, in case you don't want to poll directly.
     :type poll_data: str
+    :param kwargs: long-lived processes and concurrency options, see ActivityPoller
     :return:
     :rtype: ActivityPoller
     """
     domain = swf.models.Domain(domain)
-    return ActivityPoller(domain, task_list, heartbeat, process_mode, poll_data)
+    return ActivityPoller(domain, task_list, heartbeat, process_mode, poll_data, **kwargs)
 
 
 def start(domain, task_list, nb_processes=None, heartbeat=60, one_task=False,
-          process_mode=None, poll_data=None):
+          process_mode=None, poll_data=None,
+          reuse_processes=False, max_tasks_per_process=None, max_rss_per_process=None,
+          preload=None, process_setup=None, concurrency=None, heartbeat_rate=None,
+          max_processes=None):
     """
     Start a worker for the given domain and task_list.
     :param domain:
@@ -46,8 +53,37 @@ def start(domain, task_list, nb_processes=None, heartbeat=60, one_task=False,
     :type process_mode: Optional[str]
     :param poll_data: Base64 encoded poll data from SWF, in case you don't want to poll directly.
     :type poll_data: Optional[str]
+    :param reuse_processes: run the tasks in long-lived processes instead of forking for each task
+    :type reuse_processes: bool
+    :param max_tasks_per_process: recycle a long-lived process after this many tasks
+    :type max_tasks_per_process: Optional[int]
+    :param max_rss_per_process: recycle a long-lived process when its RSS exceeds this many bytes
+    :type max_rss_per_process: Optional[int]
+    :param preload: modules to import before forking, e.g. the activities modules
+    :type preload: Optional[list[str]]
+    :param process_setup: dotted paths of functions called when a long-lived process starts
+    :type process_setup: Optional[list[str]]
+    :param concurrency: run up to this many tasks at once in each process
+    :type concurrency: Optional[int]
+    :param heartbeat_rate: send the heartbeats of all the processes from a
+        heartbeat service, with this budget of heartbeats per second
+    :type heartbeat_rate: Optional[float]
+    :param max_processes: if set, scale the number of processes between
+        nb_processes (default: 1) and max_processes with the task list backlog
+    :type max_processes: Optional[int]
     """
-    poller = make_worker_poller(domain, task_list, heartbeat, process_mode, poll_data)
+    for module_name in preload or ():
+        logger.debug('preloading module {}'.format(module_name))
+        __import__(module_name)
+
+    poller = make_worker_poller(
+        domain, task_list, heartbeat, process_mode, poll_data,
+        reuse_processes=reuse_processes,
+        max_tasks_per_process=max_tasks_per_process,
+        max_rss_per_process=max_rss_per_process,
+        process_setup=[import_object(path) for path in process_setup or ()],
+        concurrency=concurrency,
+    )
 
     if poll_data:
         # if "poll_data" is provided, no need to process it multiple times
@@ -56,6 +92,13 @@ def start(domain, task_list, nb_processes=None, heartbeat=60, one_task=False,
     if one_task:
         poller.run_once()
     else:
-        worker = Worker(poller, nb_processes)
+        autoscaler = None
+        if max_processes:
+            autoscaler = Autoscaler(
+                poller.count_pending,
+                min_children=nb_processes if nb_processes is not None else 1,
+                max_children=max_processes,
+            )
+        worker = Worker(poller, nb_processes, heartbeat_rate=heartbeat_rate, autoscaler=autoscaler)
         worker.is_alive = True
         worker.start()
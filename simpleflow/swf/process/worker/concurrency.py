@@ -0,0 +1,267 @@
+from __future__ import absolute_import
+
+import threading
+
+import swf.exceptions
+from simpleflow import logger, logging_context
+
+try:
+    import asyncio
+    from concurrent.futures import CancelledError
+except ImportError:  # Python 2: no async activities
+    asyncio = None
+    CancelledError = None
+
+
+if False:
+    from typing import Dict, Optional  # NOQA
+    from simpleflow.swf.process.worker.base import ActivityPoller  # NOQA
+    from swf.models import ActivityTask  # NOQA
+    from swf.responses import Response  # NOQA
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+def is_coroutine(obj):
+    return asyncio is not None and asyncio.iscoroutine(obj)
+
+
+def run_in_new_loop(coro):
+    """
+    Run an async activity in a new event loop.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class RunningTask(object):
+    def __init__(self, task):
+        self.task = task
+        self.future = None
+        self.cancelled = False
+
+
+class ConcurrentActivityRunner(object):
+    """
+    Run up to *concurrency* activity tasks at once in the poller process:
+    regular activities in threads, ``async def`` activities in an event loop
+    shared by the tasks. Each task is completed or failed on its own, and a
+    thread sends the heartbeats of all the running tasks.
+
+    An activity declared with ``max_concurrency`` runs at most that many
+    tasks at once; the other ones wait for their turn, while heartbeating.
+
+    When a task is cancelled or doesn't exist anymore, an async activity is
+    cancelled; a thread can't be interrupted, so a regular activity runs to
+    its end and its result is rejected by SWF.
+
+    The logging context and the ``context`` attribute of function activities
+    are those of the task of the current thread. The logging context of a
+    task isn't passed to the programs it runs.
+    """
+
+    def __init__(self, poller, concurrency, heartbeat=60):
+        # type: (ActivityPoller, int, Optional[int]) -> None
+        # Imported here to avoid a circular import
+        from simpleflow.swf.process.worker.base import ActivityWorker
+
+        self._poller = poller
+        self._worker = ActivityWorker(run_coroutine=self.run_coroutine, thread_local_context=True)
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._running = {}  # type: Dict[str, RunningTask]
+        self._threads = set()
+        self._activity_slots = {}  # type: Dict[str, threading.BoundedSemaphore]
+        self._local = threading.local()
+        self._loop = None
+        self._loop_thread = None
+        self._stopping = threading.Event()
+        self._heartbeat_thread = None
+        if heartbeat:
+            if poller.heartbeat_client is not None:
+                # The heartbeat service sends the heartbeats: only check for
+                # cancellations
+                heartbeat = min(heartbeat, 1)
+            self._heartbeat_thread = threading.Thread(
+                target=self._heartbeat_main,
+                args=(heartbeat,),
+                name='heartbeat',
+            )
+            self._heartbeat_thread.daemon = True
+            self._heartbeat_thread.start()
+
+    def __len__(self):
+        return len(self._running)
+
+    def submit(self, response):
+        # type: (Response) -> None
+        """
+        Start a task, then wait until there's room for another one: the poller
+        doesn't hold tasks it can't start right away.
+        """
+        token = response.task_token
+        task = response.activity_task
+        self._slots.acquire()
+        thread = threading.Thread(
+            target=self._run,
+            args=(token, task),
+            name='activity-{}'.format(task.activity_id),
+        )
+        thread.daemon = True
+        with self._lock:
+            self._running[token] = RunningTask(task)
+            self._threads.add(thread)
+        thread.start()
+
+        self._slots.acquire()
+        self._slots.release()
+
+    def _activity_slots_for(self, task):
+        # type: (ActivityTask) -> Optional[threading.BoundedSemaphore]
+        try:
+            activity = self._worker.dispatch(task)
+        except Exception:
+            return None  # The worker reports it
+        max_concurrency = getattr(activity, 'max_concurrency', None)
+        if not max_concurrency:
+            return None
+        with self._lock:
+            if activity.name not in self._activity_slots:
+                self._activity_slots[activity.name] = threading.BoundedSemaphore(max_concurrency)
+            return self._activity_slots[activity.name]
+
+    def _run(self, token, task):
+        with logging_context.thread_local():
+            logging_context.set('workflow_id', getattr(task.workflow_execution, 'workflow_id', ''))
+            logging_context.set('task_type', 'activity')
+            logging_context.set('event_id', task.started_event_id)
+            logging_context.set('activity_id', task.activity_id)
+            self._run_task(token, task)
+
+    def _run_task(self, token, task):
+        self._local.token = token
+        client = self._poller.heartbeat_client
+        try:
+            if client is not None and self._heartbeat_thread is not None:
+                client.register(token, self._poller._heartbeat)
+            activity_slots = self._activity_slots_for(task)
+            if activity_slots is None:
+                self._worker.process(self._poller, token, task)
+            else:
+                with activity_slots:
+                    self._worker.process(self._poller, token, task)
+        except Exception:
+            logger.exception('activity task {} crashed'.format(task.activity_id))
+        finally:
+            if client is not None and self._heartbeat_thread is not None:
+                client.unregister(token)
+            with self._lock:
+                del self._running[token]
+                self._threads.discard(threading.current_thread())
+            self._slots.release()
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever, name='event-loop')
+                self._loop_thread.daemon = True
+                self._loop_thread.start()
+            return self._loop
+
+    def run_coroutine(self, coro):
+        """
+        Run an async activity in the shared event loop; called by the thread
+        of its task.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+        with self._lock:
+            running = self._running.get(self._local.token)
+            if running is not None:
+                running.future = future
+                if running.cancelled:
+                    future.cancel()
+        try:
+            return future.result()
+        except CancelledError:
+            raise TaskCancelled('task cancelled')
+
+    def cancel(self, token):
+        with self._lock:
+            running = self._running.get(token)
+            if running is None:
+                return
+            running.cancelled = True
+            future = running.future
+        if future is not None:
+            logger.warning('cancelling activity task {}'.format(running.task.activity_id))
+            future.cancel()
+        else:
+            logger.warning('activity task {} is cancelled but will run to its end'.format(
+                running.task.activity_id,
+            ))
+
+    def _heartbeat_main(self, heartbeat):
+        while not self._stopping.wait(heartbeat):
+            with self._lock:
+                running = list(self._running.items())
+            for token, running_task in running:
+                self.heartbeat(token, running_task)
+
+    def heartbeat(self, token, running):
+        # type: (str, RunningTask) -> None
+        task = running.task
+        client = self._poller.heartbeat_client
+        if client is not None:
+            if client.cancelled(token):
+                if not running.cancelled:
+                    self.cancel(token)
+                return
+            if not client.heartbeat_due(token):
+                return
+
+        try:
+            logger.debug('heartbeating for task {}'.format(task.activity_id))
+            response = self._poller.heartbeat(token)
+        except swf.exceptions.DoesNotExistError as error:
+            logger.warning('heartbeat failed: {}'.format(error))
+            self.cancel(token)
+            return
+        except swf.exceptions.RateLimitExceededError as error:
+            logger.warning(
+                'got a "ThrottlingException / Rate exceeded" when heartbeating for task {}: {}'.format(
+                    task.activity_type.name,
+                    error))
+            return
+        except Exception as error:
+            # The other tasks still need their heartbeats: only log it, the
+            # heartbeat timeout may trigger on Amazon SWF side.
+            logger.error('cannot send heartbeat for task {}: {}'.format(
+                task.activity_type.name,
+                error))
+            return
+
+        if response and response.get('cancelRequested') and not running.cancelled:
+            self.cancel(token)
+
+    def stop(self):
+        """
+        Wait for the running tasks, then stop the heartbeat and event loop
+        threads.
+        """
+        with self._lock:
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join()
+        self._stopping.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+            self._loop.close()
@@ -1,116 +1,412 @@
+from __future__ import absolute_import
+
+import heapq
+import itertools
 import multiprocessing
 import os
+import random
+import shutil
+import tempfile
+import threading
 import time
+from multiprocessing.connection import Client, Listener
 
 import swf.exceptions
 from simpleflow import logger
-from simpleflow._decorators import deprecated
-from simpleflow.utils import retry
 
 
-__all__ = ['Heartbeater', 'HeartbeatProcess']
+__all__ = [
+    'HeartbeatClient',
+    'HeartbeatService',
+    'TokenBucket',
+    'start_heartbeat_service',
+    'stop_heartbeat_service',
+]
 
 
-@deprecated
-class HeartbeatProcess(object):  # Are people using it?
-    def __init__(self, heartbeat_callable, interval):
-        if not isinstance(interval, int) and not isinstance(interval, float):
-            raise ValueError('heartbeat interval must be an integer or a float')
-        if interval <= 0:
-            raise ValueError('heartbeat interval must be > 0')
-        self._interval = interval
-        self._heartbeat = heartbeat_callable
+if False:
+    from typing import Callable, Dict, Optional, Set, Tuple  # NOQA
+    from multiprocessing.connection import Connection  # NOQA
 
-    @retry.with_delay(nb_times=10,
-                      delay=retry.exponential,
-                      on_exceptions=swf.exceptions.ResponseError,
-                      except_on=swf.exceptions.DoesNotExistError)
-    def send_heartbeat(self, token):
-        return self._heartbeat(token)
 
-    def run(self, token, task):
-        ppid = os.getppid()
+class TokenBucket(object):
+    """
+    Allow *rate* actions per second, with bursts of up to *burst* actions.
+    """
 
-        while True:
-            time.sleep(self._interval)
+    def __init__(self, rate, burst=None, clock=time.time):
+        if rate <= 0:
+            raise ValueError('rate must be > 0')
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated_at = clock()
 
-            if os.getppid() != ppid:
-                os._exit(1)
+    def take(self):
+        """
+        Take a token if there's one.
 
-            try:
-                logger.info('heartbeat {} for task {}'.format(
-                    time.time(),
-                    task.activity_type.name))
-            except Exception:
-                # Do not crash for debug
-                pass
+        :returns: 0 if a token was taken, else the number of seconds until
+            there's one
+        :rtype: float
+        """
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.
+        return (1 - self._tokens) / self.rate
+
+
+class _Registration(object):
+    def __init__(self, conn, interval):
+        self.conn = conn
+        self.interval = interval
+        self.due = None
+
+
+class HeartbeatService(object):
+    """
+    Send the heartbeats of the tasks run by the worker processes of a host.
+
+    Worker processes register their task tokens through a
+    :class:`HeartbeatClient`. Heartbeats are sent under a token-bucket budget
+    of *rate* heartbeats per second, each one at a random time in the last
+    *jitter* part of its interval so that they don't all fire at once. When
+    a task is cancelled or doesn't exist anymore, the owning process is told.
+    """
 
+    def __init__(self, heartbeat, rate, burst=None, jitter=0.2):
+        # type: (Callable[[str], Optional[dict]], float, Optional[float], float) -> None
+        self._heartbeat = heartbeat
+        self._bucket = TokenBucket(rate, burst)
+        self._jitter = jitter
+        self._registrations = {}  # type: Dict[str, _Registration]
+        self._schedule = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._listener = None
+        self.is_alive = False
+
+    def __len__(self):
+        return len(self._registrations)
+
+    def _next_due(self, interval):
+        return time.time() + interval * (1 - random.uniform(0, self._jitter))
+
+    def register(self, conn, token, interval):
+        with self._condition:
+            registration = self._registrations[token] = _Registration(conn, interval)
+            registration.due = self._next_due(interval)
+            heapq.heappush(self._schedule, (registration.due, next(self._counter), token))
+            self._condition.notify()
+
+    def unregister(self, token):
+        with self._condition:
+            self._registrations.pop(token, None)
+
+    def _handle_client(self, conn):
+        tokens = set()
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == 'register':
+                    _, token, interval = message
+                    tokens.add(token)
+                    self.register(conn, token, interval)
+                elif message[0] == 'unregister':
+                    tokens.discard(message[1])
+                    self.unregister(message[1])
+        except (EOFError, IOError, OSError):
+            pass  # The worker process is gone
+        finally:
+            for token in tokens:
+                self.unregister(token)
+            conn.close()
+
+    def _accept(self):
+        while self.is_alive:
             try:
-                response = self.send_heartbeat(token)
-            except swf.exceptions.DoesNotExistError:
-                # Either the task or the workflow execution no longer exists.
-                logger.warning(
-                    'task {} no longer exists. Stopping heartbeat'.format(
-                        task.activity_type.name))
-                return
-            except Exception as error:
-                # Let's crash if it cannot notify the heartbeat failed.
-                logger.error('cannot send heartbeat for task {}: {}'.format(
-                    task.activity_type.name,
-                    error))
-                raise
+                conn = self._listener.accept()
+            except (IOError, OSError):
+                if self.is_alive:
+                    logger.exception('heartbeat service: cannot accept connection')
+                continue
+            thread = threading.Thread(target=self._handle_client, args=(conn,), name='heartbeat-client')
+            thread.daemon = True
+            thread.start()
 
+    def _pop_due(self):
+        """
+        Wait for the next heartbeat to send.
+
+        :rtype: Optional[str]
+        """
+        with self._condition:
+            while self._schedule:
+                due, _, token = self._schedule[0]
+                registration = self._registrations.get(token)
+                if registration is None or registration.due != due:
+                    heapq.heappop(self._schedule)  # Unregistered or rescheduled
+                    continue
+                delay = due - time.time()
+                if delay <= 0:
+                    heapq.heappop(self._schedule)
+                    return token
+                self._condition.wait(min(delay, 1))
+                return None
+            self._condition.wait(1)
+            return None
+
+    def _reschedule(self, token, due):
+        with self._condition:
+            registration = self._registrations.get(token)
+            if registration is not None:
+                registration.due = due
+                heapq.heappush(self._schedule, (due, next(self._counter), token))
+
+    def _cancel(self, token, reason):
+        with self._condition:
+            registration = self._registrations.pop(token, None)
+        if registration is None:
+            return
+        try:
+            registration.conn.send(('cancel', token, reason))
+        except (IOError, OSError):
+            pass  # The worker process is gone
+
+    def send_heartbeat(self, token):
+        """
+        Send the heartbeat of a task, and tell its process if the task is
+        over.
+        """
+        registration = self._registrations.get(token)
+        if registration is None:
+            return
+        try:
+            response = self._heartbeat(token)
+        except swf.exceptions.DoesNotExistError as error:
+            # Either the task or the workflow execution no longer exists.
+            logger.warning('heartbeat failed: {}'.format(error))
+            self._cancel(token, 'task does not exist: {}'.format(error))
+            return
+        except swf.exceptions.RateLimitExceededError as error:
+            logger.warning('heartbeat throttled: {}'.format(error))
+            self._reschedule(token, time.time() + random.uniform(1, 5))
+            return
+        except Exception as error:
+            # Keep heartbeating: the heartbeat timeout will trigger on Amazon
+            # SWF side if it keeps failing.
+            logger.error('cannot send heartbeat: {}'.format(error))
+        else:
             if response and response.get('cancelRequested'):
+                self._cancel(token, 'task cancelled')
                 return
+        self._reschedule(token, self._next_due(registration.interval))
 
+    def serve(self, address, ready=None):
+        """
+        Listen to the clients on *address* and send the heartbeats until
+        stopped, or until the parent process exits.
+
+        :param address: path of the Unix socket
+        :type address: str
+        :param ready: set once listening
+        :type ready: Optional[threading.Event | multiprocessing.Event]
+        """
+        self._listener = Listener(address, family='AF_UNIX')
+        self.is_alive = True
+        accept_thread = threading.Thread(target=self._accept, name='heartbeat-accept')
+        accept_thread.daemon = True
+        accept_thread.start()
+        if ready is not None:
+            ready.set()
 
-@deprecated
-class Heartbeater(object):  # Are people using it?
-    """Manages the heartbeat in a subprocess.
+        ppid = os.getppid()
+        while self.is_alive:
+            if os.getppid() != ppid:
+                break
+            token = self._pop_due()
+            if token is None:
+                continue
+            delay = self._bucket.take()
+            while delay:
+                time.sleep(delay)
+                delay = self._bucket.take()
+            self.send_heartbeat(token)
+        self._listener.close()
 
+    def stop(self):
+        self.is_alive = False
+        with self._condition:
+            self._condition.notify()
+
+
+class HeartbeatClient(object):
     """
-    def __init__(self, heartbeat, interval, on_exit=None):
-        """
+    Connection of a worker process to the :class:`HeartbeatService` of the
+    host. It's created before forking the worker processes: each process
+    opens its own connection when it first registers a task.
 
-        :param heartbeat: callable that sends a heartbeat.
-        :type  heartbeat: callable(token: str): dict
+    If the service can't be reached, the tasks it doesn't know about are
+    reported by :meth:`heartbeat_due`, for their heartbeats to be sent
+    directly; the client connects again for the next tasks.
+    """
 
-        :param interval: of heartbeating in seconds.
-        :type  interval: int.
+    def __init__(self, address):
+        self.address = address
+        self._conn = None  # type: Optional[Connection]
+        self._pid = None
+        self._cancelled = {}  # type: Dict[str, str]
+        self._registered = set()  # type: Set[str]
+        self._intervals = {}  # type: Dict[str, float]
+        self._due = {}  # type: Dict[str, float]
+        self._lock = threading.Lock()
 
-        :param on_exit: signal handler called if the heartbeat subprocess
-        exits. It is not called when calling ``Heartbeater.stop()``.
-        :type  on_exit: callable(signal_number: int, frame)
+    def _connection(self):
+        if self._pid != os.getpid():
+            self._conn = None
+            self._pid = os.getpid()
+            self._cancelled = {}
+            self._registered = set()
+            self._intervals = {}
+            self._due = {}
+            self._lock = threading.Lock()
+        if self._conn is None:
+            self._conn = Client(self.address, family='AF_UNIX')
+        return self._conn
 
+    def _disconnect(self, error):
         """
-        self._heartbeat = heartbeat
-        self._interval = interval
-        self._on_exit = on_exit
-        self._signal_handlers = {}
-        self._heartbeater = None
+        Drop the connection to the service: its tasks fall back to direct
+        heartbeats. Called with the lock held.
+        """
+        logger.error('lost connection to the heartbeat service: {}'.format(error))
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except (IOError, OSError):
+                pass
+        self._conn = None
+        self._registered.clear()
 
-    def start(self, token, task):
-        """Start heartbeating in a child process.
+    def register(self, token, interval):
+        """
+        Have the service send the heartbeats of a task every *interval*
+        seconds.
+        """
+        try:
+            conn = self._connection()
+        except (IOError, OSError) as error:
+            logger.error('cannot register task to the heartbeat service: {}'.format(error))
+            conn = None
+        with self._lock:
+            self._intervals[token] = interval
+            if conn is None:
+                return
+            try:
+                conn.send(('register', token, interval))
+            except (EOFError, IOError, OSError) as error:
+                self._disconnect(error)
+            else:
+                self._registered.add(token)
+
+    def unregister(self, token):
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            self._cancelled.pop(token, None)
+            self._intervals.pop(token, None)
+            self._due.pop(token, None)
+            if token not in self._registered:
+                return
+            self._registered.discard(token)
+            try:
+                self._conn.send(('unregister', token))
+            except (EOFError, IOError, OSError) as error:
+                self._disconnect(error)
 
-        The only child is the heartbeat process.
-        If it stops, SWF will trigger a heartbeat timeout.
+    def cancelled(self, token):
+        """
+        Whether the service reported the task as cancelled or gone.
 
-        :param token: used in the heartbeat message.
-        :type  token: str
+        :returns: the reason, or None
+        :rtype: Optional[str]
+        """
+        if self._pid != os.getpid():
+            return None
+        with self._lock:
+            try:
+                while self._conn is not None and self._conn.poll(0):
+                    _, cancelled_token, reason = self._conn.recv()
+                    self._cancelled[cancelled_token] = reason
+            except (EOFError, IOError, OSError) as error:
+                self._disconnect(error)
+            return self._cancelled.get(token)
 
-        :task  task: SWF activity task.
-        :type  task: ``swf.models.ActivityTask``
+    def heartbeat_due(self, token):
         """
-        self._heartbeater = multiprocessing.Process(
-            target=HeartbeatProcess(self._heartbeat, self._interval).run,
-            args=(token, task)
-        )
-        self._heartbeater.start()
-        return self
+        Whether the heartbeat of a task the service doesn't send, e.g. as it
+        died, is to be sent now. Then it's due again after the interval the
+        task was registered with.
 
-    def stop(self):
-        assert self._heartbeater is not None
+        :rtype: bool
+        """
+        with self._lock:
+            if self._pid == os.getpid() and token in self._registered:
+                return False
+            now = time.time()
+            if now < self._due.get(token, 0):
+                return False
+            self._due[token] = now + self._intervals.get(token, 0)
+            return True
+
+
+def _run_service(address, heartbeat, rate, ready):
+    HeartbeatService(heartbeat, rate).serve(address, ready)
+
+
+def start_heartbeat_service(heartbeat, rate, address=None):
+    # type: (Callable[[str], Optional[dict]], float, Optional[str]) -> Tuple[multiprocessing.Process, HeartbeatClient]
+    """
+    Start a heartbeat service in a sidecar process.
+
+    :param heartbeat: sends a heartbeat, e.g. ``ActivityPoller.heartbeat``
+    :type heartbeat: Callable[[str], Optional[dict]]
+    :param rate: heartbeats per second
+    :type rate: float
+    :param address: address of a service that died, to restart it where its
+        clients connect
+    :type address: Optional[str]
+    :returns: the service process, and the client to pass to the worker processes
+    """
+    if address is None:
+        directory = tempfile.mkdtemp(prefix='simpleflow-heartbeat-')
+        address = os.path.join(directory, 'heartbeat.sock')
+    else:
+        directory = None
+        if os.path.exists(address):
+            os.unlink(address)
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(
+        target=_run_service,
+        args=(address, heartbeat, rate, ready),
+        name='heartbeat-service',
+    )
+    process.daemon = True
+    process.start()
+    if not ready.wait(30):
+        process.terminate()
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+        raise RuntimeError('cannot start heartbeat service')
+    return process, HeartbeatClient(address)
 
-        self._heartbeater.terminate()
 
-        return self
+def stop_heartbeat_service(process, client):
+    # type: (multiprocessing.Process, HeartbeatClient) -> None
+    process.terminate()
+    process.join()
+    shutil.rmtree(os.path.dirname(client.address), ignore_errors=True)
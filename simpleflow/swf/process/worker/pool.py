@@ -0,0 +1,163 @@
+from __future__ import absolute_import
+
+import multiprocessing
+import os
+
+import psutil
+
+from simpleflow import logger, logging_context
+from swf.models import ActivityTask as BaseActivityTask
+
+
+if False:
+    from typing import Callable, List, Optional  # NOQA
+    from simpleflow.swf.process.worker.base import ActivityPoller  # NOQA
+    from swf.responses import Response  # NOQA
+
+
+def import_object(path):
+    """
+    Import an object from its dotted path, e.g. "mypackage.setup.load_models".
+    """
+    module_name, object_name = path.rsplit('.', 1)
+    module = __import__(module_name, fromlist=['*'])
+    return getattr(module, object_name)
+
+
+def activity_process_main(poller, conn, max_tasks=None, max_rss=None, setup=None):
+    """
+    Main loop of a long-lived activity process: run activity tasks from *conn*
+    until told to stop, or until it's time to recycle the process.
+
+    :param poller:
+    :type poller: ActivityPoller
+    :param conn: our end of the pipe to the poller process
+    :type conn: multiprocessing.connection.Connection
+    :param max_tasks: recycle the process after this many tasks
+    :type max_tasks: Optional[int]
+    :param max_rss: recycle the process when its RSS exceeds this many bytes
+    :type max_rss: Optional[int]
+    :param setup: called once when the process starts, to build the resources
+        shared by its tasks
+    :type setup: Optional[List[Callable[[], None]]]
+    """
+    # Imported here to avoid a circular import
+    from simpleflow.swf.process.worker.base import ActivityWorker
+
+    for hook in setup or ():
+        hook()
+    worker = ActivityWorker()
+    nb_tasks = 0
+    process = psutil.Process()
+    ppid = os.getppid()
+    while True:
+        try:
+            if not conn.poll(1):
+                if os.getppid() != ppid:  # Poller is gone
+                    break
+                continue
+            message = conn.recv()
+        except EOFError:  # Poller is gone
+            break
+        if message is None:
+            break
+
+        logging_context.set('workflow_id', message['workflowExecution']['workflowId'])
+        logging_context.set('task_type', 'activity')
+        logging_context.set('event_id', message['startedEventId'])
+        logging_context.set('activity_id', message['activityId'])
+        task = BaseActivityTask.from_poll(poller.domain, poller.task_list, message)
+        worker.process(poller, task.task_token, task)
+
+        nb_tasks += 1
+        recycle = False
+        if max_tasks and nb_tasks >= max_tasks:
+            logger.info('activity process pid={}: {} tasks done, recycling'.format(os.getpid(), nb_tasks))
+            recycle = True
+        elif max_rss:
+            rss = process.memory_info().rss
+            if rss > max_rss:
+                logger.info('activity process pid={}: rss={} > {}, recycling'.format(os.getpid(), rss, max_rss))
+                recycle = True
+        conn.send(recycle)
+        if recycle:
+            break
+
+
+class ActivityProcess(object):
+    """
+    Handle on a long-lived activity process, as seen from the poller process.
+
+    Instead of forking a process for each activity task, tasks are sent to a
+    process that outlives them: modules imported before forking are shared,
+    and the setup hooks build the expensive resources once per process.
+    The process is recycled after *max_tasks* tasks or when its RSS exceeds
+    *max_rss* bytes.
+
+    :ivar process: the activity process
+    :type process: multiprocessing.Process
+    :ivar conn: our end of the pipe to the activity process
+    :type conn: multiprocessing.connection.Connection
+    :ivar retired: whether the process is recycled or dead
+    :type retired: bool
+    :ivar died: whether the process died while running a task
+    :type died: bool
+    """
+
+    def __init__(self, poller, max_tasks=None, max_rss=None, setup=None):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=activity_process_main,
+            args=(poller, child_conn, max_tasks, max_rss, setup),
+        )
+        self.process.start()
+        child_conn.close()
+        self.retired = False
+        self.died = False
+        logger.debug('started activity process pid={}'.format(self.process.pid))
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def send(self, response):
+        # type: (Response) -> None
+        """
+        Send a task; the raw poll response is sent, as the task holds boto
+        connections.
+        """
+        self.conn.send(response.raw_response)
+
+    def wait(self, timeout=None):
+        """
+        Wait up to *timeout* seconds for the current task to be done.
+
+        :returns: whether the task is done, or the process died
+        :rtype: bool
+        """
+        try:
+            if self.conn.poll(timeout):
+                self.retired = self.conn.recv()
+                return True
+        except (EOFError, IOError):
+            # The process closed its end of the pipe: it's exiting.
+            self.process.join(1)
+            self.retired = self.died = True
+            return True
+        if not self.process.is_alive():
+            self.retired = self.died = True
+            return True
+        return False
+
+    @property
+    def exitcode(self):
+        return self.process.exitcode
+
+    def stop(self):
+        if self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except (IOError, OSError):
+                pass
+        self.process.join()
+        self.conn.close()
@@ -1,5 +1,8 @@
 from __future__ import absolute_import
 
+import copy
+import json
+
 import swf.exceptions
 import swf.models
 import swf.querysets
@@ -7,7 +10,7 @@ from simpleflow.history import History
 
 
 if False:
-    from typing import Any, List, Dict  # NOQA
+    from typing import Any, List, Dict, Optional, Tuple  # NOQA
     from swf.models.decision.base import Decision  # NOQA
 
 
@@ -64,6 +67,8 @@ class DecisionsAndContext(object):
     def __init__(self, decisions=None, execution_context=None):
         self.decisions = decisions or []  # type: List[Decision]
         self.execution_context = execution_context  # type: Dict[str, Any]
+        # (decision, copy of the decision, serialized size) of each sized decision
+        self._sizes = []  # type: List[Tuple[Decision, Decision, int]]
 
     def __repr__(self):
         return '<{} decisions={}, execution_context={}>'.format(
@@ -84,6 +89,48 @@ class DecisionsAndContext(object):
         """
         self.decisions += decisions
 
+    @staticmethod
+    def _serialized_list_size(items_size, count):
+        # type: (int, int) -> int
+        """
+        Size of a JSON list given the sizes of its items: "[" + items separated
+        by ", " + "]".
+        """
+        return 2 + items_size + 2 * (count - 1) if count else 2
+
+    def decisions_size(self, extra_decisions=None):
+        # type: (Optional[List[Decision]]) -> int
+        """
+        Length of ``json.dumps(self.decisions + extra_decisions)``.
+
+        Each decision is serialized only once, so checking the size of a large
+        list of decisions doesn't cost a full serialization. A decision that
+        was replaced or changed since it was sized is sized again: comparing
+        it with its copy is cheap, as they share their strings.
+        NB: like boto.swf does, use json.dumps, not json_dumps.
+        """
+        del self._sizes[len(self.decisions):]
+        items_size = 0
+        for index, decision in enumerate(self.decisions):
+            if index < len(self._sizes):
+                sized, snapshot, size = self._sizes[index]
+                if sized is decision and snapshot == decision:
+                    items_size += size
+                    continue
+            size = len(json.dumps(decision))
+            entry = (decision, copy.deepcopy(decision), size)
+            if index < len(self._sizes):
+                self._sizes[index] = entry
+            else:
+                self._sizes.append(entry)
+            items_size += size
+
+        count = len(self.decisions)
+        for decision in extra_decisions or ():
+            items_size += len(json.dumps(decision))
+            count += 1
+        return self._serialized_list_size(items_size, count)
+
     def append_kv_to_context(self, key, value):
         # type: (str, Any) -> None
         """
@@ -1,11 +1,13 @@
 from __future__ import absolute_import
 
 import abc
+import threading
 import time
 from copy import deepcopy
 from enum import Enum
 from typing import TYPE_CHECKING
 
+import lazy_object_proxy.simple
 import six
 
 from simpleflow.base import Submittable
@@ -17,12 +19,33 @@ if TYPE_CHECKING:
     from typing import Optional, Any, Dict, Union, Type  # NOQA
 
 
+class ThreadContext(lazy_object_proxy.simple.Proxy):
+    """
+    Context of the task run by the current thread. It's set as the context
+    of function activities run concurrently in threads, as the attributes
+    of a function are shared by the threads.
+    """
+    _local = threading.local()
+
+    def __init__(self):
+        super(ThreadContext, self).__init__(None)
+
+    @property
+    def __wrapped__(self):
+        return getattr(ThreadContext._local, 'context', None)
+
+
+THREAD_CONTEXT = ThreadContext()
+
+
 def get_actual_value(value):
     """
-    Unwrap the result of a Future or return the value.
+    Unwrap the result of a Future or return the value. A result that wasn't
+    read yet is passed on without being decoded.
     """
-    if isinstance(value, futures.Future):
-        return futures.get_result_or_raise(value)
+    # Not isinstance(): it would resolve the proxies of jumbo fields
+    if issubclass(type(value), futures.Future):
+        return value.lazy_result()
     return value
 
 
@@ -82,7 +105,13 @@ class ActivityTask(Task):
             self.kwargs,
             self.id)
 
-    def execute(self):
+    def execute(self, thread_local_context=False):
+        """
+        :param thread_local_context: set the context of a function activity
+            for the current thread only, when tasks run concurrently in
+            threads
+        :type thread_local_context: bool
+        """
         method = self.activity.callable
 
         if getattr(method, 'add_context_in_kwargs', False):
@@ -98,8 +127,13 @@ class ActivityTask(Task):
         else:
             # NB: the following line attaches some *state* to the callable, so it
             # can be used directly for advanced usage. This works well because we
-            # don't do multithreading, but if we ever do, DANGER!
-            method.context = self.context
+            # run one task per process; when a worker runs tasks concurrently in
+            # threads, it's a proxy to the context of the current thread.
+            if thread_local_context:
+                ThreadContext._local.context = self.context
+                method.context = THREAD_CONTEXT
+            else:
+                method.context = self.context
             return method(*self.args, **self.kwargs)
 
     def propagate_attribute(self, attr, val):
@@ -1,6 +1,7 @@
-from uuid import UUID
+from uuid import UUID, uuid4
 
 import datetime
+import functools
 import json
 import types
 
@@ -11,7 +12,38 @@ from simpleflow.compat import PY2
 from simpleflow.futures import Future
 
 
-def serialize_complex_object(obj):
+class RawJSONValues(object):
+    """
+    JSON documents to embed as is in a JSON document being serialized: they
+    are serialized as placeholders, then replaced.
+    """
+
+    def __init__(self):
+        self._values = []
+        self._token = None
+
+    def placeholder(self, raw_json):
+        if self._token is None:
+            self._token = uuid4().hex
+        self._values.append(raw_json)
+        return u'\x00{}:{}\x00'.format(self._token, len(self._values) - 1)
+
+    def embed(self, document):
+        for index, raw_json in enumerate(self._values):
+            placeholder = json.dumps(u'\x00{}:{}\x00'.format(self._token, index))
+            document = document.replace(placeholder, raw_json, 1)
+        return document
+
+
+def serialize_complex_object(obj, raw_values=None):
+    """
+    :param raw_values: where to put the JSON documents to embed as is, if
+        supported by the caller
+    :type raw_values: Optional[RawJSONValues]
+    """
+    # First: other isinstance() checks resolve proxies
+    if isinstance(obj, lazy_object_proxy.Proxy):
+        return _serialize_proxy(obj, raw_values)
     if isinstance(obj, bytes):  # Python 3 only (serialize_complex_object not called here in Python 2)
         return obj.decode('utf-8', errors='replace')
     if isinstance(obj, datetime.datetime):
@@ -31,11 +63,9 @@ def serialize_complex_object(obj):
     elif isinstance(obj, types.GeneratorType):
         return [i for i in obj]
     elif isinstance(obj, Future):
-        return obj.result
+        return obj.lazy_result()
     elif isinstance(obj, UUID):
         return str(obj)
-    elif isinstance(obj, lazy_object_proxy.Proxy):
-        return str(obj)
     elif isinstance(obj, (set, frozenset)):
         return list(obj)
     raise TypeError(
@@ -43,13 +73,30 @@ def serialize_complex_object(obj):
         " please file a new issue on GitHub!" % type(obj))
 
 
+def _serialize_proxy(obj, raw_values=None):
+    """
+    Serialize a proxy: jumbo fields are passed by reference if their proxy
+    provides one (see `simpleflow.format.decode`); encoded fields not decoded
+    yet are passed as is if they're JSON documents (see
+    `simpleflow.format.FieldLoader`); else the proxy is resolved.
+    """
+    factory = obj.__factory__
+    reference = getattr(factory, 'reference', None)
+    if reference is not None:
+        return reference
+    raw_json = getattr(factory, 'raw_json', None)
+    if raw_json is not None and raw_values is not None and not obj.__resolved__:
+        return raw_values.placeholder(raw_json)
+    return obj.__wrapped__
+
+
 def _resolve_proxy(obj):
+    if isinstance(obj, lazy_object_proxy.Proxy):
+        return _resolve_proxy(_serialize_proxy(obj))
     if isinstance(obj, dict):
         return {k: _resolve_proxy(v) for k, v in iteritems(obj)}
     if isinstance(obj, (list, tuple)):
         return [_resolve_proxy(v) for v in obj]
-    if isinstance(obj, lazy_object_proxy.Proxy):
-        return str(obj)
     return obj
 
 
@@ -65,8 +112,13 @@ def json_dumps(obj, pretty=False, compact=True, **kwargs):
     :return:
     :rtype: str
     """
+    raw_values = None
     if "default" not in kwargs:
-        kwargs["default"] = serialize_complex_object
+        raw_values = RawJSONValues()
+        kwargs["default"] = functools.partial(serialize_complex_object, raw_values=raw_values)
+    if isinstance(obj, lazy_object_proxy.Proxy):
+        # Looks like a string to the encoder, which then rejects it
+        obj = _serialize_proxy(obj, raw_values)
     if pretty:
         kwargs["indent"] = 4
         kwargs["sort_keys"] = True
@@ -76,7 +128,10 @@ def json_dumps(obj, pretty=False, compact=True, **kwargs):
         kwargs["sort_keys"] = True
 
     try:
-        return json.dumps(obj, **kwargs)
+        document = json.dumps(obj, **kwargs)
+        if raw_values is not None:
+            document = raw_values.embed(document)
+        return document
     except TypeError:
         # lazy_object_proxy.Proxy subclasses basestring: serialize_complex_object isn't called on python2
         if PY2:
@@ -85,16 +140,17 @@ def json_dumps(obj, pretty=False, compact=True, **kwargs):
         raise
 
 
-def json_loads_or_raw(data):
+def json_loads_or_raw(data, object_hook=None):
     """
     Try to get a JSON object from a string.
     If this isn't JSON, return the raw string.
     :param data: string; should be in JSON format
+    :param object_hook: see `json.loads`
     :return: JSON-decoded object or raw data
     """
     if not data:
         return None
     try:
-        return json.loads(data)
+        return json.loads(data, object_hook=object_hook)
     except Exception:
         return data
@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
+import time
+
 import boto.exception
 
-from simpleflow import compat, format, logging_context
+from simpleflow import compat, format, logger, logging_context
 from simpleflow.utils import json_dumps
 from swf.actors.core import Actor
 from swf.exceptions import PollTimeout, ResponseError, DoesNotExistError
 from swf.models.history import History
+from swf.models.history.store import EventStore
 from swf.models.workflow import WorkflowExecution, WorkflowType
 from swf.responses import Response
 
@@ -58,8 +61,77 @@ class Decider(Actor):
         finally:
             logging_context.reset()
 
+    def _poll_page(self, next_page, task_list, identity, **kwargs):
+        """
+        Fetch a page of the decision task history.
+
+        :rtype: dict[str, Any]
+        """
+        try:
+            task = self.connection.poll_for_decision_task(
+                self.domain.name,
+                task_list=task_list,
+                identity=format.identity(identity),
+                next_page_token=next_page,
+                **kwargs
+            )
+        except boto.exception.SWFResponseError as e:
+            message = self.get_error_message(e)
+            if e.error_code == 'UnknownResourceFault':
+                raise DoesNotExistError(
+                    "Unable to poll decision task",
+                    message,
+                )
+
+            raise ResponseError(message)
+
+        if task.get('taskToken') is None:
+            raise PollTimeout("Decider poll timed out")
+        return task
+
+    def _fetch_new_events(self, task, known_events, task_list, identity, **kwargs):
+        """
+        Fetch the history of a decision task polled in reverse order, stopping
+        as soon as we reach the *known_events*, which are the first events of
+        the history. Fall back to fetching the whole history if they don't
+        match.
+
+        :param task: first page of the decision task
+        :type task: dict[str, Any]
+        :param known_events: first events of the history, if known
+        :type known_events: Optional[list[dict[str, Any]]]
+
+        :returns: the history events, in chronological order
+        :rtype: list[dict[str, Any]]
+        """
+        last_known_id = 0
+        if known_events and known_events[-1]['eventId'] == len(known_events) <= task['startedEventId']:
+            last_known_id = len(known_events)
+
+        events = list(task['events'])
+        next_page = task.get('nextPageToken')
+        while next_page and not (last_known_id and events and events[-1]['eventId'] <= last_known_id + 1):
+            task = self._poll_page(next_page, task_list, identity, **kwargs)
+            events.extend(task['events'])
+            next_page = task.get('nextPageToken')
+
+        if last_known_id:
+            new_events = [e for e in reversed(events) if e['eventId'] > last_known_id]
+            if all(e['eventId'] == last_known_id + i + 1 for i, e in enumerate(new_events)):
+                logger.debug('fetched {} new history events after event {}'.format(len(new_events), last_known_id))
+                return known_events + new_events
+            logger.warning('gap in history events after event {}, fetching the whole history'.format(last_known_id))
+
+        while next_page:
+            task = self._poll_page(next_page, task_list, identity, **kwargs)
+            events.extend(task['events'])
+            next_page = task.get('nextPageToken')
+        events.reverse()
+        return events
+
     def poll(self, task_list=None,
              identity=None,
+             get_known_events=None,
              **kwargs):
         """
         Polls a decision task and returns the token and the full history of the
@@ -73,13 +145,24 @@ class Decider(Actor):
         workflow history.
         :type identity: str
 
-        :returns: a Response object with history, token, and execution set
+        :param get_known_events: if set, called with the workflow and run IDs
+        of the decision task, returns the raw history events we already know
+        for this execution, or None. The history is then fetched in reverse
+        order, and only the new events are transferred.
+        :type get_known_events: Optional[Callable[[str, str], Optional[list[dict[str, Any]]]]]
+
+        :returns: a Response object with history, token, and execution set,
+        and timings: seconds spent polling, fetching the next pages and building
+        the events
         :rtype: swf.responses.Response
 
         """
         logging_context.reset()
         task_list = task_list or self.task_list
+        if get_known_events is not None:
+            kwargs['reverse_order'] = True
 
+        start = time.time()
         task = self.connection.poll_for_decision_task(
             self.domain.name,
             task_list=task_list,
@@ -89,40 +172,46 @@ class Decider(Actor):
         token = task.get('taskToken')
         if token is None:
             raise PollTimeout("Decider poll timed out")
+        timings = {'poll': time.time() - start, 'paginate': 0., 'build_events': 0.}
 
         events = task['events']
         logging_context.set("workflow_id", task["workflowExecution"]["workflowId"])
         logging_context.set("task_type", "decision")
         logging_context.set("event_id", task["startedEventId"])
 
-        next_page = task.get('nextPageToken')
-        while next_page:
-            try:
-                task = self.connection.poll_for_decision_task(
-                    self.domain.name,
-                    task_list=task_list,
-                    identity=format.identity(identity),
-                    next_page_token=next_page,
-                    **kwargs
-                )
-            except boto.exception.SWFResponseError as e:
-                message = self.get_error_message(e)
-                if e.error_code == 'UnknownResourceFault':
-                    raise DoesNotExistError(
-                        "Unable to poll decision task",
-                        message,
-                    )
-
-                raise ResponseError(message)
-
-            token = task.get('taskToken')
-            if token is None:
-                raise PollTimeout("Decider poll timed out")
-
-            events.extend(task['events'])
+        if get_known_events is not None:
+            start = time.time()
+            events = self._fetch_new_events(
+                task,
+                get_known_events(task['workflowExecution']['workflowId'], task['workflowExecution']['runId']),
+                task_list,
+                identity,
+                **kwargs
+            )
+            timings['paginate'] = time.time() - start
+            start = time.time()
+            store = EventStore.from_event_list(events)
+            timings['build_events'] = time.time() - start
+            next_page = None
+        else:
+            start = time.time()
+            store = EventStore.from_event_list(events)
+            timings['build_events'] = time.time() - start
             next_page = task.get('nextPageToken')
-
-        history = History.from_event_list(events)
+        if next_page:
+            start = time.time()
+            while next_page:
+                task = self._poll_page(next_page, task_list, identity, **kwargs)
+                events.extend(task['events'])
+                build_start = time.time()
+                for raw_event in task['events']:
+                    store.append_raw(raw_event)
+                timings['build_events'] += time.time() - build_start
+                next_page = task.get('nextPageToken')
+            token = task['taskToken']
+            timings['paginate'] = time.time() - start
+
+        history = History(events=store, raw=events)
 
         workflow_type = WorkflowType(
             domain=self.domain,
@@ -137,4 +226,10 @@ class Decider(Actor):
         )
 
         # TODO: move history into execution (needs refactoring on WorkflowExecution.history())
-        return Response(token=token, history=history, execution=execution)
+        return Response(
+            token=token,
+            history=history,
+            execution=execution,
+            previous_started_event_id=task.get('previousStartedEventId'),
+            timings=timings,
+        )
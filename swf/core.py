@@ -4,8 +4,11 @@
 # Copyright (c) 2013, Greg Leclercq
 #
 # See the file LICENSE for copying permission.
+import multiprocessing.util
 import os
+import threading
 
+from boto.connection import ConnectionPool
 from boto.exception import NoAuthHandlerFound
 import boto.swf
 
@@ -21,6 +24,79 @@ from . import settings
 SETTINGS = settings.get()
 RETRIES = int(os.environ.get('SWF_CONNECTION_RETRIES', '5'))
 
+# Environment variables boto may read the credentials from
+CREDENTIALS_ENV_VARS = (
+    'AWS_ACCESS_KEY_ID',
+    'AWS_SECRET_ACCESS_KEY',
+    'AWS_SECURITY_TOKEN',
+    'AWS_SESSION_TOKEN',
+    'AWS_PROFILE',
+)
+
+
+class ConnectionRegistry(object):
+    """
+    SWF connections shared by the objects of the process, by region and
+    credentials: building a model or a queryset doesn't build a connection,
+    and the HTTPS connections are kept alive between calls.
+
+    After a fork, the connections are kept but their pools are emptied:
+    pooled sockets are shared with the parent process, and SSL connections
+    are stateful, so using them from several processes would collide.
+
+    :ivar _connections: connections by (region, credentials, credentials env vars)
+    :type _connections: dict[tuple, boto.swf.layer1.Layer1]
+    """
+
+    def __init__(self):
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._connections)
+
+    def get(self, region, **creds):
+        """
+        Get a connection to *region*, creating it if needed.
+
+        :param region: AWS region
+        :type region: str
+        :param creds: explicit credentials, passed to boto
+        :type creds: dict[str, str]
+        :return: the connection; None if the region is invalid
+        :rtype: Optional[boto.swf.layer1.Layer1]
+        """
+        key = (
+            region,
+            tuple(sorted(creds.items())),
+            tuple(os.environ.get(var) for var in CREDENTIALS_ENV_VARS),
+        )
+        connection = self._connections.get(key)
+        if connection is None:
+            with self._lock:
+                connection = self._connections.get(key)
+                if connection is None:
+                    connection = boto.swf.connect_to_region(region, **creds)
+                    if connection is not None:
+                        self._connections[key] = connection
+        return connection
+
+    def clear(self):
+        with self._lock:
+            self._connections.clear()
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        for connection in self._connections.values():
+            connection._pool = ConnectionPool()
+
+
+CONNECTIONS = ConnectionRegistry()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=CONNECTIONS.reset_after_fork)
+else:  # Python 2
+    multiprocessing.util.register_after_fork(CONNECTIONS, ConnectionRegistry.reset_after_fork)
+
 
 class ConnectedSWFObject(object):
     """Authenticated object interface
@@ -51,7 +127,7 @@ class ConnectedSWFObject(object):
         cred_keys = ['aws_access_key_id', 'aws_secret_access_key']
         creds_ = {k: SETTINGS[k] for k in cred_keys if SETTINGS.get(k, None)}
         self.connection = (kwargs.pop('connection', None) or
-                           boto.swf.connect_to_region(self.region, **creds_))
+                           CONNECTIONS.get(self.region, **creds_))
         if self.connection is None:
             raise ValueError('invalid region: {}'.format(self.region))
 
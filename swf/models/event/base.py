@@ -8,12 +8,40 @@
 from datetime import datetime
 
 import pytz
-from future.utils import iteritems
 
 from simpleflow import format
 from swf.utils import camel_to_underscore, cached_property
 
 
+# Attributes names by event attributes key, e.g.
+# {'timerStartedEventAttributes': ({'timer_id': 'timerId', ...}, {'timerId', ...})}:
+# the underscored names, and the raw keys already translated. Optional keys
+# are added the first time they are seen.
+_ATTRIBUTES_NAMES = {}
+
+
+def get_attributes_names(attributes_key, attributes):
+    """
+    Return the {underscored name: raw key} mapping of an event type,
+    extended with the keys of *attributes* if needed.
+
+    :param attributes_key: e.g. 'timerStartedEventAttributes'
+    :type attributes_key: str
+    :param attributes: raw event attributes
+    :type attributes: dict
+    :rtype: dict[str, str]
+    """
+    try:
+        names, keys = _ATTRIBUTES_NAMES[attributes_key]
+    except KeyError:
+        names, keys = _ATTRIBUTES_NAMES[attributes_key] = ({}, set())
+    for key in attributes:
+        if key not in keys:
+            names[camel_to_underscore(key)] = key
+            keys.add(key)
+    return names
+
+
 class Event(object):
     """Simple workflow execution event wrapper base class
 
@@ -26,6 +54,10 @@ class Event(object):
     name, json representation key to extract relevant data from,
     and sets the event id, state and timestamp from the constructor.
 
+    The event attributes are kept raw, and resolved on first access:
+    ``event.activity_id`` reads ``activityId`` from the event attributes.
+    ``input`` and ``control`` are only decoded when read.
+
     Event base class is used in this project to implement
     ``swf.models.event.task.DecisionTaskEvent``, which a typical
     instance would for example have type 'DecisionTask',
@@ -54,18 +86,32 @@ class Event(object):
         'eventTimestamp'
     )
 
-    def __init__(self, id, state, timestamp, raw_data):
+    def __init__(self, id, state, timestamp, raw_data, attributes_key=None):
         """
         """
+        if attributes_key is not None:
+            self._attributes_key = attributes_key
         self._id = id
         self._state = state
         self._timestamp = timestamp
-        self._input = {}
-        self._control = None
         self.raw = raw_data or {}
 
         self.process_attributes()
 
+    def __getattr__(self, name):
+        # Only called when the attribute isn't already set.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        attributes = self._attributes
+        if not attributes:
+            raise AttributeError(name)
+        key = get_attributes_names(self._attributes_key, attributes).get(name)
+        if key is None or key not in attributes:
+            raise AttributeError(name)
+        value = attributes[key]
+        setattr(self, name, value)
+        return value
+
     def __repr__(self):
         return '<Event %s %s : %s >' % (self.id, self.type, self.state)
 
@@ -91,7 +137,15 @@ class Event(object):
 
     @property
     def input(self):
-        return self._input
+        try:
+            return self._input
+        except AttributeError:
+            attributes = self._attributes or {}
+            if 'input' in attributes:
+                self.input = attributes['input']
+            else:
+                self._input = {}
+            return self._input
 
     @input.setter
     def input(self, value):
@@ -99,14 +153,27 @@ class Event(object):
 
     @property
     def control(self):
-        return self._control
+        try:
+            return self._control
+        except AttributeError:
+            attributes = self._attributes or {}
+            if 'control' in attributes:
+                self.control = attributes['control']
+            else:
+                self._control = None
+            return self._control
 
     @control.setter
     def control(self, value):
         self._control = format.decode(value)
 
+    def get_raw(self, name, default=None):
+        """
+        Raw value of the attribute *name*, e.g. the encoded ``input``.
+        """
+        return (self._attributes or {}).get(name, default)
+
     def process_attributes(self):
-        """Processes the event raw_data attributes_key elements
-        and sets current instance attributes accordingly"""
-        for key, value in iteritems(self.raw[self._attributes_key]):
-            setattr(self, camel_to_underscore(key), value)
+        """Binds the event to its raw_data attributes_key elements;
+        instance attributes are resolved from them on access"""
+        self._attributes = self.raw[self._attributes_key]
@@ -121,7 +121,9 @@ class EventFactory(object):
             id=event_id,
             state=event_state,
             timestamp=event_timestamp,
-            raw_data=raw_event
+            raw_data=raw_event,
+            # The class attribute changes with each event: keep ours.
+            attributes_key=event_attributes_key,
         )
 
         return instance
@@ -9,8 +9,9 @@ from itertools import groupby
 from builtins import object, range
 
 from future.utils import iteritems
-from swf.models.event import EventFactory, CompiledEventFactory
+from swf.models.event import CompiledEventFactory
 from swf.models.event.workflow import WorkflowExecutionEvent
+from swf.models.history.store import EventStore
 from swf.utils import cached_property
 
 
@@ -22,7 +23,8 @@ class History(object):
     using its from_event_list method.
 
     It is iterable and exposes a list-like __getitem__ for easier
-    manipulation.
+    manipulation. Events are kept in a compact
+    ``swf.models.history.store.EventStore``.
 
     :param  events: Events list to build History upon
     :type   events: list[swf.models.event.Event]
@@ -71,6 +73,19 @@ class History(object):
         self.raw = kwargs.pop('raw', None)
         self.it_pos = 0
 
+    @property
+    def events(self):
+        """
+        :rtype: EventStore
+        """
+        return self._events
+
+    @events.setter
+    def events(self, events):
+        if not isinstance(events, EventStore):
+            events = EventStore(events)
+        self._events = events
+
     def __len__(self):
         return len(self.events)
 
@@ -132,7 +147,7 @@ class History(object):
         """
         end_pos = len(self.events)
         start_pos = len(self.events) - n
-        return self.events[start_pos:end_pos]
+        return list(self.events[start_pos:end_pos])
 
     @property
     def first(self):
@@ -188,12 +203,17 @@ class History(object):
                 <Event 21 DecisionTask : started>
             >
 
-        :rtype: swf.models.history.History
+        :rtype: list[swf.models.event.Event]
         """
-        return filter(
-            lambda e: all(getattr(e, k) == v for k, v in iteritems(kwargs)),
-            self.events
+        # Type and state are indexed: only build the matching events
+        positions = self.events.positions(
+            type=kwargs.pop('type', None),
+            state=kwargs.pop('state', None),
         )
+        return [
+            e for e in (self.events[i] for i in positions)
+            if all(getattr(e, k) == v for k, v in iteritems(kwargs))
+        ]
 
     @property
     def reversed(self):
@@ -268,10 +288,4 @@ class History(object):
         :returns: History model instance built upon data description
         :rtype: swf.model.history.History
         """
-        events_history = []
-
-        for index, d in enumerate(data):
-            event = EventFactory(d)
-            events_history.append(event)
-
-        return cls(events=events_history, raw=data)
+        return cls(events=EventStore.from_event_list(data), raw=data)
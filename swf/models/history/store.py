@@ -0,0 +1,255 @@
+# -*- coding:utf-8 -*-
+
+# See the file LICENSE for copying permission.
+
+import weakref
+from array import array
+from builtins import range
+
+try:
+    from collections.abc import Sequence
+except ImportError:  # Python 2
+    from collections import Sequence
+
+from swf.models.event import EventFactory
+
+
+# (type, state) of the events, e.g. ('ActivityTask', 'completed'); the store
+# only keeps their index in this table.
+_KINDS = []
+_KIND_CODES = {}
+
+# eventType -> kind code
+_EVENT_TYPE_KINDS = {}
+
+
+def get_kind_code(event_type, state):
+    """
+    Return the code of an event kind, registering it if needed.
+
+    :type event_type: str
+    :type state: str
+    :rtype: int
+    """
+    kind = (event_type, state)
+    code = _KIND_CODES.get(kind)
+    if code is None:
+        code = _KIND_CODES[kind] = len(_KINDS)
+        _KINDS.append(kind)
+    return code
+
+
+def get_event_type_kind_code(event_type):
+    """
+    Return the kind code of a raw eventType, e.g. 'ActivityTaskCompleted'.
+
+    :type event_type: str
+    :rtype: int
+    """
+    code = _EVENT_TYPE_KINDS.get(event_type)
+    if code is None:
+        type_ = EventFactory._extract_event_type(event_type)
+        state = EventFactory._extract_event_state(type_, event_type)
+        code = _EVENT_TYPE_KINDS[event_type] = get_kind_code(type_, state)
+    return code
+
+
+class EventStore(Sequence):
+    """
+    Compact list of history events.
+
+    Event ids, kinds (type and state) and timestamps are kept in typed arrays,
+    and the raw events by reference. Events built from raw data are only
+    materialized when accessed, and only weakly cached: on a large history,
+    events that aren't referenced anymore don't hold memory. Events appended
+    as objects are kept as is.
+
+    Events positions are indexed by type, so that filtering on type and state
+    doesn't require building the events.
+
+    :ivar _ids: event ids
+    :type _ids: array
+    :ivar _kinds: event kind codes
+    :type _kinds: array
+    :ivar _timestamps: event timestamps
+    :type _timestamps: array
+    :ivar _raw: raw events
+    :type _raw: list[dict]
+    :ivar _events: events appended as objects, None for raw events
+    :type _events: list[Optional[swf.models.event.Event]]
+    :ivar _cache: raw events already materialized, by position
+    :type _cache: weakref.WeakValueDictionary
+    :ivar _by_type: event positions by type
+    :type _by_type: dict[str, array]
+    """
+    __slots__ = (
+        '_ids',
+        '_kinds',
+        '_timestamps',
+        '_raw',
+        '_events',
+        '_cache',
+        '_by_type',
+    )
+
+    def __init__(self, events=None):
+        self._ids = array('l')
+        self._kinds = array('H')
+        self._timestamps = array('d')
+        self._raw = []
+        self._events = []
+        self._cache = weakref.WeakValueDictionary()
+        self._by_type = {}
+        if events is not None:
+            self.extend(events)
+
+    @classmethod
+    def from_event_list(cls, data):
+        """
+        Build a store from raw events, as returned by the SWF API.
+
+        :type data: list[dict[str, Any]]
+        :rtype: EventStore
+        """
+        store = cls()
+        for raw_event in data:
+            store.append_raw(raw_event)
+        return store
+
+    def _add(self, event_id, kind, timestamp, raw_event, event):
+        type_ = _KINDS[kind][0]
+        positions = self._by_type.get(type_)
+        if positions is None:
+            positions = self._by_type[type_] = array('l')
+        positions.append(len(self._ids))
+        self._ids.append(event_id)
+        self._kinds.append(kind)
+        self._timestamps.append(float(timestamp))
+        self._raw.append(raw_event)
+        self._events.append(event)
+
+    def append_raw(self, raw_event):
+        """
+        Append a raw event.
+
+        :type raw_event: dict[str, Any]
+        """
+        self._add(
+            raw_event['eventId'],
+            get_event_type_kind_code(raw_event['eventType']),
+            raw_event['eventTimestamp'],
+            raw_event,
+            None,
+        )
+
+    def append(self, event):
+        """
+        Append an event.
+
+        :type event: swf.models.event.Event
+        """
+        self._add(
+            event.id,
+            get_kind_code(event.type, event.state),
+            event._timestamp,
+            event.raw,
+            event,
+        )
+
+    def extend(self, events):
+        if isinstance(events, EventStore):
+            for index in range(len(events)):
+                events._copy_to(self, index)
+        else:
+            for event in events:
+                self.append(event)
+
+    def _copy_to(self, store, index):
+        store._add(
+            self._ids[index],
+            self._kinds[index],
+            self._timestamps[index],
+            self._raw[index],
+            self._events[index],
+        )
+        event = self._cache.get(index)
+        if event is not None:
+            store._cache[len(store) - 1] = event
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _get(self, index):
+        event = self._events[index]
+        if event is None:
+            event = self._cache.get(index)
+            if event is None:
+                event = self._cache[index] = EventFactory(self._raw[index])
+        return event
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            store = EventStore()
+            for i in range(*index.indices(len(self))):
+                self._copy_to(store, i)
+            return store
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('event index out of range')
+        return self._get(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._get(index)
+
+    def __reversed__(self):
+        for index in range(len(self) - 1, -1, -1):
+            yield self._get(index)
+
+    def __repr__(self):
+        return '<{} len={}>'.format(self.__class__.__name__, len(self))
+
+    def __getstate__(self):
+        return {
+            'events': [self._get(index) for index in range(len(self))],
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state['events'])
+
+    @property
+    def raw(self):
+        """
+        :rtype: list[dict[str, Any]]
+        """
+        return self._raw
+
+    def id(self, index):
+        return self._ids[index]
+
+    def type(self, index):
+        return _KINDS[self._kinds[index]][0]
+
+    def state(self, index):
+        return _KINDS[self._kinds[index]][1]
+
+    def timestamp(self, index):
+        return self._timestamps[index]
+
+    def positions(self, type=None, state=None):
+        """
+        Positions of the events matching a type and/or a state, in order.
+
+        :type type: Optional[str]
+        :type state: Optional[str]
+        :rtype: list[int]
+        """
+        if type is not None:
+            candidates = self._by_type.get(type, ())
+        else:
+            candidates = range(len(self))
+        if state is None:
+            return list(candidates)
+        kinds = self._kinds
+        return [index for index in candidates if _KINDS[kinds[index]][1] == state]
@@ -0,0 +1,113 @@
+import unittest
+
+from mock import MagicMock, patch
+
+from simpleflow.process import Autoscaler, Supervisor
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBacklog(object):
+    def __init__(self, value=0):
+        self.value = value
+
+    def __call__(self):
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value
+
+
+def payload():
+    pass
+
+
+class TestAutoscalerHeadroom(unittest.TestCase):
+    @patch('psutil.virtual_memory', return_value=MagicMock(percent=50))
+    @patch('psutil.cpu_percent', side_effect=[0., 95.])
+    def test_cpu_usage_is_sampled_from_creation(self, cpu_percent, _):
+        autoscaler = Autoscaler(FakeBacklog(), max_children=10)
+        # The first call, returning 0.0, isn't used
+        self.assertEqual(cpu_percent.call_count, 1)
+        self.assertFalse(autoscaler.has_headroom())
+
+
+@patch.object(Autoscaler, 'has_headroom', return_value=True)
+class TestAutoscaler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.backlog = FakeBacklog()
+
+    def make_autoscaler(self, **kwargs):
+        return Autoscaler(self.backlog, clock=self.clock, interval=30, **kwargs)
+
+    def test_invalid_range(self, _):
+        with self.assertRaises(ValueError):
+            self.make_autoscaler(min_children=4, max_children=2)
+
+    def test_grow_with_backlog(self, _):
+        autoscaler = self.make_autoscaler(min_children=1, max_children=10)
+        self.assertEqual(autoscaler.nb_children(1), 1)
+
+        self.backlog.value = 3
+        # Not checked again before the interval
+        self.assertEqual(autoscaler.nb_children(1), 1)
+        self.clock.now += 30
+        self.assertEqual(autoscaler.nb_children(1), 4)
+        self.clock.now += 30
+        self.backlog.value = 50
+        self.assertEqual(autoscaler.nb_children(4), 10)
+
+    def test_no_growth_without_headroom(self, has_headroom):
+        has_headroom.return_value = False
+        autoscaler = self.make_autoscaler(min_children=1, max_children=10)
+        self.backlog.value = 3
+        self.assertEqual(autoscaler.nb_children(2), 2)
+
+    def test_shrink_after_idle_checks(self, _):
+        autoscaler = self.make_autoscaler(min_children=1, max_children=10, scale_down_after=3)
+        results = []
+        for _ in range(7):
+            results.append(autoscaler.nb_children(3))
+            self.clock.now += 30
+        self.assertEqual(results, [3, 3, 2, 3, 3, 2, 3])
+
+        autoscaler = self.make_autoscaler(min_children=2, max_children=10, scale_down_after=1)
+        self.assertEqual(autoscaler.nb_children(2), 2)
+
+    def test_backlog_error(self, _):
+        autoscaler = self.make_autoscaler(min_children=2, max_children=10)
+        self.backlog.value = RuntimeError('throttled')
+        self.assertEqual(autoscaler.nb_children(3), 3)
+        self.assertEqual(autoscaler.nb_children(1), 3)
+
+
+class TestSupervisorAutoscaling(unittest.TestCase):
+    def test_scale_down(self):
+        autoscaler = MagicMock(min_children=1)
+        supervisor = Supervisor(payload, autoscaler=autoscaler)
+        self.assertEqual(supervisor._nb_children, 1)
+
+        processes = {pid: MagicMock(pid=pid) for pid in (101, 102, 103)}
+        supervisor._processes = dict(processes)
+        autoscaler.nb_children.return_value = 1
+        supervisor._autoscale()
+        self.assertEqual(supervisor._scaled_down, {102, 103})
+        self.assertEqual(processes[101].terminate.call_count, 0)
+        self.assertEqual(processes[103].terminate.call_count, 1)
+
+        # Processes stopping aren't counted, nor stopped again
+        autoscaler.nb_children.return_value = 2
+        supervisor._autoscale()
+        autoscaler.nb_children.assert_called_with(1)
+        self.assertEqual(processes[103].terminate.call_count, 1)
+        with patch('multiprocessing.Process') as process:
+            process.return_value.pid = 104
+            with patch('psutil.Process'):
+                supervisor._start_worker_processes()
+        self.assertEqual(process.call_count, 1)
@@ -1,7 +1,9 @@
 import multiprocessing
 import os
+import shutil
 import signal
 import sys
+import tempfile
 import time
 
 from flaky import flaky
@@ -161,3 +163,55 @@ class TestSupervisor(IntegrationTestCase):
         os.kill(p.pid, signal.SIGTERM)
         p.join()
         expect(p.exitcode).to.equal(-15)
+
+
+def exit_3():
+    os._exit(3)
+
+
+def report_pid(directory):
+    # A file rather than a multiprocessing.Queue: a process killed right
+    # after a put() may hold the lock of the queue forever
+    open(os.path.join(directory, str(os.getpid())), 'w').close()
+    time.sleep(60)
+
+
+def wait_for_pids(directory, count, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        pids = os.listdir(directory)
+        if len(pids) >= count:
+            return [int(pid) for pid in pids]
+        time.sleep(0.01)
+    raise AssertionError('{} processes not started'.format(count))
+
+
+class TestSupervisorReaping(IntegrationTestCase):
+    def test_exit_codes_are_counted(self):
+        supervisor = Supervisor(exit_3, nb_children=2)
+        supervisor._start_worker_processes()
+        deadline = time.time() + 5
+        while supervisor._processes and time.time() < deadline:
+            supervisor._cleanup_worker_processes()
+            time.sleep(0.05)
+
+        self.assertEqual(supervisor._processes, {})
+        self.assertEqual(supervisor.exit_codes, {3: 2})
+        self.assertEqual(supervisor.nb_restarts, 2)
+
+    def test_dead_children_are_restarted_right_away(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        supervisor = Supervisor(report_pid, arguments=(directory,), nb_children=1, background=True)
+        supervisor.start()
+        first_pid, = wait_for_pids(directory, 1)
+        supervisor_process = Process(Process(first_pid).ppid())
+        try:
+            start = time.time()
+            os.kill(first_pid, signal.SIGKILL)
+            pids = wait_for_pids(directory, 2)
+            self.assertLess(time.time() - start, 1)
+            self.assertEqual(len(pids), 2)
+        finally:
+            supervisor_process.terminate()
+            supervisor_process.wait(10)
@@ -0,0 +1,177 @@
+import multiprocessing
+import os
+import unittest
+
+from mock import patch
+
+import swf.models
+from simpleflow.swf.process.decider.history_cache import HistoryCache
+from simpleflow.swf.process.decider.pool import (
+    DecisionProcessPool,
+    message_to_response,
+    response_to_message,
+)
+from swf.models.history import History
+from swf.models.history.store import EventStore
+
+
+DOMAIN = swf.models.Domain('TestDomain')
+
+EVENTS = [
+    {
+        'eventId': 1,
+        'eventType': 'WorkflowExecutionStarted',
+        'eventTimestamp': 1365177769.585,
+        'workflowExecutionStartedEventAttributes': {
+            'taskList': {'name': 'test'},
+            'childPolicy': 'TERMINATE',
+            'input': '{}',
+            'workflowType': {'name': 'test-workflow', 'version': 'v1'},
+        },
+    },
+]
+
+
+def make_events(nb_events):
+    events = list(EVENTS)
+    for event_id in range(2, nb_events + 1):
+        events.append({
+            'eventId': event_id,
+            'eventType': 'DecisionTaskScheduled',
+            'eventTimestamp': 1365177769.585,
+            'decisionTaskScheduledEventAttributes': {'taskList': {'name': 'test'}},
+        })
+    return events
+
+
+class FakePoller(object):
+    domain = DOMAIN
+
+    def __init__(self, history_cache=None):
+        self.history_cache = history_cache
+
+
+def make_message(token, events=EVENTS, workflow_id='wf-1'):
+    return {
+        'token': token,
+        'events': events,
+        'known_event_id': 0,
+        'workflow_id': workflow_id,
+        'run_id': 'run-1',
+        'workflow_type': {'name': 'test-workflow', 'version': 'v1'},
+        'previous_started_event_id': None,
+        'timings': {'poll': 0.1},
+    }
+
+
+class TestDecisionProcessPool(unittest.TestCase):
+    def setUp(self):
+        results = self.results = multiprocessing.Queue()
+
+        def fake_process_decision(poller, decision_response):
+            if decision_response.token == 'fail':
+                raise ValueError('decision failed')
+            cache = poller.history_cache
+            results.put((
+                os.getpid(),
+                decision_response.token,
+                len(decision_response.history),
+                cache.hits if cache is not None else None,
+            ))
+
+        patcher = patch('simpleflow.swf.process.decider.base.process_decision', fake_process_decision)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_message_round_trip(self):
+        message = make_message('token-1')
+        response = message_to_response(DOMAIN, message)
+        self.assertIsInstance(response.history, History)
+        self.assertEqual(response.execution.workflow_type.name, 'test-workflow')
+        self.assertEqual(response_to_message(response), message)
+
+    def test_delta_message(self):
+        response = message_to_response(DOMAIN, make_message('token-1', make_events(5)))
+        message = response_to_message(response, known_event_id=3)
+        self.assertEqual([e['eventId'] for e in message['events']], [4, 5])
+
+        known_events = EventStore.from_event_list(make_events(3))
+        response = message_to_response(DOMAIN, message, known_events)
+        self.assertEqual([e.id for e in response.history], [1, 2, 3, 4, 5])
+        self.assertEqual([e['eventId'] for e in response.history.raw], [1, 2, 3, 4, 5])
+
+        with self.assertRaises(ValueError):
+            message_to_response(DOMAIN, message)
+
+    def test_recycle_after_max_decisions(self):
+        pool = DecisionProcessPool(FakePoller(), size=1, max_decisions=2)
+        try:
+            for i in range(3):
+                pool.submit(message_to_response(DOMAIN, make_message('token-{}'.format(i))))
+        finally:
+            pool.close()
+
+        results = [self.results.get(timeout=10) for _ in range(3)]
+        self.assertEqual([r[1] for r in results], ['token-0', 'token-1', 'token-2'])
+        self.assertEqual([r[2] for r in results], [1, 1, 1])
+        pids = [r[0] for r in results]
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+        self.assertNotIn(os.getpid(), pids)
+
+    def test_only_new_events_are_sent(self):
+        pool = DecisionProcessPool(FakePoller(HistoryCache(1)), size=1)
+        sent = []
+
+        def record_message(*args):
+            sent.append(response_to_message(*args))
+            return sent[-1]
+
+        with patch('simpleflow.swf.process.decider.pool.response_to_message', record_message):
+            try:
+                # wf-2 evicts wf-1 from the decision process cache
+                for token, nb_events, workflow_id in (
+                        ('token-0', 2, 'wf-1'),
+                        ('token-1', 4, 'wf-1'),
+                        ('token-2', 2, 'wf-2'),
+                        ('token-3', 6, 'wf-1'),
+                ):
+                    message = make_message(token, make_events(nb_events), workflow_id)
+                    message['previous_started_event_id'] = nb_events - 2 or None
+                    pool.submit(message_to_response(DOMAIN, message))
+            finally:
+                pool.close()
+
+        results = [self.results.get(timeout=10) for _ in range(4)]
+        self.assertEqual([r[2] for r in results], [2, 4, 2, 6])
+        self.assertEqual([r[3] for r in results], [0, 1, 1, 1])
+        self.assertEqual(
+            [(m['token'], m['known_event_id'], len(m['events'])) for m in sent],
+            [('token-0', 0, 2), ('token-1', 2, 2), ('token-2', 0, 2), ('token-3', 4, 2), ('token-3', 0, 6)],
+        )
+
+    def test_failed_decision_drops_the_cached_history(self):
+        pool = DecisionProcessPool(FakePoller(HistoryCache(1)), size=1)
+        sent = []
+
+        def record_message(*args):
+            sent.append(response_to_message(*args))
+            return sent[-1]
+
+        with patch('simpleflow.swf.process.decider.pool.response_to_message', record_message):
+            try:
+                for token, nb_events in (('token-0', 2), ('fail', 4), ('token-2', 6)):
+                    message = make_message(token, make_events(nb_events))
+                    message['previous_started_event_id'] = nb_events - 2 or None
+                    pool.submit(message_to_response(DOMAIN, message))
+            finally:
+                pool.close()
+
+        results = [self.results.get(timeout=10) for _ in range(2)]
+        self.assertEqual([r[1] for r in results], ['token-0', 'token-2'])
+        self.assertEqual(results[0][0], results[1][0])  # Still alive
+        # The events appended by the failed decision aren't trusted
+        self.assertEqual(
+            [(m['token'], m['known_event_id'], len(m['events'])) for m in sent],
+            [('token-0', 0, 2), ('fail', 2, 2), ('token-2', 4, 2), ('token-2', 0, 6)],
+        )
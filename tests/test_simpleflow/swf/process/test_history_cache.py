@@ -0,0 +1,89 @@
+import unittest
+
+import swf.models
+from simpleflow.history import History
+from simpleflow.swf.process.decider.history_cache import HistoryCache
+from swf.models.history import builder
+from swf.responses import Response
+from tests.data import (
+    BaseTestWorkflow,
+    increment,
+)
+
+
+class ATestWorkflow(BaseTestWorkflow):
+    pass
+
+
+def make_response(history, previous_started_event_id=None):
+    execution = swf.models.WorkflowExecution(
+        domain=swf.models.Domain('TestDomain'),
+        workflow_id='wf-1',
+        run_id='run-1',
+    )
+    return Response(
+        history=swf.models.History(events=list(history.events)),
+        execution=execution,
+        previous_started_event_id=previous_started_event_id,
+    )
+
+
+class TestHistoryCache(unittest.TestCase):
+    def build_history(self):
+        history = builder.History(ATestWorkflow, input={})
+        decision_id = history.last_id
+        history.add_activity_task(
+            increment,
+            decision_id=decision_id,
+            last_state='scheduled',
+            activity_id='activity-tests.data.activities.increment-1',
+        )
+        return history
+
+    def test_incremental_parse(self):
+        history = self.build_history()
+        parsed = History(swf.models.History(events=list(history.events)))
+        parsed.parse()
+        self.assertEqual(parsed.last_event_id, len(history.events))
+        activity = parsed.activities['activity-tests.data.activities.increment-1']
+        self.assertEqual(activity['state'], 'scheduled')
+
+        history.add_activity_task_started(scheduled=parsed.last_event_id)
+        parsed.extend(swf.models.History(events=list(history.events)))
+        self.assertEqual(parsed.last_event_id, len(history.events))
+        self.assertEqual(activity['state'], 'started')
+        self.assertEqual(len(parsed.tasks), 1)
+
+    def test_cache_hit(self):
+        cache = HistoryCache(2)
+        history = self.build_history()
+        first = cache.get_parsed_history(make_response(history))
+        self.assertEqual(cache.misses, 1)
+
+        last_event_id = first.last_event_id
+        history.add_activity_task_started(scheduled=last_event_id)
+        history.add_decision_task_scheduled()
+        history.add_decision_task_started()
+        second = cache.get_parsed_history(make_response(history, last_event_id))
+        self.assertIs(second, first)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(second.last_event_id, len(history.events))
+        self.assertEqual(len(cache), 1)
+
+    def test_cache_miss_on_unknown_previous_event(self):
+        cache = HistoryCache(2)
+        history = self.build_history()
+        first = cache.get_parsed_history(make_response(history))
+        second = cache.get_parsed_history(make_response(history, first.last_event_id - 1))
+        self.assertIsNot(second, first)
+        self.assertEqual(cache.misses, 2)
+
+    def test_lru_eviction(self):
+        cache = HistoryCache(1)
+        history = History(builder.History(ATestWorkflow, input={}))
+        history.parse()
+        cache.put('wf-1', 'run-1', history)
+        cache.put('wf-2', 'run-2', history)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.pop('wf-1', 'run-1', history.last_event_id))
+        self.assertIs(cache.pop('wf-2', 'run-2', history.last_event_id), history)
@@ -0,0 +1,100 @@
+import shutil
+import tempfile
+import time
+import unittest
+
+import boto.swf
+from moto.swf import swf_backend
+
+import swf.core
+from simpleflow import activity
+from simpleflow.swf.process.decider.registration import (
+    KnownTypes,
+    get_activity_types,
+    get_scope,
+    get_workflow_types,
+    register_types,
+)
+from swf.models import Domain
+from tests.data import BaseTestWorkflow
+from tests.moto_compat import mock_swf
+
+
+@activity.with_attributes(version='test-registration')
+def registered_activity():
+    pass
+
+
+class ATestWorkflow(BaseTestWorkflow):
+    pass
+
+
+@mock_swf
+class TestRegisterTypes(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.conn = boto.swf.connect_to_region('us-east-1')
+        self.conn.register_domain('TestDomain', '50')
+        self.domain = Domain('TestDomain')
+
+    def tearDown(self):
+        swf.core.CONNECTIONS.clear()
+        swf_backend.reset()
+        shutil.rmtree(self.cache_dir)
+
+    def test_get_types(self):
+        self.assertIn(
+            ('tests.test_simpleflow.swf.process.test_registration.registered_activity', 'test-registration'),
+            get_activity_types(),
+        )
+        self.assertEqual(get_workflow_types([ATestWorkflow]), [
+            ('tests.data.workflows.BaseTestWorkflow', 'test_version'),
+            ('tests.test_simpleflow.swf.process.test_registration.ATestWorkflow', 'test_version'),
+        ])
+
+    def test_register_types(self):
+        nb_types = register_types(self.domain, [ATestWorkflow], KnownTypes(self.cache_dir))
+        self.assertEqual(nb_types, len(get_activity_types()) + 2)
+
+        self.conn.describe_activity_type(
+            'TestDomain',
+            'tests.test_simpleflow.swf.process.test_registration.registered_activity',
+            'test-registration',
+        )
+        self.conn.describe_workflow_type(
+            'TestDomain',
+            'tests.test_simpleflow.swf.process.test_registration.ATestWorkflow',
+            'test_version',
+        )
+
+        # Known types are skipped, even by another process
+        self.assertEqual(register_types(self.domain, [ATestWorkflow], KnownTypes(self.cache_dir)), 0)
+
+    def test_existing_types_are_known(self):
+        self.conn.register_workflow_type(
+            'TestDomain',
+            'tests.data.workflows.BaseTestWorkflow',
+            'test_version',
+        )
+        known_types = KnownTypes(self.cache_dir)
+        register_types(self.domain, [ATestWorkflow], known_types)
+        self.assertIn(('TestDomain', 'workflow', 'tests.data.workflows.BaseTestWorkflow', 'test_version'), known_types)
+
+    def test_known_types_are_scoped(self):
+        type_ = ('TestDomain', 'workflow', 'tests.data.workflows.BaseTestWorkflow', 'test_version')
+        known_types = KnownTypes(self.cache_dir, scope=get_scope(self.domain))
+        known_types.add(type_)
+        self.assertIn(type_, KnownTypes(self.cache_dir, scope=get_scope(self.domain)))
+
+        other_region = Domain('TestDomain', region='eu-west-1')
+        self.assertNotEqual(get_scope(other_region), get_scope(self.domain))
+        self.assertNotIn(type_, KnownTypes(self.cache_dir, scope=get_scope(other_region)))
+        self.assertNotIn(type_, KnownTypes(self.cache_dir, scope='us-east-1/other-account'))
+
+    def test_known_types_expire(self):
+        type_ = ('TestDomain', 'workflow', 'tests.data.workflows.BaseTestWorkflow', 'test_version')
+        known_types = KnownTypes(self.cache_dir, expire=0.1)
+        known_types.add(type_)
+        self.assertIn(type_, known_types)
+        time.sleep(0.2)
+        self.assertNotIn(type_, known_types)
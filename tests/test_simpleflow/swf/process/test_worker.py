@@ -1,16 +1,96 @@
 from __future__ import absolute_import
 
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
 import unittest
 from collections import namedtuple
 
-from mock import patch
+import boto.swf
+from mock import MagicMock, patch
+from moto.swf import swf_backend
+from six.moves import queue
 
-from simpleflow.swf.process.worker.base import ActivityPoller, ActivityWorker
+import swf.core
+
+from simpleflow import activity, logging_context
+from simpleflow.swf.process.worker.base import ActivityPoller, ActivityWorker, Worker
+from simpleflow.swf.process.worker.heartbeat import start_heartbeat_service, stop_heartbeat_service
 from swf.models import ActivityTask, Domain
+from swf.responses import Response
 from tests.moto_compat import mock_swf
 
 FakeActivityType = namedtuple("FakeActivityType", ["name"])
 
+RESOURCES = []
+
+
+def setup_resources():
+    RESOURCES.append('model')
+
+
+@activity.with_attributes()
+def get_process_state():
+    return [os.getpid(), len(RESOURCES)]
+
+
+PEERS = None
+RUNNING = []
+
+
+@activity.with_attributes()
+def wait_for_peer():
+    return PEERS.wait(timeout=5)
+
+
+@activity.with_attributes()
+def context_after_peer():
+    PEERS.wait(timeout=5)
+    return [context_after_peer.context['activity_id'], logging_context.get('activity_id')]
+
+
+@activity.with_attributes(max_concurrency=1)
+def one_at_a_time():
+    RUNNING.append(None)
+    nb_running = len(RUNNING)
+    time.sleep(0.2)
+    RUNNING.pop()
+    return nb_running
+
+
+@activity.with_attributes()
+def sleep(delay):
+    time.sleep(delay)
+
+
+@activity.with_attributes()
+def sleep_async(delay):
+    import asyncio
+    return asyncio.sleep(delay, result='slept')
+
+
+def make_response(token, activity_name='get_process_state', args=()):
+    raw_response = {
+        'taskToken': token,
+        'activityId': 'activity-{}'.format(token),
+        'startedEventId': 3,
+        'activityType': {
+            'name': 'tests.test_simpleflow.swf.process.test_worker.' + activity_name,
+            'version': 'default',
+        },
+        'workflowExecution': {'workflowId': 'wf-1', 'runId': 'run-1'},
+        'input': json.dumps({'args': list(args), 'kwargs': {}}),
+    }
+    domain = Domain('test-domain')
+    return Response(
+        task_token=token,
+        activity_task=ActivityTask.from_poll(domain, 'task-list', raw_response),
+        raw_response=raw_response,
+    )
+
 
 @mock_swf
 class TestActivityWorker(unittest.TestCase):
@@ -32,6 +112,179 @@ class TestActivityWorker(unittest.TestCase):
         self.assertEqual(mock.call_args[0], ("token", task))
         self.assertIn("No module named ", mock.call_args[1]["reason"])
 
+    def test_count_pending(self):
+        conn = boto.swf.connect_to_region('us-east-1')
+        conn.register_domain('test-domain', '50')
+        poller = ActivityPoller(Domain('test-domain'), 'task-list')
+        try:
+            self.assertEqual(poller.count_pending(), 0)
+        finally:
+            swf.core.CONNECTIONS.clear()
+            swf_backend.reset()
+
+
+class TestLongLivedActivityProcess(unittest.TestCase):
+    def setUp(self):
+        results = self.results = multiprocessing.Queue()
+
+        def complete_with_retry(poller, token, result=None):
+            results.put((token, result))
+
+        patcher = patch.object(ActivityPoller, 'complete_with_retry', complete_with_retry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tasks_share_processes(self):
+        poller = ActivityPoller(
+            Domain('test-domain'),
+            'task-list',
+            reuse_processes=True,
+            max_tasks_per_process=2,
+            process_setup=[setup_resources],
+        )
+        try:
+            for i in range(3):
+                poller.process(make_response('token-{}'.format(i)))
+        finally:
+            poller._activity_process.stop()
+
+        results = [self.results.get(timeout=10) for _ in range(3)]
+        self.assertEqual([r[0] for r in results], ['token-0', 'token-1', 'token-2'])
+        pids = [r[1][0] for r in results]
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+        self.assertNotIn(os.getpid(), pids)
+        # Setup hooks run once per process
+        self.assertEqual([r[1][1] for r in results], [1, 1, 1])
+        self.assertEqual(RESOURCES, [])
+
+    def test_process_death_fails_task(self):
+        poller = ActivityPoller(Domain('test-domain'), 'task-list', reuse_processes=True)
+        with patch.object(ActivityWorker, 'process', lambda *args: os._exit(3)), \
+                patch.object(poller, 'fail_with_retry') as fail:
+            poller.process(make_response('token-0'))
+
+        self.assertEqual(fail.call_count, 1)
+        self.assertIn('exit code 3', fail.call_args[1]['reason'])
+        self.assertTrue(poller._activity_process.retired)
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'asyncio is required')
+class TestConcurrentActivities(unittest.TestCase):
+    def setUp(self):
+        global PEERS
+        PEERS = threading.Barrier(2)
+        results = self.results = queue.Queue()
+
+        def complete_with_retry(poller, token, result=None):
+            results.put((token, result))
+
+        patcher = patch.object(ActivityPoller, 'complete_with_retry', complete_with_retry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_tasks(self, poller, responses):
+        try:
+            for response in responses:
+                poller.process(response)
+        finally:
+            poller.stop_executors()
+        return sorted(self.results.get(timeout=1) for _ in responses)
+
+    def test_tasks_run_concurrently(self):
+        poller = ActivityPoller(Domain('test-domain'), 'task-list', heartbeat=0, concurrency=2)
+        results = self.run_tasks(poller, [
+            make_response('token-{}'.format(i), 'wait_for_peer') for i in range(2)
+        ])
+        # Both tasks waited for each other
+        self.assertEqual(sorted(result for _, result in results), [0, 1])
+
+    def test_tasks_keep_their_context(self):
+        poller = ActivityPoller(Domain('test-domain'), 'task-list', heartbeat=0, concurrency=2)
+        results = self.run_tasks(poller, [
+            make_response('token-{}'.format(i), 'context_after_peer') for i in range(2)
+        ])
+        self.assertEqual(results, [
+            ('token-0', ['activity-token-0', 'activity-token-0']),
+            ('token-1', ['activity-token-1', 'activity-token-1']),
+        ])
+
+    def test_concurrency_excludes_reused_processes(self):
+        with self.assertRaises(ValueError):
+            ActivityPoller(Domain('test-domain'), 'task-list', concurrency=2, reuse_processes=True)
+
+    def test_max_concurrency(self):
+        poller = ActivityPoller(Domain('test-domain'), 'task-list', heartbeat=0, concurrency=3)
+        results = self.run_tasks(poller, [
+            make_response('token-{}'.format(i), 'one_at_a_time') for i in range(3)
+        ])
+        self.assertEqual([result for _, result in results], [1, 1, 1])
+
+    def test_async_activities(self):
+        poller = ActivityPoller(Domain('test-domain'), 'task-list', heartbeat=0, concurrency=3)
+        start = time.time()
+        results = self.run_tasks(poller, [
+            make_response('token-{}'.format(i), 'sleep_async', args=[0.5]) for i in range(3)
+        ])
+        self.assertLess(time.time() - start, 1.4)
+        self.assertEqual(results, [('token-0', 'slept'), ('token-1', 'slept'), ('token-2', 'slept')])
+
+    def test_cancelled_async_activity(self):
+        poller = ActivityPoller(Domain('test-domain'), 'task-list', heartbeat=1, concurrency=2)
+        poller.fail_with_retry = MagicMock()
+        with patch.object(ActivityPoller, 'heartbeat', return_value={'cancelRequested': True}) as heartbeat:
+            start = time.time()
+            poller.process(make_response('token-0', 'sleep_async', args=[60]))
+            poller.stop_executors()
+
+        self.assertLess(time.time() - start, 10)
+        heartbeat.assert_called_with('token-0')
+        self.assertEqual(poller.fail_with_retry.call_count, 1)
+        self.assertIn('cancelled', poller.fail_with_retry.call_args[1]['reason'])
+
+
+class TestHeartbeatService(unittest.TestCase):
+    def test_cancelled_task_is_reaped(self):
+        poller = ActivityPoller(Domain('test-domain'), 'task-list', heartbeat=1)
+        with patch.object(ActivityPoller, 'heartbeat', return_value={'cancelRequested': True}):
+            process, client = start_heartbeat_service(poller.heartbeat, rate=10)
+        poller.heartbeat_client = client
+        poller.fail_with_retry = MagicMock()
+        try:
+            with patch.object(ActivityPoller, 'heartbeat') as heartbeat:
+                start = time.time()
+                poller.process(make_response('token-0', 'sleep', args=[60]))
+        finally:
+            stop_heartbeat_service(process, client)
+
+        self.assertLess(time.time() - start, 10)
+        # Heartbeats are only sent by the service
+        self.assertEqual(heartbeat.call_count, 0)
+        self.assertEqual(poller.fail_with_retry.call_count, 0)
+        self.assertFalse(os.path.exists(client.address))
+
 
 if __name__ == '__main__':
     unittest.main()
+
+
+class TestWorkerHeartbeatService(unittest.TestCase):
+    def test_dead_service_is_restarted(self):
+        poller = ActivityPoller(Domain('test-domain'), 'task-list', heartbeat=60)
+        poller.heartbeat_client = MagicMock(address='/tmp/heartbeat.sock')
+        worker = Worker(poller, nb_children=1, heartbeat_rate=10)
+        dead = multiprocessing.Process(target=os._exit, args=(1,))
+        dead.start()
+        dead.join()
+        worker._heartbeat_service = dead
+
+        restarted = MagicMock()
+        path = 'simpleflow.swf.process.worker.base.start_heartbeat_service'
+        with patch(path, return_value=(restarted, None)) as start:
+            worker._check_services()
+            self.assertEqual(start.call_args[1], {'address': '/tmp/heartbeat.sock'})
+            self.assertIs(worker._heartbeat_service, restarted)
+
+            restarted.is_alive.return_value = True
+            worker._check_services()
+            self.assertEqual(start.call_count, 1)
@@ -1,9 +1,10 @@
+import json
 import mock
 import unittest
 
 from sure import expect
 
-from simpleflow import activity, format, futures
+from simpleflow import activity, format, futures, settings
 from simpleflow.swf.executor import Executor
 from swf.models.history import builder
 from swf.responses import Response
@@ -125,6 +126,27 @@ class TestCaseNotNeedingDomain(unittest.TestCase):
         expect(details).to.be.none
 
 
+    def test_prefetch_jumbo_fields(self):
+        history = builder.History(ExampleWorkflow, input={})
+        history.add_activity_task(print_me_n_times, decision_id=1, activity_id='activity-1', result='x')
+        raw_events = {event['eventType']: event for event in history.events.raw}
+        raw_events['ActivityTaskScheduled']['activityTaskScheduledEventAttributes']['input'] = (
+            'simpleflow+s3://jumbo-bucket/input 50000'
+        )
+        raw_events['ActivityTaskCompleted']['activityTaskCompletedEventAttributes']['result'] = (
+            'simpleflow+s3://jumbo-bucket/result 50000'
+        )
+
+        executor = Executor(DOMAIN, ExampleWorkflow)
+        with mock.patch.object(format, 'prefetch_jumbo_fields') as prefetch:
+            executor.prefetch_jumbo_fields(history)
+        # Not the inputs of the scheduled tasks
+        prefetch.assert_called_once_with(
+            ['simpleflow+s3://jumbo-bucket/result 50000'],
+            max_size=format.JUMBO_FIELDS_CACHE.memory_size,
+        )
+
+
 @activity.with_attributes(raises_on_failure=True)
 def print_me_n_times(s, n, raises=False):
     if raises:
@@ -142,7 +164,53 @@ class ExampleJumboWorkflow(BaseTestWorkflow):
         return a.result
 
 
+class ExampleJumboChainWorkflow(BaseTestWorkflow):
+    """
+    Pass the jumbo result of a task to another one.
+    """
+    def run(self, s, n):
+        a = self.submit(print_me_n_times, s, n)
+        futures.wait(a)
+        b = self.submit(print_me_n_times, a.result, 1)
+        futures.wait(b)
+        return b.result
+
+
+class ExampleChainWorkflow(BaseTestWorkflow):
+    def run(self):
+        a = self.submit(print_me_n_times, "abc", 2)
+        futures.wait(a)
+        b = self.submit(print_me_n_times, a, 1)
+        futures.wait(b)
+
+
+class TestSimpleflowSwfExecutorPassThrough(MockSWFTestCase):
+    def test_unread_results_are_passed_as_is(self):
+        self.register_activity_type(
+            "tests.test_simpleflow.swf.test_executor.print_me_n_times",
+            "default"
+        )
+        self.start_workflow_execution()
+        result = self.build_decisions(ExampleChainWorkflow)
+        self.take_decisions(result.decisions, result.execution_context)
+        self.process_activity_task()
+
+        with mock.patch.object(format.FieldLoader, "__call__") as decode_result:
+            decisions = self.build_decisions(ExampleChainWorkflow).decisions
+        expect(decode_result.call_count).to.equal(0)
+        expect(decisions).to.have.length_of(1)
+        attributes = decisions[0]["scheduleActivityTaskDecisionAttributes"]
+        expect(json.loads(attributes["input"])).to.equal({"args": ["abcabc", 1], "kwargs": {}})
+
+
 class TestSimpleflowSwfExecutorWithJumboFields(MockSWFTestCase):
+    def setUp(self):
+        super(TestSimpleflowSwfExecutorWithJumboFields, self).setUp()
+        # The repeated strings below would fit in SWF once compressed
+        patcher = mock.patch.object(settings, "SIMPLEFLOW_COMPRESS_FIELDS", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @mock.patch.dict("os.environ", {"SIMPLEFLOW_JUMBO_FIELDS_BUCKET": "jumbo-bucket"})
     def test_jumbo_fields_are_replaced_correctly(self):
         # prepare
@@ -171,6 +239,40 @@ class TestSimpleflowSwfExecutorWithJumboFields(MockSWFTestCase):
 
         expect(result).to.match(r"^simpleflow\+s3://jumbo-bucket/[a-z0-9-]+ 90002$")
 
+    @mock.patch.dict("os.environ", {"SIMPLEFLOW_JUMBO_FIELDS_BUCKET": "jumbo-bucket"})
+    @mock.patch.object(settings, "SIMPLEFLOW_JUMBO_FIELDS_BY_REFERENCE", True)
+    def test_jumbo_fields_are_passed_by_reference(self):
+        self.register_activity_type(
+            "tests.test_simpleflow.swf.test_executor.print_me_n_times",
+            "default"
+        )
+        self.start_workflow_execution(input='{"args": ["012345679", 10000]}')
+        result = self.build_decisions(ExampleJumboChainWorkflow)
+        self.take_decisions(result.decisions, result.execution_context)
+        self.process_activity_task()
+        events = self.get_workflow_execution_history()["events"]
+        signature = events[-2]["activityTaskCompletedEventAttributes"]["result"]
+
+        # the decider doesn't pull the result to schedule the next task
+        format.JUMBO_FIELDS_CACHE.clear()
+        pulls = format.JUMBO_FIELDS_PULLS
+        with mock.patch.object(format, "prefetch_jumbo_fields"):
+            result = self.build_decisions(ExampleJumboChainWorkflow)
+        expect(format.JUMBO_FIELDS_PULLS).to.equal(pulls)
+        decision = result.decisions[0]
+        assert decision["decisionType"] == "ScheduleActivityTask"
+        expect(json.loads(decision["scheduleActivityTaskDecisionAttributes"]["input"])).to.equal({
+            "args": [{"__simpleflow_jumbo_field__": signature}, 1],
+            "kwargs": {},
+        })
+        self.take_decisions(result.decisions, result.execution_context)
+
+        # the worker does
+        self.process_activity_task()
+        events = self.get_workflow_execution_history()["events"]
+        result = events[-2]["activityTaskCompletedEventAttributes"]["result"]
+        expect(format.decode(result, use_proxy=False)).to.equal("012345679" * 10000)
+
     @mock.patch.dict("os.environ", {"SIMPLEFLOW_JUMBO_FIELDS_BUCKET": "jumbo-bucket"})
     def test_jumbo_fields_in_task_failed_is_decoded(self):
         # prepare execution
@@ -204,8 +306,15 @@ class TestSimpleflowSwfExecutorWithJumboFields(MockSWFTestCase):
         expect(details["error"]).to.equal("ValueError")
         expect(len(details["message"])).to.be.greater_than(9*10000)
 
-        # decide again (should lead to workflow failure)
-        result = self.build_decisions(ExampleJumboWorkflow)
+        # decide again (should lead to workflow failure), after prefetching
+        # the jumbo fields
+        format.JUMBO_FIELDS_CACHE.clear()
+        pulls = format.JUMBO_FIELDS_PULLS
+        with mock.patch.object(format, "prefetch_jumbo_fields", wraps=format.prefetch_jumbo_fields) as prefetch:
+            result = self.build_decisions(ExampleJumboWorkflow)
+        prefetch.assert_called_once()
+        expect(sorted(prefetch.call_args[0][0])).to.equal(sorted([attrs["reason"], attrs["details"]]))
+        expect(format.JUMBO_FIELDS_PULLS - pulls).to.equal(2)
         assert len(result.decisions) == 1
         assert result.decisions[0]["decisionType"] == "FailWorkflowExecution"
         self.take_decisions(result.decisions, result.execution_context)
@@ -226,3 +335,36 @@ class TestSimpleflowSwfExecutorWithJumboFields(MockSWFTestCase):
             r'^Workflow execution error in activity-tests.test_simpleflow.swf.'
             r'test_executor.print_me_n_times: "ValueError: Number: 012345679\d+"$'
         )
+
+
+class TestSimpleflowSwfExecutorWithCompressedFields(MockSWFTestCase):
+    def setUp(self):
+        super(TestSimpleflowSwfExecutorWithCompressedFields, self).setUp()
+        patcher = mock.patch.object(settings, "SIMPLEFLOW_COMPRESS_FIELDS", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_compressed_fields_are_decoded(self):
+        self.register_activity_type(
+            "tests.test_simpleflow.swf.test_executor.print_me_n_times",
+            "default"
+        )
+        self.start_workflow_execution(input='{"args": ["012345679", 10000]}')
+
+        result = self.build_decisions(ExampleJumboWorkflow)
+        self.take_decisions(result.decisions, result.execution_context)
+        self.process_activity_task()
+
+        events = self.get_workflow_execution_history()["events"]
+        result = events[-2]["activityTaskCompletedEventAttributes"]["result"]
+        expect(result).to.match(r"^simpleflow\+zlib:")
+
+        # The decider gets the result back
+        result = self.build_decisions(ExampleJumboWorkflow)
+        assert len(result.decisions) == 1
+        assert result.decisions[0]["decisionType"] == "CompleteWorkflowExecution"
+        self.take_decisions(result.decisions, result.execution_context)
+
+        events = self.get_workflow_execution_history()["events"]
+        result = events[-1]["workflowExecutionCompletedEventAttributes"]["result"]
+        expect(format.decode(result)).to.equal("012345679" * 10000)
@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+import unittest
+
+from mock import patch
+
+import swf.models
+from simpleflow.swf import metrics
+from simpleflow.swf.metrics import DecisionMetrics, FileSink, log_sink, parse_sinks
+from swf.models.history import builder
+from swf.responses import Response
+from tests.data import BaseTestWorkflow
+
+
+class ATestWorkflow(BaseTestWorkflow):
+    pass
+
+
+def make_response():
+    history = builder.History(ATestWorkflow, input={})
+    domain = swf.models.Domain('TestDomain')
+    execution = swf.models.WorkflowExecution(
+        domain=domain,
+        workflow_id='wf-1',
+        run_id='run-1',
+        workflow_type=swf.models.WorkflowType(domain, 'test-workflow', 'v1'),
+    )
+    return Response(
+        history=history,
+        execution=execution,
+        timings={'poll': 0.5},
+    )
+
+
+class TestDecisionMetrics(unittest.TestCase):
+    def test_from_response(self):
+        decision_metrics = DecisionMetrics.from_response(make_response())
+        with decision_metrics.timer('replay'):
+            pass
+        with decision_metrics.timer('replay'):
+            pass
+        decision_metrics.incr('decisions', 2)
+        data = decision_metrics.as_dict()
+        self.assertEqual(data['tags'], {'workflow_name': 'test-workflow', 'workflow_id': 'wf-1', 'run_id': 'run-1'})
+        self.assertEqual(list(data['timings']), ['poll', 'replay'])
+        self.assertEqual(data['counters'], {'events': 3, 'decisions': 2})
+
+    def test_parse_sinks(self):
+        sinks = parse_sinks('log, file:/tmp/metrics.jsonl')
+        self.assertIs(sinks[0], log_sink)
+        self.assertEqual(sinks[1].path, '/tmp/metrics.jsonl')
+        self.assertEqual(parse_sinks(None), [])
+        with self.assertRaises(ValueError):
+            parse_sinks('statsd')
+
+    def test_emit(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        received = []
+        with patch.object(metrics, '_hooks', [FileSink(path), received.append, lambda data: 1 / 0]):
+            metrics.emit(DecisionMetrics.from_response(make_response()))
+            metrics.emit(DecisionMetrics('other'))
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+        os.unlink(path)
+        self.assertEqual([line['tags']['workflow_name'] for line in lines], ['test-workflow', 'other'])
+        self.assertEqual(len(received), 2)
@@ -0,0 +1,53 @@
+import json
+import unittest
+
+import swf.models.decision
+from simpleflow.swf.utils import DecisionsAndContext
+
+
+def make_decision(timer_id, control=None):
+    decision = swf.models.decision.TimerDecision(
+        'start',
+        id=timer_id,
+        start_to_fire_timeout='0',
+        control=control,
+    )
+    return decision
+
+
+class TestDecisionsAndContext(unittest.TestCase):
+    def test_decisions_size_matches_json_dumps(self):
+        dc = DecisionsAndContext()
+        self.assertEqual(dc.decisions_size(), len(json.dumps([])))
+
+        decisions = []
+        for i in range(5):
+            new = [make_decision('timer-{}'.format(i), control={'i': i, 'data': 'x' * i})]
+            self.assertEqual(dc.decisions_size(new), len(json.dumps(decisions + new)))
+            dc.extend_decision(new)
+            decisions += new
+            self.assertEqual(dc.decisions_size(), len(json.dumps(decisions)))
+
+        extra = [make_decision('extra-1'), make_decision('extra-2')]
+        self.assertEqual(dc.decisions_size(extra), len(json.dumps(decisions + extra)))
+
+    def test_decisions_size_after_replacing_decisions(self):
+        dc = DecisionsAndContext([make_decision('timer-1'), make_decision('timer-2')])
+        dc.decisions_size()
+        dc.decisions = [make_decision('timer-3')]
+        self.assertEqual(dc.decisions_size(), len(json.dumps(dc.decisions)))
+
+    def test_decisions_size_after_changing_decisions(self):
+        dc = DecisionsAndContext([make_decision('timer-1'), make_decision('timer-2')])
+        dc.decisions_size()
+
+        # Replaced by a longer decision
+        dc.decisions[0] = make_decision('timer-1', control={'data': 'x' * 100})
+        self.assertEqual(dc.decisions_size(), len(json.dumps(dc.decisions)))
+
+        # Changed in place
+        dc.decisions[1]['startTimerDecisionAttributes']['timerId'] = 'timer-2' * 10
+        self.assertEqual(dc.decisions_size(), len(json.dumps(dc.decisions)))
+
+        dc.decisions.insert(0, make_decision('timer-0'))
+        self.assertEqual(dc.decisions_size(), len(json.dumps(dc.decisions)))
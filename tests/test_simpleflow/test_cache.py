@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from simpleflow.cache import TieredCache
+
+
+class TestTieredCache(unittest.TestCase):
+    def make_directory(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        return directory
+
+    def test_memory_tier_is_bounded(self):
+        cache = TieredCache(10)
+        cache.set('a', 'aaaa')
+        cache.set('b', 'bbbb')
+        self.assertEqual(cache.get('a'), 'aaaa')  # "b" is now the least recently used
+        cache.set('c', 'cccc')
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 'aaaa')
+        self.assertEqual(cache.get('c'), 'cccc')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (3, 1, 1))
+
+        # Too large for the memory tier
+        cache.set('d', 'd' * 11)
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(len(cache), 2)
+
+    def test_replace(self):
+        cache = TieredCache(10)
+        cache.set('a', 'aaaa')
+        cache.set('a', 'aaaaaaaa')
+        cache.set('b', 'bb')
+        self.assertEqual(cache.get('a'), 'aaaaaaaa')
+        self.assertEqual(cache.evictions, 0)
+
+    def test_disk_tier(self):
+        directory = self.make_directory()
+        cache = TieredCache(10, directory=directory)
+        cache.set('a', 'a' * 20)
+        cache.set('b', 'bbbb')
+        cache.clear()
+
+        self.assertEqual(cache.get('a'), 'a' * 20)
+        self.assertEqual(cache.get('b'), 'bbbb')
+        self.assertEqual(cache.get('b'), 'bbbb')
+        self.assertEqual((cache.hits, cache.disk_hits, cache.misses), (1, 2, 0))
+
+        # Shared by the processes of the host
+        other = TieredCache(10, directory=directory)
+        self.assertEqual(other.get('b'), 'bbbb')
+
+    def test_disk_tier_is_reopened_after_fork(self):
+        cache = TieredCache(10, directory=self.make_directory())
+        cache.set('a', 'aaaa')
+        parent_disk = cache._get_disk()
+
+        pid = os.fork()
+        if pid == 0:
+            cache.clear()
+            ok = cache.get('a') == 'aaaa' and cache._get_disk() is not parent_disk
+            cache.set('b', 'bbbb')
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        self.assertIs(cache._get_disk(), parent_disk)
+        self.assertEqual(cache.get('b'), 'bbbb')
+
+    def test_unusable_disk_tier(self):
+        path = os.path.join(self.make_directory(), 'file')
+        open(path, 'w').close()
+        cache = TieredCache(10, directory=path)
+        cache.set('a', 'aaaa')
+        cache.clear()
+        self.assertIsNone(cache.get('a'))
@@ -6,16 +6,19 @@ import sys
 import tempfile
 import os.path
 import platform
+import re
 import threading
 
+import boto
 import psutil
 import pytest
 import time
 
 import subprocess
 
-from simpleflow import execute
+from simpleflow import execute, format
 from simpleflow.exceptions import ExecutionError, ExecutionTimeoutError
+from tests.moto_compat import mock_s3
 
 
 @execute.program(path='ls')
@@ -335,3 +338,187 @@ def test_large_command_line_utf8():
     """
     x = u"ä" * 1024 * 1024
     assert length(x.encode('utf-8')) == len(x)
+
+
+def get_pids():
+    return [os.getpid(), os.getppid()]
+
+
+def get_environ(name):
+    return os.environ.get(name)
+
+
+def test_forkserver():
+    func = execute.python(forkserver=True)(get_pids)
+    first, second = func(), func()
+    # A child of the same warm interpreter for each call
+    assert first[0] != second[0]
+    assert first[1] == second[1]
+    assert first[1] != os.getpid()
+
+
+def test_forkserver_environment():
+    os.environ['SIMPLEFLOW_TEST_FORKSERVER'] = 'value'
+    try:
+        assert execute.python(forkserver=True)(get_environ)('SIMPLEFLOW_TEST_FORKSERVER') == 'value'
+    finally:
+        del os.environ['SIMPLEFLOW_TEST_FORKSERVER']
+
+
+def test_forkserver_raises_custom_exception():
+    func = execute.python(forkserver=True)(raise_dummy_exception)
+    with pytest.raises(ExecutionError) as excinfo:
+        func()
+    assert '"error":"DummyException"' in str(excinfo.value)
+
+
+def test_forkserver_timeout():
+    func = execute.python(forkserver=True, timeout=1)(sleep_and_return)
+    with pytest.raises(ExecutionTimeoutError) as e:
+        func(10)
+    assert 'ExecutionTimeoutError after 1 seconds' in str(e.value)
+    assert func(0.25) == 0.25
+
+
+def test_forkserver_kill_children():
+    pid = execute.python(forkserver=True, kill_children=True)(create_sleeper_subprocess)()
+    with pytest.raises(psutil.NoSuchProcess):
+        psutil.Process(pid)
+
+
+def test_forkserver_disabled(monkeypatch):
+    monkeypatch.setattr(execute.ForkServer, 'enabled', False)
+    assert execute.ForkServer.get('python') is None
+    # Run by a new interpreter
+    assert execute.python(forkserver=True)(get_pids)()[1] == os.getpid()
+
+
+def test_forkserver_start_timeout(monkeypatch, tmpdir):
+    monkeypatch.setattr(execute, 'FORK_SERVER_START_TIMEOUT', 0.5)
+    interpreter = tmpdir.join('stuck')
+    interpreter.write('#!/bin/sh\nexec sleep 60\n')
+    interpreter.chmod(0o755)
+    server = execute.ForkServer(str(interpreter))
+    rc, _, error = server.call('get_pids', '{}', {}, __name__, timeout=10)
+    assert rc == -1
+    assert b'did not start the call' in error
+    assert server.process.poll() is not None
+
+
+def test_forkserver_large_command_line():
+    x = u"ä" * 1024 * 1024
+    assert execute.python(forkserver=True)(length)(x) == len(x)
+
+
+def is_gone(pid, timeout=2):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if psutil.Process(pid).status() == psutil.STATUS_ZOMBIE:
+                return True
+        except psutil.NoSuchProcess:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_supervise_subprocess():
+    process = subprocess.Popen(['sleep', '0.1'])
+    t = time.time()
+    rc, rusage = execute.supervise_subprocess(process, timeout=10)
+    # No polling delay
+    assert time.time() - t < 0.8
+    assert rc == 0
+    assert process.returncode == 0
+    assert rusage.max_rss > 0
+    assert execute.last_rusage() == rusage
+
+
+def test_supervise_subprocess_kills_process_group():
+    # The shell ignores SIGTERM, and starts a child in its group
+    process = subprocess.Popen(
+        ['sh', '-c', 'trap "" TERM; sleep 60 & echo $!; wait'],
+        stdout=subprocess.PIPE,
+        start_new_session=True,
+    )
+    child_pid = int(process.stdout.readline())
+    t = time.time()
+    with pytest.raises(ExecutionTimeoutError) as e:
+        execute.supervise_subprocess(process, timeout=0.5, kill_timeout=0.5)
+    assert time.time() - t < 3
+    assert process.returncode == -9
+    assert e.value.rusage is not None
+    assert is_gone(child_pid)
+    process.stdout.close()
+
+
+@execute.program(path='sleep', timeout=0.5)
+def sleep_program(seconds):
+    pass
+
+
+def test_execute_program_timeout():
+    with pytest.raises(ExecutionTimeoutError):
+        sleep_program(10)
+
+
+def test_execute_program_error_rusage():
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        ls_nokwargs('/does/not/exist')
+    assert e.value.rusage is not None
+
+
+def test_execute_rusage():
+    func = execute.python()(length)
+    func('abc')
+    assert execute.last_rusage().user_time > 0
+    with pytest.raises(ExecutionError) as e:
+        execute.python()(raise_dummy_exception)()
+    assert e.value.rusage is not None
+
+
+def test_forkserver_rusage():
+    func = execute.python(forkserver=True)(length)
+    func('abc')
+    assert execute.last_rusage() is not None
+
+
+@execute.program(path='seq', max_output=64)
+def seq(n):
+    pass
+
+
+def test_execute_program_max_output():
+    assert seq(3) == '1\n2\n3\n'
+
+    output = seq(100000)
+    head, skipped, tail = re.match(r'(.*)\n\[\.\.\. (\d+) bytes skipped \.\.\.\]\n(.*)', output, re.S).groups()
+    assert head.startswith('1\n2\n3\n')
+    assert tail.endswith('99999\n100000\n')
+    assert len(head) + len(tail) == 64
+    assert int(skipped) == len(subprocess.check_output(['seq', '100000'])) - 64
+
+
+def test_execute_program_default_max_output():
+    # About 15 MB
+    output = execute.program(path='seq')(seq)(2000000)
+    assert 'bytes skipped' in output
+    assert len(output) < execute.MAX_OUTPUT + 100
+    assert execute.program(path='seq', max_output=None)(seq)(100000) == subprocess.check_output(
+        ['seq', '100000'], universal_newlines=True,
+    )
+
+
+@mock_s3
+def test_execute_program_upload_output():
+    boto.connect_s3().create_bucket('jumbo-bucket')
+    os.environ['SIMPLEFLOW_JUMBO_FIELDS_BUCKET'] = 'jumbo-bucket'
+    try:
+        output = execute.program(path='seq', max_output=64, upload_output=True)(seq)(100000)
+    finally:
+        os.environ['SIMPLEFLOW_JUMBO_FIELDS_BUCKET'] = ''
+    location = output.split('full output: ')[1].split(' ...]')[0]
+    assert location.startswith('simpleflow+s3://jumbo-bucket/')
+    full_output = subprocess.check_output(['seq', '100000'], universal_newlines=True)
+    assert location.split()[1] == str(len(full_output))
+    assert format.decode(location, parse_json=False) == full_output
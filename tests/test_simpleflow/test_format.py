@@ -1,15 +1,26 @@
+import base64
+import hashlib
 import json
 import os
 import random
 import unittest
+import zlib
 
 import boto
+import mock
 
-from simpleflow import constants, format
+from simpleflow import constants, format, settings
 from simpleflow.storage import push_content
 from tests.moto_compat import mock_s3
 
 
+def incompressible(length):
+    """
+    A message that doesn't fit in *length* chars once compressed.
+    """
+    return base64.b64encode(os.urandom(length))[:length].decode('ascii')
+
+
 class TestFormat(unittest.TestCase):
 
     def setUp(self):
@@ -24,6 +35,15 @@ class TestFormat(unittest.TestCase):
         self.conn = boto.connect_s3()
         self.conn.create_bucket(bucket.split("/")[0])
 
+    def assert_jumbo_object(self, key, expected):
+        content = self.conn.get_bucket("jumbo-bucket").get_key(key).get_contents_as_string()
+        if not settings.SIMPLEFLOW_COMPRESS_FIELDS:
+            self.assertEqual(content.decode('utf-8'), expected)
+            return
+        prefix = constants.COMPRESSED_FIELDS_PREFIX.encode('ascii')
+        self.assertTrue(content.startswith(prefix))
+        self.assertEqual(zlib.decompress(content[len(prefix):]).decode('utf-8'), expected)
+
     @mock_s3
     def test_encode_none(self):
         self.assertEqual(
@@ -43,7 +63,7 @@ class TestFormat(unittest.TestCase):
     @mock_s3
     def test_encode_longer(self):
         MAX_LENGTH = random.randint(10, 1000)
-        message = 'A' * (MAX_LENGTH + 1)
+        message = incompressible(MAX_LENGTH + 1)
         with self.assertRaisesRegexp(ValueError, "Message too long"):
             format.encode(message, MAX_LENGTH)
 
@@ -57,7 +77,7 @@ class TestFormat(unittest.TestCase):
     @mock_s3
     def test_jumbo_fields_encoding_without_directory(self):
         self.setup_jumbo_fields("jumbo-bucket")
-        message = 'A' * 64000
+        message = incompressible(64000)
         encoded = format.result(message)
         # => simpleflow+s3://jumbo-bucket/f6ea95a<...>ea3 64002
 
@@ -65,15 +85,12 @@ class TestFormat(unittest.TestCase):
         self.assertEqual(encoded.split()[1], "64002")
 
         key = encoded.split()[0].replace("simpleflow+s3://jumbo-bucket/", "")
-        self.assertEqual(
-            self.conn.get_bucket("jumbo-bucket").get_key(key).get_contents_as_string(encoding='utf-8'),
-            json.dumps(message),
-        )
+        self.assert_jumbo_object(key, json.dumps(message))
 
     @mock_s3
     def test_jumbo_fields_encoding_with_directory(self):
         self.setup_jumbo_fields("jumbo-bucket/with/subdir")
-        message = 'A' * 64000
+        message = incompressible(64000)
         encoded = format.result(message)
         # => simpleflow+s3://jumbo-bucket/with/subdir/f6ea95a<...>ea3 64002
 
@@ -81,15 +98,12 @@ class TestFormat(unittest.TestCase):
         self.assertEqual(encoded.split()[1], "64002")
 
         key = encoded.split()[0].replace("simpleflow+s3://jumbo-bucket/", "")
-        self.assertEqual(
-            self.conn.get_bucket("jumbo-bucket").get_key(key).get_contents_as_string(encoding='utf-8'),
-            json.dumps(message),
-        )
+        self.assert_jumbo_object(key, json.dumps(message))
 
     @mock_s3
     def test_jumbo_fields_with_directory_strip_trailing_slash(self):
         self.setup_jumbo_fields("jumbo-bucket/with/subdir/")
-        message = 'A' * 64000
+        message = incompressible(64000)
         encoded = format.result(message)
 
         assert not encoded.startswith("simpleflow+s3://jumbo-bucket/with/subdir//")
@@ -99,7 +113,7 @@ class TestFormat(unittest.TestCase):
         # 'reason' field is limited to 256 chars for instance
         self.setup_jumbo_fields("jumbo-bucket/with/a/very/long/name/" + "a" * 256)
 
-        message = 'A' * 500
+        message = incompressible(500)
         with self.assertRaisesRegexp(ValueError, "Jumbo field signature is longer than"):
             format.reason(message)
 
@@ -134,3 +148,141 @@ class TestFormat(unittest.TestCase):
 
         for case in cases:
             self.assertEqual(case[1], format.decode(case[0], parse_json=False))
+
+    def enable_compression(self):
+        settings.put_setting("SIMPLEFLOW_COMPRESS_FIELDS", True)
+        self.addCleanup(settings.put_setting, "SIMPLEFLOW_COMPRESS_FIELDS", False)
+
+    @mock_s3
+    def test_compressed_inline(self):
+        self.enable_compression()
+        message = json.dumps([{"key": "value", "index": i % 10} for i in range(2000)])
+        self.assertGreater(len(message), constants.MAX_RESULT_LENGTH)
+        encoded = format.encode(message, constants.MAX_RESULT_LENGTH)
+        assert encoded.startswith("simpleflow+zlib:")
+        self.assertLessEqual(len(encoded), constants.MAX_RESULT_LENGTH)
+        self.assertEqual(format.decode(encoded, parse_json=False), message)
+        self.assertEqual(format.decode(encoded), json.loads(message))
+
+    @mock_s3
+    def test_compressed_jumbo_field(self):
+        self.enable_compression()
+        self.setup_jumbo_fields("jumbo-bucket")
+        message = incompressible(40000) * 2  # compresses, but not enough
+        encoded = format.result(message)
+        assert encoded.startswith("simpleflow+s3://jumbo-bucket/")
+        self.assertEqual(encoded.split()[1], str(len(json.dumps(message))))
+
+        format.JUMBO_FIELDS_CACHE.clear()
+        self.assertEqual(format.decode(encoded), message)
+
+    @mock_s3
+    def test_compression_disabled_by_default(self):
+        with self.assertRaisesRegexp(ValueError, "Message too long"):
+            format.encode('A' * 1001, 1000)
+
+        self.setup_jumbo_fields("jumbo-bucket")
+        encoded = format.encode('A' * 1001, 1000)
+        key = encoded.split()[0].replace("simpleflow+s3://jumbo-bucket/", "")
+        self.assertEqual(
+            self.conn.get_bucket("jumbo-bucket").get_key(key).get_contents_as_string(encoding='utf-8'),
+            'A' * 1001,
+        )
+
+    @mock_s3
+    def test_content_addressed_jumbo_fields(self):
+        settings.put_setting("SIMPLEFLOW_JUMBO_FIELDS_CONTENT_ADDRESSED", True)
+        self.addCleanup(settings.put_setting, "SIMPLEFLOW_JUMBO_FIELDS_CONTENT_ADDRESSED", False)
+        self.addCleanup(format.JUMBO_FIELDS_STORED.clear)
+        self.setup_jumbo_fields("jumbo-bucket/subdir")
+        message = incompressible(64000)
+
+        with mock.patch("simpleflow.storage.push_content", wraps=push_content) as push:
+            encoded = format.result(message)
+            self.assertEqual(format.result(message), encoded)
+            self.assertEqual(push.call_count, 1)
+
+            # Uploaded by another process
+            format.JUMBO_FIELDS_STORED.clear()
+            self.assertEqual(format.result(message), encoded)
+            self.assertEqual(push.call_count, 1)
+
+            format.result(incompressible(64000))
+            self.assertEqual(push.call_count, 2)
+
+        key = encoded.split()[0].replace("simpleflow+s3://jumbo-bucket/", "")
+        self.assertEqual(key, "subdir/" + hashlib.sha256(json.dumps(message).encode('utf-8')).hexdigest())
+        self.assert_jumbo_object(key, json.dumps(message))
+
+    @mock_s3
+    def test_prefetch_jumbo_fields(self):
+        self.setup_jumbo_fields("jumbo-bucket")
+        signatures = []
+        for i in range(5):
+            push_content("jumbo-bucket", "field-{}".format(i), "value {}".format(i))
+            signatures.append("simpleflow+s3://jumbo-bucket/field-{} 7".format(i))
+        signatures.append("simpleflow+s3://jumbo-bucket/missing 7")
+        format.JUMBO_FIELDS_CACHE.clear()
+        self.addCleanup(format.JUMBO_FIELDS_CACHE.clear)
+
+        pulls = format.JUMBO_FIELDS_PULLS
+        # The missing field is only logged: decoding it will raise
+        self.assertEqual(format.prefetch_jumbo_fields(signatures + signatures[:1], nb_threads=3), 6)
+        self.assertEqual(format.JUMBO_FIELDS_PULLS - pulls, 5)
+
+        self.assertEqual(format.decode(signatures[3]), "value 3")
+        self.assertEqual(format.JUMBO_FIELDS_PULLS - pulls, 5)
+        self.assertEqual(format.prefetch_jumbo_fields(signatures[:5]), 0)
+
+    @mock_s3
+    def test_prefetch_jumbo_fields_max_size(self):
+        self.setup_jumbo_fields("jumbo-bucket")
+        signatures = []
+        for i in range(5):
+            push_content("jumbo-bucket", "field-{}".format(i), "value {}".format(i))
+            signatures.append("simpleflow+s3://jumbo-bucket/field-{} 7".format(i))
+        format.JUMBO_FIELDS_CACHE.clear()
+        self.addCleanup(format.JUMBO_FIELDS_CACHE.clear)
+
+        # The first fields, that fit
+        self.assertEqual(format.prefetch_jumbo_fields(signatures, max_size=20), 2)
+        pulls = format.JUMBO_FIELDS_PULLS
+        self.assertEqual(format.decode(signatures[1]), "value 1")
+        self.assertEqual(format.JUMBO_FIELDS_PULLS, pulls)
+        self.assertEqual(format.decode(signatures[2]), "value 2")
+        self.assertEqual(format.JUMBO_FIELDS_PULLS, pulls + 1)
+
+    @mock_s3
+    def test_jumbo_fields_are_passed_by_reference(self):
+        settings.put_setting("SIMPLEFLOW_JUMBO_FIELDS_BY_REFERENCE", True)
+        self.addCleanup(settings.put_setting, "SIMPLEFLOW_JUMBO_FIELDS_BY_REFERENCE", False)
+        self.setup_jumbo_fields("jumbo-bucket")
+        push_content("jumbo-bucket", "abc", '{"a": [1, 2]}')
+        signature = "simpleflow+s3://jumbo-bucket/abc 13"
+        reference = {constants.JUMBO_FIELDS_REFERENCE_KEY: signature}
+        format.JUMBO_FIELDS_CACHE.clear()
+        self.addCleanup(format.JUMBO_FIELDS_CACHE.clear)
+
+        pulls = format.JUMBO_FIELDS_PULLS
+        value = format.decode(signature)
+        encoded = format.input({"args": [value], "kwargs": {"x": value}})
+        self.assertEqual(json.loads(encoded), {"args": [reference], "kwargs": {"x": reference}})
+        self.assertEqual(json.loads(format.result(value)), reference)
+        self.assertEqual(format.JUMBO_FIELDS_PULLS, pulls)
+
+        # Resolved by the consumer
+        decoded = format.decode(encoded)
+        self.assertEqual(decoded["args"][0], {"a": [1, 2]})
+        self.assertEqual(decoded["kwargs"]["x"]["a"], [1, 2])
+        self.assertEqual(format.JUMBO_FIELDS_PULLS, pulls + 1)
+
+        # References don't apply to raw fields
+        raw = format.decode(signature, parse_json=False)
+        self.assertEqual(json.loads(format.input([raw])), ['{"a": [1, 2]}'])
+
+    @mock_s3
+    def test_jumbo_fields_by_reference_disabled_by_default(self):
+        self.setup_jumbo_fields("jumbo-bucket")
+        push_content("jumbo-bucket", "abc", '{"a": [1, 2]}')
+        value = format.decode("simpleflow+s3://jumbo-bucket/abc 13")
+        self.assertEqual(json.loads(format.input([value])), [{"a": [1, 2]}])
@@ -38,3 +38,39 @@ def test_future_cancel():
     assert future.running is False
     assert future.cancelled
     assert future.done
+
+
+def test_future_set_finished_lazily():
+    calls = []
+
+    def get_result():
+        calls.append(1)
+        return {'a': 1}
+
+    future = Future()
+    future.set_finished_lazily(get_result)
+    assert future.finished
+    assert future.done
+    assert calls == []
+    assert future.result == {'a': 1}
+    assert future.result is future.result
+    assert calls == [1]
+
+
+def test_future_lazy_result():
+    calls = []
+
+    def get_result():
+        calls.append(1)
+        return {'a': 1}
+
+    future = Future()
+    future.set_finished_lazily(get_result)
+    result = future.lazy_result()
+    assert calls == []
+    assert result == {'a': 1}
+    assert calls == [1]
+
+    future = Future()
+    future.set_finished({'a': 2})
+    assert future.lazy_result() is future.result
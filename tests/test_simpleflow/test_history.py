@@ -0,0 +1,94 @@
+import unittest
+
+import mock
+
+from simpleflow import format
+from simpleflow.history import History
+from swf.models.event import EventFactory
+from swf.models.history import builder
+from tests.data import BaseTestWorkflow, increment
+
+
+class ATestWorkflow(BaseTestWorkflow):
+    pass
+
+
+class TestHistoryIndexes(unittest.TestCase):
+    def test_markers(self):
+        history = builder.History(ATestWorkflow, input={})
+        history.add_marker('marker', details={'a': 1})
+        history.add_marker('marker', details={'a': 2})
+        history.add_marker('marker', details={'a': 1})
+        parsed = History(history)
+        parsed.parse()
+
+        marker = parsed.find_recorded_marker('marker', '{"a":1}')
+        self.assertEqual(marker['event_id'], 6)
+        self.assertIsNone(parsed.find_recorded_marker('marker', '{"a":3}'))
+        self.assertIsNone(parsed.find_recorded_marker('other', '{"a":1}'))
+        details = parsed.get_marker_details(marker)
+        self.assertEqual(details, {'a': 1})
+        details['a'] = 3
+        self.assertEqual(parsed.get_marker_details(marker), {'a': 1})
+
+    def test_open_child_workflows(self):
+        history = builder.History(ATestWorkflow, input={})
+        history.add_child_workflow(ATestWorkflow, last_state='started', workflow_id='child-1')
+        history.add_child_workflow(ATestWorkflow, last_state='completed', workflow_id='child-2')
+        parsed = History(history)
+        parsed.parse()
+        self.assertEqual(list(parsed.open_child_workflows), ['child-1'])
+
+        history.add_child_workflow_completed(initiated_id=4, started_id=5)
+        parsed.extend(history)
+        self.assertEqual(list(parsed.open_child_workflows), [])
+
+    def test_signaled_workflows(self):
+        history = builder.History(ATestWorkflow, input={})
+        history.events.append(EventFactory({
+            'eventId': history.next_id,
+            'eventTimestamp': 1365177769.585,
+            'eventType': 'SignalExternalWorkflowExecutionInitiated',
+            'signalExternalWorkflowExecutionInitiatedEventAttributes': {
+                'workflowId': 'wf-1',
+                'runId': 'run-1',
+                'signalName': 'signal',
+                'decisionTaskCompletedEventId': 3,
+            },
+        }))
+        history.events.append(EventFactory({
+            'eventId': history.next_id,
+            'eventTimestamp': 1365177769.585,
+            'eventType': 'ExternalWorkflowExecutionSignaled',
+            'externalWorkflowExecutionSignaledEventAttributes': {
+                'initiatedEventId': history.last_id,
+                'workflowExecution': {'workflowId': 'wf-1', 'runId': 'run-1'},
+            },
+        }))
+        parsed = History(history)
+        parsed.parse()
+
+        self.assertEqual(parsed.signaled_workflows_ids['signal'], {('wf-1', 'run-1')})
+        workflow = parsed.find_signaled_workflow('signal', 'wf-1')
+        self.assertEqual(workflow['signaled_event_id'], 5)
+        self.assertIs(parsed.find_signaled_workflow('signal', 'wf-1', 'run-1'), workflow)
+        self.assertIsNone(parsed.find_signaled_workflow('signal', 'wf-1', 'run-2'))
+        self.assertIsNone(parsed.find_signaled_workflow('other', 'wf-1'))
+
+
+class TestHistoryParsing(unittest.TestCase):
+    def test_inputs_and_controls_are_decoded_when_read(self):
+        history = builder.History(ATestWorkflow, input={})
+        history.add_activity_task(
+            increment, decision_id=0, last_state='scheduled', activity_id='activity-1',
+            input={'args': [1]}, control={'c': 1},
+        )
+        parsed = History(history)
+        with mock.patch.object(format, 'decode', wraps=format.decode) as decode:
+            parsed.parse()
+            self.assertEqual(decode.call_count, 0)
+
+            activity = parsed.activities['activity-1']
+            self.assertEqual(activity['input'], {'args': [1]})
+            self.assertEqual(activity['control']['c'], 1)
+            self.assertEqual(decode.call_count, 2)
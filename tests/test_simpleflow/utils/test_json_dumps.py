@@ -2,6 +2,7 @@ import datetime
 import json
 import unittest
 
+import mock
 import pytz
 from simpleflow.exceptions import ExecutionBlocked
 from simpleflow.futures import Future
@@ -79,6 +80,22 @@ class TestJsonDumps(unittest.TestCase):
         actual = json_dumps(data)
         self.assertEqual(expected, actual)
 
+    def test_unread_fields_are_embedded_as_is(self):
+        from lazy_object_proxy import Proxy
+        from simpleflow.format import FieldLoader
+
+        loader = FieldLoader('{"b": [1, 2],  "a": "x"}')
+        data = {"args": [Proxy(loader), Proxy(FieldLoader('42'))]}
+        with mock.patch.object(FieldLoader, '__call__', return_value='decoded') as call:
+            self.assertEqual(json_dumps(data), '{"args":[{"b": [1, 2],  "a": "x"},"decoded"]}')
+            self.assertEqual(call.call_count, 1)  # Not a JSON document
+            self.assertEqual(json_dumps(Proxy(loader), pretty=True), '{"b": [1, 2],  "a": "x"}')
+
+        # Read: the value may have changed
+        proxy = Proxy(loader)
+        proxy["a"] = "y"
+        self.assertEqual(json_dumps([proxy]), '[{"a":"y","b":[1,2]}]')
+
     def test_set(self):
         data = [
             {1, 2, 3},
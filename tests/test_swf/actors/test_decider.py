@@ -1,9 +1,11 @@
 import unittest
 
 import boto
+from boto.exception import SWFResponseError
+from mock import Mock
 
 from swf.actors import Decider
-from swf.exceptions import PollTimeout
+from swf.exceptions import PollTimeout, ResponseError
 from swf.models import Domain
 from tests.moto_compat import mock_swf
 
@@ -47,3 +49,94 @@ class TestActor(unittest.TestCase):
         )
         self.assertEqual(response.execution.workflow_id, 'wfe-1234')
         self.assertIsNotNone(response.execution.run_id)
+
+    def make_pages(self, nb_pages, events_per_page=3):
+        pages = []
+        for page in range(nb_pages):
+            events = [
+                {
+                    'eventId': page * events_per_page + i + 1,
+                    'eventType': 'DecisionTaskScheduled',
+                    'eventTimestamp': 1365177769.585,
+                    'decisionTaskScheduledEventAttributes': {'taskList': {'name': 'test'}},
+                }
+                for i in range(events_per_page)
+            ]
+            pages.append({
+                'taskToken': 'token',
+                'events': events,
+                'startedEventId': nb_pages * events_per_page,
+                'previousStartedEventId': 0,
+                'workflowExecution': {'workflowId': 'wfe-1234', 'runId': 'run-1'},
+                'workflowType': {'name': 'test-workflow', 'version': 'v1.2'},
+            })
+            if page < nb_pages - 1:
+                pages[-1]['nextPageToken'] = 'page-{}'.format(page + 1)
+        return pages
+
+    def test_poll_with_several_pages(self):
+        self.actor.connection = Mock()
+        self.actor.connection.poll_for_decision_task.side_effect = self.make_pages(4)
+
+        response = self.actor.poll()
+
+        self.assertEqual([evt.id for evt in response.history], list(range(1, 13)))
+        self.assertEqual([evt['eventId'] for evt in response.history.raw], list(range(1, 13)))
+        self.assertEqual(response.token, 'token')
+        self.assertEqual(response.execution.run_id, 'run-1')
+        tokens = [
+            call[1].get('next_page_token')
+            for call in self.actor.connection.poll_for_decision_task.call_args_list
+        ]
+        self.assertEqual(tokens, [None, 'page-1', 'page-2', 'page-3'])
+
+    def test_poll_with_page_error(self):
+        self.actor.connection = Mock()
+        pages = self.make_pages(3)
+        error = SWFResponseError(400, 'Bad Request', {'message': 'boom'})
+        self.actor.connection.poll_for_decision_task.side_effect = [pages[0], error]
+
+        with self.assertRaises(ResponseError):
+            self.actor.poll()
+
+    def make_reverse_pages(self, nb_pages, events_per_page=3):
+        pages = self.make_pages(nb_pages, events_per_page)
+        events = [e for page in pages for e in page['events']][::-1]
+        for i, page in enumerate(pages):
+            page['events'] = events[i * events_per_page:(i + 1) * events_per_page]
+        return pages
+
+    def test_poll_with_known_events(self):
+        pages = self.make_reverse_pages(4)
+        known_events = [e for page in pages for e in page['events']][::-1][:7]
+        self.actor.connection = Mock()
+        self.actor.connection.poll_for_decision_task.side_effect = pages
+
+        response = self.actor.poll(get_known_events=lambda workflow_id, run_id: known_events)
+
+        self.assertEqual([evt.id for evt in response.history], list(range(1, 13)))
+        self.assertEqual(response.history.raw[:7], known_events)
+        calls = self.actor.connection.poll_for_decision_task.call_args_list
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(all(call[1]['reverse_order'] for call in calls))
+
+    def test_poll_with_unknown_events(self):
+        pages = self.make_reverse_pages(4)
+        self.actor.connection = Mock()
+        self.actor.connection.poll_for_decision_task.side_effect = pages
+
+        response = self.actor.poll(get_known_events=lambda workflow_id, run_id: None)
+
+        self.assertEqual([evt.id for evt in response.history], list(range(1, 13)))
+        self.assertEqual(len(self.actor.connection.poll_for_decision_task.call_args_list), 4)
+
+    def test_poll_with_inconsistent_known_events(self):
+        pages = self.make_reverse_pages(4)
+        known_events = [e for page in pages for e in page['events']][::-1][1:7]
+        self.actor.connection = Mock()
+        self.actor.connection.poll_for_decision_task.side_effect = pages
+
+        response = self.actor.poll(get_known_events=lambda workflow_id, run_id: known_events)
+
+        self.assertEqual([evt.id for evt in response.history], list(range(1, 13)))
+        self.assertEqual(len(self.actor.connection.poll_for_decision_task.call_args_list), 4)
@@ -5,8 +5,9 @@ import unittest
 from datetime import datetime
 
 import pytz
+from mock import patch
 
-from swf.models.event import Event
+from swf.models.event import Event, EventFactory
 from swf.models.history import History
 import swf.constants
 
@@ -35,6 +36,47 @@ class TestEvent(unittest.TestCase):
         ev = Event('WorkflowExecutionStarted', 'REGISTERED', 0, {None: {}})
         self.assertEqual(datetime(1970, 1, 1, 0, 0, tzinfo=pytz.UTC), ev.timestamp)
 
+    def test_lazy_attributes(self):
+        ev = EventFactory({
+            'eventId': 3,
+            'eventType': 'ActivityTaskScheduled',
+            'eventTimestamp': 1365177769.585,
+            'activityTaskScheduledEventAttributes': {
+                'activityId': 'activity-1',
+                'activityType': {'name': 'activity', 'version': '1.0'},
+                'input': '{"args": [1]}',
+            },
+        })
+        with patch('simpleflow.format.decode') as decode:
+            decode.return_value = {'args': [1]}
+            self.assertEqual(ev.activity_id, 'activity-1')
+            self.assertEqual(ev.activity_type, {'name': 'activity', 'version': '1.0'})
+            self.assertFalse(decode.called)
+            self.assertEqual(ev.input, {'args': [1]})
+            self.assertEqual(ev.input, {'args': [1]})
+            decode.assert_called_once_with('{"args": [1]}')
+        self.assertIsNone(ev.control)
+        self.assertIsNone(getattr(ev, 'task_priority', None))
+        with self.assertRaises(AttributeError):
+            ev.unknown_attribute
+
+    def test_attributes_key_per_instance(self):
+        first = EventFactory({
+            'eventId': 1,
+            'eventType': 'TimerStarted',
+            'eventTimestamp': 1365177769.585,
+            'timerStartedEventAttributes': {'timerId': 'timer-1'},
+        })
+        second = EventFactory({
+            'eventId': 2,
+            'eventType': 'TimerFired',
+            'eventTimestamp': 1365177769.585,
+            'timerFiredEventAttributes': {'timerId': 'timer-2', 'startedEventId': 1},
+        })
+        self.assertEqual(first.timer_id, 'timer-1')
+        self.assertEqual(second.timer_id, 'timer-2')
+        self.assertEqual(second.started_event_id, 1)
+
 
 class TestHistory(unittest.TestCase):
 
@@ -69,3 +111,34 @@ class TestHistory(unittest.TestCase):
     def test_get_by_invalid_index_type(self):
         with self.assertRaises(TypeError):
             dummy = self.history["invalid, bitch"]
+
+    def test_filter_by_type_and_state(self):
+        events = self.history.filter(type='DecisionTask', state='scheduled')
+        self.assertEqual([e.id for e in events], [2])
+        self.assertEqual(self.history.filter(type='DecisionTask', state='started'), [])
+        events = self.history.filter(type='WorkflowExecution', task_start_to_close_timeout='300')
+        self.assertEqual([e.id for e in events], [1])
+
+    def test_events_are_materialized_on_access(self):
+        with patch('swf.models.history.store.EventFactory') as factory:
+            history = History.from_event_list(self.event_list['events'])
+            self.assertEqual(history.events.positions(type='DecisionTask'), [1])
+            self.assertFalse(factory.called)
+            history.events[1]
+            factory.assert_called_once_with(self.event_list['events'][1])
+
+    def test_slice_and_append(self):
+        history = self.history[1:]
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history.events.positions(type='DecisionTask'), [0])
+
+        event = EventFactory({
+            'eventId': 3,
+            'eventType': 'DecisionTaskStarted',
+            'eventTimestamp': 1365177770.0,
+            'decisionTaskStartedEventAttributes': {'scheduledEventId': 2},
+        })
+        history.events.append(event)
+        self.assertIs(history.last, event)
+        self.assertEqual(history.events.positions(type='DecisionTask', state='started'), [1])
+        self.assertEqual(len(self.history), 2)
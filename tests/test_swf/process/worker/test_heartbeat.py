@@ -1,198 +1,187 @@
-import unittest
 import os
-import signal
+import shutil
+import tempfile
+import threading
 import time
-from uuid import uuid4
-import multiprocessing as mp
+import unittest
 
 import swf.exceptions
 
 from simpleflow.swf.process.worker.heartbeat import (
-    HeartbeatProcess,
-    Heartbeater,
+    HeartbeatClient,
+    HeartbeatService,
+    TokenBucket,
+    start_heartbeat_service,
+    stop_heartbeat_service,
 )
 
 
-class FakeHeartbeat(object):
-    def __init__(self, max_count=1):
-        self._token = None
-        self._max_count = max_count
-        self._count = 0
-
-    def __call__(self, token):
-        self._token = token
-        self._count += 1
-        if self._count == self._max_count:
-            raise StopIteration
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.
 
-        return {}
-
-
-class FakeHeartbeatCancel(FakeHeartbeat):
-    def __call__(self, token):
-        super(FakeHeartbeatCancel, self).__call__(token)
-        return {'cancelRequested': True}
+    def __call__(self):
+        return self.now
 
 
-class FakeHeartbeatRaises(FakeHeartbeat):
-    def __init__(self, raises, max_count=1):
-        super(FakeHeartbeatRaises, self).__init__(max_count)
-        self._raises = raises
+class FakeHeartbeat(object):
+    def __init__(self, responses=None):
+        self.calls = []
+        self._responses = responses or {}
 
     def __call__(self, token):
-        super(FakeHeartbeatRaises, self).__call__(token)
-        raise self._raises
-
-
-class FakeActivityType(object):
-    def __init__(self, name):
-        self.name = name
+        self.calls.append(token)
+        response = self._responses.get(token, {})
+        if isinstance(response, Exception):
+            raise response
+        return response
 
+    def count(self, token):
+        return self.calls.count(token)
 
-class FakeTask(object):
-    def __init__(self, name):
-        self.activity_type = FakeActivityType(name)
 
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
 
-class FakeTaskHandler(object):
-    def __init__(self, callable, args, kwargs, result_queue):
-        self._callable = callable
-        self._args = args
-        self._kwargs = kwargs
-        self._result_queue = result_queue
-
-    def __call__(self):
-        process = mp.Process(target=self._callable,
-                             args=self._args,
-                             kwargs=self._kwargs)
-
-        process.start()
-        self._result_queue.put(process.pid)
-
-
-class TestHeartbeatProcess(unittest.TestCase):
-    def test_heartbeat_0(self):
-        with self.assertRaises(ValueError):
-            HeartbeatProcess(lambda *args: None, interval=0)
 
-    def test_heartbeat_non_int(self):
+class TestTokenBucket(unittest.TestCase):
+    def test_invalid_rate(self):
         with self.assertRaises(ValueError):
-            HeartbeatProcess(lambda *args: None, interval='NOT_AN_INTEGER')
-
-    def test_fake_heartbeat_count(self):
-        heartbeat = FakeHeartbeat(max_count=10)
-        count = 3
-        for _ in range(count):
-            heartbeat(None)
-
-        self.assertEqual(heartbeat._count, count)
-
-    def test_fake_heartbeat_max_count(self):
-        max_count = 7
-        heartbeat = FakeHeartbeat(max_count)
-        for _ in range(max_count - 1):
-            heartbeat(None)
-
-        with self.assertRaises(StopIteration):
-            heartbeat(None)
-
-        self.assertEqual(heartbeat._count, max_count)
-
-    def test_heartbeat_ok(self):
-        heartbeat = FakeHeartbeat(max_count=1)
-        heartbeater = HeartbeatProcess(heartbeat, interval=0.1)
-        token = uuid4()
-        try:
-            heartbeater.run(token, FakeTask('test_task'))
-        except StopIteration:
-            pass
-        self.assertEqual(heartbeat._token,
-                          token)
-
-    def test_heartbeat_cancel(self):
-        heartbeat = FakeHeartbeatCancel(max_count=10)
-        heartbeater = HeartbeatProcess(heartbeat, interval=0.1)
-        token = uuid4()
-
-        heartbeater.run(token, FakeTask('test_task'))
-        self.assertEqual(heartbeat._token,
-                          token)
-
-    def test_heartbeat_doesnotexist_error(self):
-        error_type = 'Unknown execution: blah'
-        heartbeat = FakeHeartbeatRaises(
-            swf.exceptions.DoesNotExistError('error', error_type),
-            10)
-        heartbeater = HeartbeatProcess(heartbeat, interval=0.1)
-        token = uuid4()
-
-        heartbeater.run(token, FakeTask('test_task'))
-        self.assertEqual(heartbeat._token,
-                          token)
-
-    def test_heartbeat_running(self):
-        max_count = 3
-        heartbeat = FakeHeartbeat(max_count)
-        heartbeater = HeartbeatProcess(heartbeat, interval=0.1)
-        token = uuid4()
-        try:
-            heartbeater.run(token, FakeTask('test_task'))
-        except StopIteration:
-            pass
-        self.assertEqual(heartbeat._max_count, max_count)
-        self.assertEqual(heartbeat._token,
-                          token)
-
-    # TODO: fix test not working in containers
-    @unittest.skip("Doesn't work in containers for now")
-    def test_heartbeat_process_kill_parent(self):
-        heartbeat = FakeHeartbeat(1000)
-        heartbeater = HeartbeatProcess(heartbeat, interval=0.1)
-
-        token = uuid4()
-        task = FakeTask('test_task')
-
-        result_queue = mp.Queue()
-        handler = FakeTaskHandler(heartbeater.run,
-                                  (token, task),
-                                  {},
-                                  result_queue)
-        handler_process = mp.Process(target=handler)
-
-        handler_process.start()
-        time.sleep(2)
-        heartbeat_pid = result_queue.get()
-        handler_process.terminate()
-        os.kill(handler_process.pid, signal.SIGQUIT)
-        handler_process.join()
-        time.sleep(2)
-        with self.assertRaises(OSError):
-            os.kill(heartbeat_pid, signal.SIGKILL)
-
-
-class Toggler(object):
-    def __init__(self, value=True):
-        self.value = value
-
-    def __call__(self, *args):
-        self.value = not self.value
-        return self.value
-
-
-class TestHeartbeater(unittest.TestCase):
-    def test_heartbeater_start(self):
-        heartbeater = Heartbeater(lambda *args: None, interval=0.1)
-        heartbeater.start(uuid4(), FakeTask('test_task'))
-        heartbeater.stop()
-        heartbeater._heartbeater.join()
-        self.assertFalse(heartbeater._heartbeater.is_alive())
-
-    def test_heartbeater_stop(self):
-        toggler = Toggler(True)
-        heartbeater = Heartbeater(lambda *args: None,
-                                  interval=0.1,
-                                  on_exit=toggler)
-        heartbeater.start(uuid4(), FakeTask('test_task'))
-        heartbeater.stop()
-        heartbeater._heartbeater.join()
-        self.assertTrue(toggler.value)
+            TokenBucket(0)
+
+    def test_take(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=2, clock=clock)
+        self.assertEqual(bucket.take(), 0)
+        self.assertEqual(bucket.take(), 0)
+        self.assertAlmostEqual(bucket.take(), 0.5)
+
+        clock.now += 0.5
+        self.assertEqual(bucket.take(), 0)
+        self.assertAlmostEqual(bucket.take(), 0.5)
+
+        # Tokens don't pile up over the burst size
+        clock.now += 10
+        for _ in range(2):
+            self.assertEqual(bucket.take(), 0)
+        self.assertGreater(bucket.take(), 0)
+
+
+class TestHeartbeatService(unittest.TestCase):
+    def start_service(self, heartbeat, rate=100, burst=None):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        address = os.path.join(directory, 'heartbeat.sock')
+        service = HeartbeatService(heartbeat, rate, burst)
+        ready = threading.Event()
+        thread = threading.Thread(target=service.serve, args=(address, ready))
+        thread.daemon = True
+        thread.start()
+        self.assertTrue(ready.wait(5))
+
+        def stop():
+            service.stop()
+            thread.join()
+        self.addCleanup(stop)
+        return service, HeartbeatClient(address)
+
+    def test_heartbeats(self):
+        heartbeat = FakeHeartbeat()
+        service, client = self.start_service(heartbeat)
+        client.register('token-1', 0.1)
+        client.register('token-2', 0.1)
+        self.assertTrue(wait_for(lambda: heartbeat.count('token-1') >= 2 and heartbeat.count('token-2') >= 2))
+
+        client.unregister('token-1')
+        self.assertTrue(wait_for(lambda: len(service) == 1))
+        count = heartbeat.count('token-1')
+        time.sleep(0.3)
+        self.assertEqual(heartbeat.count('token-1'), count)
+        self.assertIsNone(client.cancelled('token-2'))
+
+    def test_cancellations_are_delivered(self):
+        heartbeat = FakeHeartbeat({
+            'cancelled': {'cancelRequested': True},
+            'gone': swf.exceptions.DoesNotExistError('Unknown execution'),
+            'throttled': swf.exceptions.RateLimitExceededError('Rate exceeded'),
+        })
+        service, client = self.start_service(heartbeat)
+        for token in ('cancelled', 'gone', 'throttled'):
+            client.register(token, 0.1)
+
+        self.assertTrue(wait_for(lambda: client.cancelled('cancelled') and client.cancelled('gone')))
+        self.assertEqual(client.cancelled('cancelled'), 'task cancelled')
+        self.assertIn('task does not exist', client.cancelled('gone'))
+        # Throttled heartbeats are sent again later
+        self.assertIsNone(client.cancelled('throttled'))
+        self.assertEqual(len(service), 1)
+
+    def test_rate_limit(self):
+        heartbeat = FakeHeartbeat()
+        service, client = self.start_service(heartbeat, rate=5, burst=1)
+        for i in range(20):
+            client.register('token-{}'.format(i), 0.05)
+        time.sleep(1)
+        self.assertLessEqual(len(heartbeat.calls), 7)
+
+    def test_tasks_of_gone_clients_are_unregistered(self):
+        service, client = self.start_service(FakeHeartbeat())
+        client.register('token', 60)
+        self.assertTrue(wait_for(lambda: len(service) == 1))
+        client._conn.close()
+        self.assertTrue(wait_for(lambda: len(service) == 0))
+
+    def test_client_reconnects_after_fork(self):
+        heartbeat = FakeHeartbeat()
+        service, client = self.start_service(heartbeat)
+        client.register('parent', 0.1)
+        pid = os.fork()
+        if pid == 0:
+            client.register('child', 0.1)
+            time.sleep(0.5)  # Stay registered for a few heartbeats
+            os._exit(0 if client._pid == os.getpid() else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        self.assertTrue(wait_for(lambda: 'child' in heartbeat.calls))
+
+    def test_heartbeats_are_due_without_service(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        client = HeartbeatClient(os.path.join(directory, 'nothing.sock'))
+        client.register('token', 60)
+        self.assertIsNone(client.cancelled('token'))
+        self.assertTrue(client.heartbeat_due('token'))
+        self.assertFalse(client.heartbeat_due('token'))
+        client.unregister('token')
+
+    def test_heartbeats_are_due_after_losing_the_service(self):
+        service, client = self.start_service(FakeHeartbeat())
+        client.register('token', 60)
+        self.assertFalse(client.heartbeat_due('token'))
+        client._conn.close()
+        self.assertIsNone(client.cancelled('token'))
+        self.assertTrue(client.heartbeat_due('token'))
+
+        # The next tasks connect again
+        client.register('next', 60)
+        self.assertTrue(wait_for(lambda: len(service) == 1))
+        self.assertFalse(client.heartbeat_due('next'))
+
+
+class TestHeartbeatServiceProcess(unittest.TestCase):
+    def test_restart(self):
+        process, client = start_heartbeat_service(FakeHeartbeat(), rate=10)
+        process.terminate()
+        process.join()
+        client.register('token', 60)
+        self.assertTrue(client.heartbeat_due('token'))
+
+        process, _ = start_heartbeat_service(FakeHeartbeat(), rate=10, address=client.address)
+        self.addCleanup(stop_heartbeat_service, process, client)
+        client.register('next', 60)
+        self.assertFalse(client.heartbeat_due('next'))
@@ -0,0 +1,44 @@
+import os
+import unittest
+
+from mock import patch
+
+from swf.core import CONNECTIONS, ConnectedSWFObject
+
+
+class TestConnectionRegistry(unittest.TestCase):
+    def setUp(self):
+        CONNECTIONS.clear()
+
+    def tearDown(self):
+        CONNECTIONS.clear()
+
+    def test_connection_is_shared(self):
+        first = ConnectedSWFObject(region='us-east-1')
+        second = ConnectedSWFObject(region='us-east-1')
+        self.assertIs(first.connection, second.connection)
+        self.assertEqual(len(CONNECTIONS), 1)
+
+    def test_connection_by_region_and_credentials(self):
+        first = CONNECTIONS.get('us-east-1')
+        self.assertIsNot(CONNECTIONS.get('eu-west-1'), first)
+        self.assertIsNot(CONNECTIONS.get('us-east-1', aws_access_key_id='foo', aws_secret_access_key='bar'), first)
+        with patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'another-key'}):
+            self.assertIsNot(CONNECTIONS.get('us-east-1'), first)
+        self.assertIs(CONNECTIONS.get('us-east-1'), first)
+        self.assertEqual(len(CONNECTIONS), 4)
+
+    def test_invalid_region_is_not_cached(self):
+        self.assertIsNone(CONNECTIONS.get('mars-north-1'))
+        self.assertEqual(len(CONNECTIONS), 0)
+
+    def test_connection_pool_is_reset_after_fork(self):
+        connection = CONNECTIONS.get('us-east-1')
+        pool = connection._pool
+        pid = os.fork()
+        if pid == 0:
+            ok = CONNECTIONS.get('us-east-1') is connection and connection._pool is not pool
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        self.assertIs(connection._pool, pool)
@@ -5,6 +5,8 @@ import unittest
 
 from psutil import Process, NoSuchProcess
 
+import swf.core
+
 
 class IntegrationTestCase(unittest.TestCase):
     def tearDown(self):
@@ -19,6 +21,8 @@ class IntegrationTestCase(unittest.TestCase):
                     pass
         # reset SIGTERM handler
         signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        # don't reuse connections pooled while playing this test's cassette
+        swf.core.CONNECTIONS.clear()
 
     def assertProcess(self, regex, count=1):
         children = Process().children(recursive=True)
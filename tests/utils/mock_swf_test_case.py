@@ -6,6 +6,7 @@ from moto.swf import swf_backend
 
 from simpleflow.swf.executor import Executor
 from simpleflow.swf.process.worker.base import ActivityPoller, ActivityWorker
+import swf.core
 from swf.actors import Decider
 from tests.data import DOMAIN
 from tests.moto_compat import mock_s3, mock_swf
@@ -36,6 +37,7 @@ class MockSWFTestCase(unittest.TestCase):
         self.s3_conn.create_bucket("jumbo-bucket")
 
     def tearDown(self):
+        swf.core.CONNECTIONS.clear()
         swf_backend.reset()
         assert not self.conn.list_domains("REGISTERED")["domainInfos"], \
             "moto state incorrectly reset!"